@@ -9,6 +9,7 @@
 
 import ast
 import operator
+from functools import lru_cache
 
 class DictQuery:
     """
@@ -134,11 +135,131 @@ class DictQuery:
         Raises:
             Exception: If there's an error in query parsing or evaluation
         """
+        return DictQuery.compile(query_str)(self.data)
+
+    # 比较/成员操作 (与 `ops` 一致), 供编译后的谓词使用
+    _CMP_OPS = {
+        ast.Eq: operator.eq,
+        ast.Gt: operator.gt,
+        ast.Lt: operator.lt,
+        ast.GtE: operator.ge,
+        ast.LtE: operator.le,
+        ast.NotEq: operator.ne,
+        ast.In: lambda x, y: x in y,
+        ast.NotIn: lambda x, y: x not in y,
+    }
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def compile(query_str):
+        """
+        Compile a query string once into a reusable predicate.
+
+        The expression is parsed a single time (and cached by string); the
+        returned callable evaluates it against any dictionary with the same
+        semantics as `DictQuery(data).query(query_str)`, including printing
+        the error and returning False when parsing or evaluation fails.
+
+        Args:
+            query_str (str): The query string to compile
+
+        Returns:
+            callable: predicate `f(data_dict)`
+
+        Examples:
+            >>> is_avoid = DictQuery.compile("rtype in ['SA'] or knd == 'ST'")
+            >>> is_avoid({'rtype': 'SA'})
+            True
+        """
         try:
-            # 清理查询字符串
-            query_str = query_str.strip()
-            tree = ast.parse(query_str, mode='eval')
-            return self._eval(tree.body)
+            tree = ast.parse(query_str.strip(), mode='eval')
+            func = DictQuery._compile_node(tree.body)
         except Exception as e:
-            print(f"Query error: {e}")
-            return False
\ No newline at end of file
+            err = e
+            def func(data):
+                raise err
+
+        def predicate(data):
+            try:
+                return func(data)
+            except Exception as e:
+                print(f"Query error: {e}")
+                return False
+        predicate.query_str = query_str
+        return predicate
+
+    @staticmethod
+    def _compile_node(node):
+        """
+        Translate an AST node into a closure `f(data)`, mirroring `_eval`.
+
+        Unsupported nodes compile into a closure raising ValueError when (and
+        only when) it is evaluated, so short-circuited branches behave as in
+        `_eval`.
+        """
+        if isinstance(node, ast.Compare):
+            left_f = DictQuery._compile_node(node.left)
+            lst_cmp = []
+            for op, comp in zip(node.ops, node.comparators):
+                op_func = DictQuery._CMP_OPS.get(type(op))
+                if op_func is None:
+                    return DictQuery._compile_error(KeyError(type(op)))
+                lst_cmp.append((op_func, DictQuery._compile_node(comp)))
+            if len(lst_cmp) == 1:
+                (op_func, right_f), = lst_cmp
+                return lambda data: bool(op_func(left_f(data), right_f(data)))
+
+            def f_compare(data):
+                left = left_f(data)
+                for op_func, right_f in lst_cmp:
+                    right = right_f(data)
+                    if not op_func(left, right):
+                        return False
+                    left = right
+                return True
+            return f_compare
+
+        elif isinstance(node, ast.BoolOp):
+            lst_f = [DictQuery._compile_node(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                def f_and(data):
+                    result = True
+                    for f in lst_f:
+                        result = result and f(data)
+                        if not result:  # 短路求值
+                            break
+                    return result
+                return f_and
+            elif isinstance(node.op, ast.Or):
+                def f_or(data):
+                    result = False
+                    for f in lst_f:
+                        result = result or f(data)
+                        if result:  # 短路求值
+                            break
+                    return result
+                return f_or
+            return DictQuery._compile_error(ValueError(f"Unsupported boolean operation: {type(node.op)}"))
+
+        elif isinstance(node, ast.Name):
+            key = node.id
+            return lambda data: data.get(key)
+
+        elif isinstance(node, ast.Constant):
+            value = node.value
+            return lambda data: value
+
+        elif isinstance(node, ast.List):
+            lst_f = [DictQuery._compile_node(elt) for elt in node.elts]
+            if all(isinstance(elt, ast.Constant) for elt in node.elts):
+                values = [elt.value for elt in node.elts]    # 常量列表只构建一次
+                return lambda data: values
+            return lambda data: [f(data) for f in lst_f]
+
+        return DictQuery._compile_error(ValueError(f"Unsupported operation: {type(node)}"))
+
+    @staticmethod
+    def _compile_error(err):
+        def f_error(data):
+            raise err
+        return f_error
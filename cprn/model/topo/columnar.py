@@ -0,0 +1,204 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : columnar (struct-of-arrays) facility search results
+description : search records are stored as one numpy array per search
+    column, facility attributes are kept once in a facility table and
+    referenced by index; interval tables (src / tgt enriched) are built from
+    the columns in one vectorized pass
+"""
+
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+from cprn.model.topo.fac_index import FacilityIndex
+
+
+class FacSearchColumns:
+    """ Columnar facility search result
+
+    Attributes:
+        columns: dict of search column -> np.ndarray (one entry per record)
+        fac_table: list of facility dicts (`vtx_fac`, `fac_code`, `fac_type`, ...)
+        fac_idx: np.ndarray of int, row of `fac_table` per record, -1 for
+            records without facility (`reach_max_dist` marks)
+
+    Example:
+        >>> res = CprnTopoSearch.fac_bfs_depth_batch(dg_cprn, lst_vtx_gtr, ['G1','G2','G3'],
+        ...     'downstream', max_depth=1, as_columns=True)
+        >>> res.columns['interval_weight'].mean()
+        >>> res.fac_column('fac_code')
+        >>> CprnTopoSearch.build_interval_df(res, dg_cprn, fac_types_src=['G1','G2','G3'])
+    """
+    # 检索列 (其余键为设施属性)
+    SEARCH_COLS = ('vtx_start', 'depth', 'vtx_intvl_src', 'vtx_intvl_tgt',
+                   'interval_weight', 'cumulative_weight',
+                   'interval_edges', 'cumulative_edges',
+                   'reach_max_depth', 'reach_max_dist')
+    _FLAG_COLS = ('reach_max_depth', 'reach_max_dist')
+
+    def __init__(self, columns: dict, fac_table: list[dict], fac_idx: np.ndarray):
+        self.columns = columns
+        self.fac_table = fac_table
+        self.fac_idx = fac_idx
+
+    def __len__(self) -> int:
+        return len(self.fac_idx)
+
+    def __repr__(self) -> str:
+        return (f"FacSearchColumns({len(self)} records, {len(self.fac_table)} facilities, "
+                f"columns={list(self.columns)})")
+
+    @staticmethod
+    def from_records(lst_records: list[dict], fac_table: list[dict] = None,
+                     fac_vertices=None) -> 'FacSearchColumns':
+        """ columnar result from `fac_bfs_depth` records (one pass)
+
+        Args:
+            lst_records: list of dict, records of `fac_bfs_depth` / `fac_bfs_depth_batch`
+            fac_table: existing facility table to reference (e.g. the `fac_records`
+                of a CprnCsrGraph), looked up by (`vtx_fac`, `fac_code`,
+                `fac_type`) as codes may be shared; built from the records when None
+            fac_vertices: vertex of every `fac_table` row (`CprnCsrGraph.fac_vertices`),
+                used for rows without `vtx_fac` (records then use `vtx_intvl_tgt`)
+        """
+        n = len(lst_records)
+        # 无记录 (未找到设施) 时建立全部检索列 (长度 0), 供 `interval_df` 等按列取用
+        set_keys = set(FacSearchColumns.SEARCH_COLS) if n == 0 else set()
+        for rec in lst_records[:1]:
+            set_keys.update(rec.keys())
+        cols_search = [col for col in FacSearchColumns.SEARCH_COLS
+                       if col in set_keys or col in FacSearchColumns._FLAG_COLS]
+
+        fac_table = [] if fac_table is None else fac_table
+        lst_vtx = [None] * len(fac_table) if fac_vertices is None else list(fac_vertices)
+        dct_fac_row = {FacSearchColumns._fac_key(fac, lst_vtx[i]): i
+                       for i, fac in reversed(list(enumerate(fac_table)))}
+        is_new_table = not fac_table
+
+        lst_cols = {col: [] for col in cols_search}
+        fac_idx = np.empty(n, dtype=np.int64)
+        set_search = set(FacSearchColumns.SEARCH_COLS)
+        for i, rec in enumerate(lst_records):
+            for col in cols_search:
+                lst_cols[col].append(rec.get(col, False if col in FacSearchColumns._FLAG_COLS else None))
+            if 'fac_code' not in rec and 'fac_type' not in rec:
+                fac_idx[i] = -1
+                continue
+            fac_key = FacSearchColumns._fac_key(rec, rec.get('vtx_intvl_tgt'))
+            row = dct_fac_row.get(fac_key)
+            if row is None:
+                if not is_new_table:
+                    raise KeyError(f"Facility {fac_key} not in the facility table")
+                row = len(fac_table)
+                fac_table.append({k: v for k, v in rec.items() if k not in set_search})
+                dct_fac_row[fac_key] = row
+            fac_idx[i] = row
+
+        columns = {}
+        for col, values in lst_cols.items():
+            if col in ('interval_edges', 'cumulative_edges', 'vtx_start', 'vtx_intvl_src', 'vtx_intvl_tgt'):
+                arr = np.empty(n, dtype=object)
+                arr[:] = values     # 保持 list 元素不被展开
+            elif col in FacSearchColumns._FLAG_COLS:
+                arr = np.fromiter((bool(v) for v in values), dtype=bool, count=n)
+            elif n == 0:
+                arr = np.empty(0, dtype=np.int64 if col == 'depth' else np.float64)
+            else:
+                arr = np.asarray(values)
+            columns[col] = arr
+        return FacSearchColumns(columns, fac_table, fac_idx)
+
+    @staticmethod
+    def _fac_key(fac, vtx=None) -> tuple:
+        # 设施编码可被多个顶点 / 类型共用, 以 (顶点, 编码, 类型) 识别设施记录; 缺 vtx_fac 时以所在顶点代替
+        vtx_fac = fac.get('vtx_fac')
+        return vtx if vtx_fac is None else vtx_fac, fac.get('fac_code'), fac.get('fac_type')
+
+    def fac_column(self, attr: str) -> np.ndarray:
+        """ facility attribute per record (None where the record has no facility)
+        """
+        table = np.empty(len(self.fac_table) + 1, dtype=object)
+        table[:-1] = [fac.get(attr) for fac in self.fac_table]
+        table[-1] = None
+        return table[self.fac_idx]      # -1 -> trailing None
+
+    def fac_attrs(self) -> list[str]:
+        """ facility attribute names in table order """
+        dct_keys = {}
+        for fac in self.fac_table:
+            dct_keys.update(dict.fromkeys(fac))
+        return list(dct_keys)
+
+    def to_df(self, fac_attrs: list[str] = None, suffix: str = '') -> pd.DataFrame:
+        """ DataFrame of search columns and facility attributes (suffixed)
+        """
+        fac_attrs = self.fac_attrs() if fac_attrs is None else fac_attrs
+        dct_cols = dict(self.columns)
+        for attr in fac_attrs:
+            dct_cols[f'{attr}{suffix}'] = self.fac_column(attr)
+        return pd.DataFrame(dct_cols)
+
+    def to_records(self) -> list[dict]:
+        """ records as returned by `fac_bfs_depth` (list of dict)
+        """
+        lst_cols = {col: arr.tolist() for col, arr in self.columns.items()}
+        lst_depth = lst_cols.get('depth')
+        lst_records = []
+        for i, row in enumerate(self.fac_idx.tolist()):
+            rec = {col: values[i] for col, values in lst_cols.items() if col not in self._FLAG_COLS}
+            # 标记列与引擎输出一致: reach_max_depth 见于深度 >= 1 的设施记录, reach_max_dist 仅在为真时
+            if row >= 0 and 'reach_max_depth' in lst_cols and (lst_depth is None or lst_depth[i] != 0):
+                rec['reach_max_depth'] = lst_cols['reach_max_depth'][i]
+            if 'reach_max_dist' in lst_cols and lst_cols['reach_max_dist'][i]:
+                rec['reach_max_dist'] = True
+            if row >= 0:
+                rec.update(self.fac_table[row])
+            lst_records.append(rec)
+        return lst_records
+
+    @staticmethod
+    def interval_df(res, DG: nx.DiGraph, fac_types_src: list = None,
+                    cols_fac_attr: list[str] = ('fac_code', 'fac_type', 'fac_name', 'fac_ghz', 'vtx_fac')
+                    ) -> pd.DataFrame:
+        """ src / tgt enriched interval table in one vectorized pass
+
+        Target attributes come from the record's facility (`{attr}_tgt`), source
+        attributes from the facility catalog of `DG` at `vtx_intvl_src`
+        (`{attr}_src`, first facility of `fac_types_src` at the vertex, catalog
+        order), as the merge on `vtx_fac` in the analysis notebooks but without
+        duplicating rows of multi-facility vertices.
+
+        Args:
+            res: FacSearchColumns or list of dict (records)
+            DG: cprn DiGraph (facility embedded)
+            fac_types_src: facility types eligible as interval source (all if None)
+            cols_fac_attr: facility attributes to carry for src and tgt
+        """
+        if not isinstance(res, FacSearchColumns):
+            res = FacSearchColumns.from_records(list(res))
+        cols_fac_attr = list(cols_fac_attr)
+
+        dct_cols = dict(res.columns)
+        for attr in cols_fac_attr:
+            dct_cols[f'{attr}_tgt'] = res.fac_column(attr)
+
+        df_catalog = FacilityIndex.of(DG).catalog_df()
+        if fac_types_src is not None and len(df_catalog):
+            df_catalog = df_catalog[df_catalog['fac_type'].isin(fac_types_src)]
+        if len(df_catalog):
+            df_catalog = df_catalog.drop_duplicates(subset='vtx_fac', keep='first')
+            rows = pd.Index(df_catalog['vtx_fac']).get_indexer(res.columns['vtx_intvl_src'])
+        else:
+            rows = np.full(len(res), -1)
+        for attr in cols_fac_attr:
+            table = np.empty(len(df_catalog) + 1, dtype=object)
+            table[:-1] = df_catalog[attr].to_numpy(dtype=object) if attr in df_catalog else None
+            table[-1] = None
+            dct_cols[f'{attr}_src'] = table[rows]
+        return pd.DataFrame(dct_cols)
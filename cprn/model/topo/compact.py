@@ -0,0 +1,542 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : compact in-memory cprn model
+description : vertices and edges are interned as integer ids (geohashZ codes
+    kept once in a fixed-width byte array, edge codes derived from their
+    vertices), categorical edge / node attributes are stored as small-int
+    codes, and facility records are array-backed `__slots__` views; the
+    model is a `CprnCsrGraph`, so the csr searches run on it unchanged
+"""
+
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+from collections.abc import Mapping
+
+from loguru import logger as log
+
+from cprn.model.topo.csr_graph import CprnCsrGraph
+from cprn.model.topo.edge_mask import EdgeMask
+
+
+_MISSING = object()     # attribute absent (distinct from None)
+
+
+class _Column:
+    """ attribute column, categorical (small-int codes, -1 for missing) for
+    hashable values, else a plain object array (`_MISSING` for missing)
+    """
+    __slots__ = ('codes', 'categories', 'values')
+
+    def __init__(self, codes: np.ndarray = None, categories: np.ndarray = None, values: np.ndarray = None):
+        self.codes = codes
+        self.categories = categories
+        self.values = values
+
+    @staticmethod
+    def encode(lst_values: list) -> '_Column':
+        dct_code = {}
+        codes = np.empty(len(lst_values), dtype=np.int64)
+        try:
+            for i, x in enumerate(lst_values):
+                # 按 (类型, 值) 编码, 1 / 1.0 / True 不合并
+                codes[i] = -1 if x is _MISSING else dct_code.setdefault((type(x), x), len(dct_code))
+        except TypeError:
+            values = np.empty(len(lst_values), dtype=object)
+            values[:] = lst_values
+            return _Column(values=values)
+        categories = np.empty(len(dct_code), dtype=object)
+        categories[:] = [x for _, x in dct_code]
+        n_cat = len(categories)
+        dtype = np.int8 if n_cat < 2 ** 7 else np.int16 if n_cat < 2 ** 15 else np.int32
+        return _Column(codes=codes.astype(dtype), categories=categories)
+
+    def __len__(self) -> int:
+        return len(self.codes) if self.codes is not None else len(self.values)
+
+    def get(self, i: int):
+        """ value of row i, `_MISSING` if absent """
+        if self.codes is None:
+            return self.values[i]
+        code = self.codes[i]
+        return _MISSING if code < 0 else self.categories[code]
+
+    def decode(self) -> np.ndarray:
+        """ object array of all values, None where absent """
+        if self.codes is None:
+            arr = self.values.copy()
+            arr[[x is _MISSING for x in arr]] = None
+            return arr
+        table = np.empty(len(self.categories) + 1, dtype=object)
+        table[:-1] = self.categories
+        table[-1] = None
+        return table[self.codes]        # -1 -> trailing None
+
+    def nbytes(self) -> int:
+        if self.codes is None:
+            return self.values.nbytes
+        return self.codes.nbytes + self.categories.nbytes
+
+
+class _CodeArray:
+    """ vertex codes by integer id, packed as fixed-width bytes
+    """
+    __slots__ = ('codes',)
+
+    def __init__(self, codes: np.ndarray):
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self.codes[idx].decode()
+        arr = np.empty(len(self.codes[idx]), dtype=object)
+        arr[:] = [code.decode() for code in self.codes[idx].tolist()]
+        return arr
+
+    def __iter__(self):
+        return (code.decode() for code in self.codes.tolist())
+
+    def tolist(self) -> list:
+        return list(self)
+
+
+class _CodeIndex(Mapping):
+    """ vertex code -> integer id, by binary search over the packed codes
+    """
+    __slots__ = ('codes', 'sorter')
+
+    def __init__(self, codes: np.ndarray, sorter: np.ndarray):
+        self.codes = codes
+        self.sorter = sorter
+
+    def __getitem__(self, code: str) -> int:
+        if not isinstance(code, str):
+            raise KeyError(code)
+        key = code.encode()
+        pos = int(np.searchsorted(self.codes, key, sorter=self.sorter))
+        if pos < len(self.sorter):
+            v = int(self.sorter[pos])
+            if self.codes[v] == key:
+                return v
+        raise KeyError(code)
+
+    def __contains__(self, code) -> bool:
+        try:
+            self[code]
+        except (KeyError, UnicodeEncodeError):
+            return False
+        return True
+
+    def __iter__(self):
+        return (code.decode() for code in self.codes.tolist())
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class _EdgeCodes:
+    """ edge codes by edge id, "{u}_{v}" built on access (or a stored column)
+    """
+    __slots__ = ('G',)
+
+    def __init__(self, G: 'CompactCprnGraph'):
+        self.G = G
+
+    def __len__(self) -> int:
+        return len(self.G.edge_src)
+
+    def __getitem__(self, eid: int) -> str:
+        G = self.G
+        if G.edge_code_col is not None:
+            code = G.edge_code_col.get(eid)
+            return None if code is _MISSING else code
+        vtx_codes = G.vtx_codes.codes
+        return f"{vtx_codes[G.edge_src[eid]].decode()}_{vtx_codes[G.edge_tgt[eid]].decode()}"
+
+    def tolist(self) -> list:
+        return [self[eid] for eid in range(len(self))]
+
+
+class _HotEdgeCodes:
+    """ edge codes by edge id for the search hot loop (python list lookups,
+    vertex codes decoded once)
+    """
+    __slots__ = ('vtx_codes', 'edge_src', 'edge_tgt')
+
+    def __init__(self, G: 'CompactCprnGraph'):
+        self.vtx_codes = G.vtx_codes.tolist()
+        self.edge_src, self.edge_tgt = G.edge_src.tolist(), G.edge_tgt.tolist()
+
+    def __len__(self) -> int:
+        return len(self.edge_src)
+
+    def __getitem__(self, eid: int) -> str:
+        return f"{self.vtx_codes[self.edge_src[eid]]}_{self.vtx_codes[self.edge_tgt[eid]]}"
+
+
+class _EdgeAttrs:
+    """ edge attribute dicts by edge id, rebuilt from the columns on access
+    """
+    __slots__ = ('G',)
+
+    def __init__(self, G: 'CompactCprnGraph'):
+        self.G = G
+
+    def __len__(self) -> int:
+        return len(self.G.edge_src)
+
+    def __getitem__(self, eid: int) -> dict:
+        return self.G.edge_attr(eid)
+
+    def __iter__(self):
+        return (self.G.edge_attr(eid) for eid in range(len(self)))
+
+
+class FacRecord(Mapping):
+    """ read-only facility record (a row of `FacTable`), usable as a dict
+    (`fac['fac_code']`, `fac.get(...)`, `{**fac}`)
+    """
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: 'FacTable', row: int):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        col = self.table.columns.get(key)
+        value = _MISSING if col is None else col.get(self.row)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (key for key, col in self.table.columns.items() if col.get(self.row) is not _MISSING)
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self) -> list:
+        # `**fac` 解包: 一次取出全部非缺失键
+        return [key for key, col in self.table.columns.items() if col.get(self.row) is not _MISSING]
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class FacTable:
+    """ facility records as attribute columns, rows viewed as `FacRecord`
+    """
+    __slots__ = ('columns', 'n')
+
+    def __init__(self, columns: dict, n: int):
+        self.columns = columns
+        self.n = n
+
+    @staticmethod
+    def from_records(lst_records: list) -> 'FacTable':
+        dct_keys = {}
+        for rec in lst_records:
+            dct_keys.update(dict.fromkeys(rec))
+        columns = {key: _Column.encode([rec.get(key, _MISSING) for rec in lst_records]) for key in dct_keys}
+        return FacTable(columns, len(lst_records))
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, row: int) -> FacRecord:
+        if not -self.n <= row < self.n:
+            raise IndexError(row)
+        return FacRecord(self, row % self.n)
+
+    def __iter__(self):
+        return (FacRecord(self, row) for row in range(self.n))
+
+    def to_dicts(self) -> list[dict]:
+        return [dict(rec) for rec in self]
+
+    def nbytes(self) -> int:
+        return sum(col.nbytes() for col in self.columns.values())
+
+
+class CompactCprnGraph(CprnCsrGraph):
+    """ Compact, array-backed cprn model (a `CprnCsrGraph`)
+
+    Attributes (in addition to the CSR arrays of `CprnCsrGraph`):
+        vtx_codes: vertex codes packed as fixed-width bytes (str on access)
+        vtx_index: code -> integer id by binary search (no dict of strings)
+        edge_codes: "{u}_{v}" built on access when all edges follow it
+        edge_cols / node_cols: attribute -> categorical column (small-int codes)
+        edge_id_indptr, edge_id_flat: packed `edge_id` lists by edge id
+        fac_records: `FacTable` of `FacRecord` (array-backed records)
+
+    Example:
+        >>> cg = CprnTopoSearch.compile_cprn(dg_cprn, compact=True)
+        >>> cg.nbytes()
+        >>> CprnTopoSearch.fac_bfs_depth(cg, vtx, ['G1'], 'downstream')
+        >>> dg_cprn = cg.to_digraph()
+    """
+    FAC_KEYS = ('fac_types', 'lst_fac_attr')
+
+    def __init__(self, vtx_codes: np.ndarray, vtx_sorter: np.ndarray,
+                 fwd_indptr, fwd_nbr, fwd_eid, rev_indptr, rev_nbr, rev_eid,
+                 edge_src, edge_tgt, weight, weight_missing,
+                 edge_code_col, edge_cols: dict, edge_id_indptr, edge_id_flat,
+                 node_cols: dict, has_fac_types, has_lst_fac, fac_type_bits: dict,
+                 vtx_fac_mask, fac_indptr, fac_records: FacTable, fac_rec_mask,
+                 graph_attr: dict = None, edge_code_attr: str = 'edge_code',
+                 edge_id_attr: str = 'edge_id', edge_keys: tuple = None, node_keys: tuple = None):
+        self.vtx_codes = _CodeArray(vtx_codes)
+        self.vtx_index = _CodeIndex(vtx_codes, vtx_sorter)
+        self.fwd_indptr, self.fwd_nbr, self.fwd_eid = fwd_indptr, fwd_nbr, fwd_eid
+        self.rev_indptr, self.rev_nbr, self.rev_eid = rev_indptr, rev_nbr, rev_eid
+        self.edge_src, self.edge_tgt = edge_src, edge_tgt
+        self.weight = weight
+        self.weight_missing = weight_missing
+        self.edge_code_col = edge_code_col
+        self.edge_cols = edge_cols
+        self.edge_id_indptr, self.edge_id_flat = edge_id_indptr, edge_id_flat
+        self.node_cols = node_cols
+        self.has_fac_types, self.has_lst_fac = has_fac_types, has_lst_fac
+        self.fac_type_bits = fac_type_bits
+        self.vtx_fac_mask = vtx_fac_mask
+        self.fac_indptr = fac_indptr
+        self.fac_records = fac_records
+        self.fac_rec_mask = fac_rec_mask
+        self.graph_attr = graph_attr if graph_attr is not None else {}
+        self.edge_code_attr = edge_code_attr
+        self.edge_id_attr = edge_id_attr
+        # 属性键顺序 (首次出现顺序), 还原 DiGraph 时保持
+        self.edge_keys = tuple(edge_keys) if edge_keys is not None else \
+            (*edge_cols, 'weight', edge_code_attr, edge_id_attr)
+        self.node_keys = tuple(node_keys) if node_keys is not None else (*node_cols, *CompactCprnGraph.FAC_KEYS)
+        self.edge_codes = _EdgeCodes(self)
+        self.edge_attrs = _EdgeAttrs(self)
+        self._hot = {}
+        self._edge_masks = {}
+
+        for arr in (vtx_codes, vtx_sorter, fwd_indptr, fwd_nbr, fwd_eid, rev_indptr, rev_nbr, rev_eid,
+                    edge_src, edge_tgt, weight, vtx_fac_mask, fac_indptr, fac_rec_mask):
+            arr.flags.writeable = False
+
+    def __repr__(self) -> str:
+        return (f"CompactCprnGraph with {self.number_of_nodes()} nodes, {self.number_of_edges()} edges "
+                f"and {len(self.fac_records)} facility records ({self.nbytes() / 2 ** 20:.1f} MiB)")
+
+    def __getstate__(self) -> dict:
+        state = {k: v for k, v in self.__dict__.items()
+                 if k not in ('vtx_codes', 'vtx_index', 'edge_codes', 'edge_attrs', '_hot', '_edge_masks')}
+        state['vtx_codes'] = self.vtx_codes.codes
+        state['vtx_sorter'] = self.vtx_index.sorter
+        return state
+
+    def __setstate__(self, state: dict):
+        state = dict(state)
+        vtx_codes, vtx_sorter = state.pop('vtx_codes'), state.pop('vtx_sorter')
+        self.__dict__.update(state)
+        self.vtx_codes = _CodeArray(vtx_codes)
+        self.vtx_index = _CodeIndex(vtx_codes, vtx_sorter)
+        self.edge_codes = _EdgeCodes(self)
+        self.edge_attrs = _EdgeAttrs(self)
+        self._hot = {}
+        self._edge_masks = {}
+
+    @staticmethod
+    def from_digraph(DG: nx.DiGraph, edge_code_attr: str = 'edge_code',
+                     edge_id_attr: str = 'edge_id', verbose: bool = False) -> 'CompactCprnGraph':
+        """ compile a cprn DiGraph into a compact model (DG not kept)
+        """
+        G = CprnCsrGraph.from_digraph(DG, edge_code_attr=edge_code_attr)
+        n_vtx, n_edge = G.number_of_nodes(), G.number_of_edges()
+
+        # vertices : fixed-width bytes, sorted order for lookups
+        vtx_codes = np.array([str(vtx).encode() for vtx in G.vtx_codes.tolist()], dtype=bytes)
+        if len(np.unique(vtx_codes)) != n_vtx or any(type(vtx) is not str for vtx in G.vtx_codes.tolist()):
+            raise ValueError("Compact model needs distinct str vertex ids")
+        vtx_sorter = np.argsort(vtx_codes, kind='stable')
+
+        # edges : weight, edge_code (derived if "{u}_{v}"), edge_id lists, other attributes
+        lst_attr = G.edge_attrs
+        weight_missing = np.fromiter(('weight' not in attr for attr in lst_attr), dtype=bool, count=n_edge)
+        weight_missing = weight_missing if weight_missing.any() else None
+        src_codes, tgt_codes = G.vtx_codes[G.edge_src], G.vtx_codes[G.edge_tgt]
+        is_derived = all(attr.get(edge_code_attr, _MISSING) == f"{u}_{v}"
+                         for attr, u, v in zip(lst_attr, src_codes.tolist(), tgt_codes.tolist()))
+        edge_code_col = None if is_derived else _Column.encode([attr.get(edge_code_attr, _MISSING) for attr in lst_attr])
+
+        lst_eid_len, lst_eid_flat, is_eid_list = [], [], True
+        for attr in lst_attr:
+            edge_id = attr.get(edge_id_attr, _MISSING)
+            if edge_id is _MISSING:
+                lst_eid_len.append(-1)
+            elif isinstance(edge_id, list):
+                lst_eid_len.append(len(edge_id))
+                lst_eid_flat.extend(edge_id)
+            else:
+                is_eid_list = False
+                break
+        if is_eid_list and any(n >= 0 for n in lst_eid_len):
+            arr_len = np.array(lst_eid_len, dtype=np.int64)
+            edge_id_indptr = np.zeros(n_edge + 1, dtype=np.int64)
+            np.cumsum(np.maximum(arr_len, 0), out=edge_id_indptr[1:])
+            edge_id_indptr[1:][arr_len < 0] = -1 - edge_id_indptr[1:][arr_len < 0]     # 无 edge_id 的边记为负
+            if all(type(e) is int for e in lst_eid_flat):
+                edge_id_flat = np.array(lst_eid_flat, dtype=np.int64)
+            else:
+                edge_id_flat = np.empty(len(lst_eid_flat), dtype=object)
+                edge_id_flat[:] = lst_eid_flat
+        else:
+            edge_id_indptr = edge_id_flat = None
+
+        set_special = {'weight', edge_code_attr} | ({edge_id_attr} if edge_id_indptr is not None else set())
+        dct_keys = {}
+        for attr in lst_attr:
+            dct_keys.update(dict.fromkeys(attr))
+        edge_cols = {key: _Column.encode([attr.get(key, _MISSING) for attr in lst_attr])
+                     for key in dct_keys if key not in set_special}
+        edge_keys = tuple(dct_keys)
+
+        # nodes : attributes other than facilities, facility flags
+        lst_node_attr = [attr for _, attr in DG.nodes(data=True)]
+        dct_keys = {}
+        for attr in lst_node_attr:
+            dct_keys.update(dict.fromkeys(attr))
+        node_cols = {key: _Column.encode([attr.get(key, _MISSING) for attr in lst_node_attr])
+                     for key in dct_keys if key not in CompactCprnGraph.FAC_KEYS}
+        node_keys = tuple(dct_keys)
+        has_fac_types = np.fromiter(('fac_types' in attr for attr in lst_node_attr), dtype=bool, count=n_vtx)
+        has_lst_fac = np.fromiter(('lst_fac_attr' in attr for attr in lst_node_attr), dtype=bool, count=n_vtx)
+
+        # 整数下标: 规模允许时降为 int32
+        dtype = np.int32 if max(n_vtx, n_edge, len(G.fac_records)) < 2 ** 31 else np.int64
+        idx = lambda arr: arr.astype(dtype)
+        cg = CompactCprnGraph(vtx_codes, idx(vtx_sorter),
+            idx(G.fwd_indptr), idx(G.fwd_nbr), idx(G.fwd_eid), idx(G.rev_indptr), idx(G.rev_nbr), idx(G.rev_eid),
+            idx(G.edge_src), idx(G.edge_tgt), G.weight, weight_missing,
+            edge_code_col, edge_cols, edge_id_indptr, edge_id_flat,
+            node_cols, has_fac_types, has_lst_fac, dict(G.fac_type_bits),
+            G.vtx_fac_mask, idx(G.fac_indptr), FacTable.from_records(G.fac_records), G.fac_rec_mask,
+            graph_attr=dict(DG.graph), edge_code_attr=edge_code_attr, edge_id_attr=edge_id_attr,
+            edge_keys=edge_keys, node_keys=node_keys)
+        log.info(f"Compiled {cg}") if verbose else None
+        return cg
+
+    def number_of_edges(self) -> int:
+        return len(self.edge_src)
+
+    def hot_edges(self) -> tuple:
+        """ (weight list, edge codes) by edge id, edge codes built on access
+        """
+        if 'edges' not in self._hot:
+            edge_codes = self.edge_codes if self.edge_code_col is not None else _HotEdgeCodes(self)
+            self._hot['edges'] = (self.weight.tolist(), edge_codes)
+        return self._hot['edges']
+
+    def edge_ids(self, eid: int) -> list:
+        """ `edge_id` list of an edge (None if the edge has none) """
+        if self.edge_id_indptr is None:
+            return None
+        end = self.edge_id_indptr[eid + 1]
+        if end < 0:
+            return None
+        start = self.edge_id_indptr[eid]
+        start = -1 - start if start < 0 else start
+        return self.edge_id_flat[start:end].tolist()
+
+    def edge_attr(self, eid: int) -> dict:
+        """ attribute dict of an edge, as in the source DiGraph
+        """
+        dct = {}
+        for key in self.edge_keys:
+            col = self.edge_cols.get(key)
+            if col is not None:
+                value = col.get(eid)
+            elif key == 'weight':
+                value = _MISSING if self.weight_missing is not None and self.weight_missing[eid] \
+                    else self.weight[eid].item()
+            elif key == self.edge_code_attr:
+                value = self.edge_codes[eid]
+                value = _MISSING if value is None else value
+            elif key == self.edge_id_attr:
+                value = self.edge_ids(eid)
+                value = _MISSING if value is None else value
+            else:
+                value = _MISSING
+            if value is not _MISSING:
+                dct[key] = value
+        return dct
+
+    def edge_column(self, name: str) -> np.ndarray:
+        """ object array of an edge attribute by edge id (None where absent)
+        """
+        if name in self.edge_cols:
+            return self.edge_cols[name].decode()
+        if name == 'weight':
+            arr = self.weight.astype(object)
+            if self.weight_missing is not None:
+                arr[self.weight_missing] = None
+            return arr
+        arr = np.empty(self.number_of_edges(), dtype=object)
+        if name == self.edge_code_attr:
+            arr[:] = self.edge_codes.tolist()
+        elif name == self.edge_id_attr and self.edge_id_indptr is not None:
+            arr[:] = [self.edge_ids(eid) for eid in range(len(arr))]
+        return arr
+
+    def edge_mask(self, query_avoid_edge: str) -> np.ndarray:
+        """ boolean mask by edge id of edges matching a `DictQuery` expression,
+        evaluated on the decoded columns (cached per expression)
+        """
+        if query_avoid_edge not in self._edge_masks:
+            mask = EdgeMask.evaluate(query_avoid_edge, self.edge_attrs, get_column=self.edge_column).copy()
+            mask.flags.writeable = False
+            self._edge_masks[query_avoid_edge] = mask
+        return self._edge_masks[query_avoid_edge]
+
+    def node_attr(self, v: int) -> dict:
+        """ attribute dict of a vertex (facilities included), as in the source DiGraph
+        """
+        dct = {}
+        for key in self.node_keys:
+            col = self.node_cols.get(key)
+            if col is not None:
+                value = col.get(v)
+                if value is not _MISSING:
+                    dct[key] = value
+            elif key == 'fac_types' and self.has_fac_types[v]:
+                mask = int(self.vtx_fac_mask[v])
+                dct['fac_types'] = {fac_type for fac_type, bit in self.fac_type_bits.items() if mask >> bit & 1}
+            elif key == 'lst_fac_attr' and self.has_lst_fac[v]:
+                dct['lst_fac_attr'] = [dict(self.fac_records[i])
+                                       for i in range(self.fac_indptr[v], self.fac_indptr[v + 1])]
+        return dct
+
+    def to_digraph(self) -> nx.DiGraph:
+        """ networkx DiGraph with the nodes, edges and attributes of the source
+        """
+        DG = nx.DiGraph()
+        DG.graph.update(self.graph_attr)
+        vtx_codes = self.vtx_codes.tolist()
+        DG.add_nodes_from((vtx, self.node_attr(v)) for v, vtx in enumerate(vtx_codes))
+        DG.add_edges_from((vtx_codes[u], vtx_codes[v], self.edge_attr(eid))
+                          for eid, (u, v) in enumerate(zip(self.edge_src.tolist(), self.edge_tgt.tolist())))
+        return DG
+
+    def nbytes(self) -> int:
+        """ bytes held by the arrays of the model (python list caches excluded)
+        """
+        n = sum(arr.nbytes for arr in (self.vtx_codes.codes, self.vtx_index.sorter,
+            self.fwd_indptr, self.fwd_nbr, self.fwd_eid, self.rev_indptr, self.rev_nbr, self.rev_eid,
+            self.edge_src, self.edge_tgt, self.weight, self.vtx_fac_mask, self.fac_indptr,
+            self.fac_rec_mask, self.has_fac_types, self.has_lst_fac))
+        n += sum(col.nbytes() for col in list(self.edge_cols.values()) + list(self.node_cols.values()))
+        n += self.edge_code_col.nbytes() if self.edge_code_col is not None else 0
+        n += self.edge_id_indptr.nbytes + self.edge_id_flat.nbytes if self.edge_id_indptr is not None else 0
+        return n + self.fac_records.nbytes()
@@ -0,0 +1,219 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : frozen CSR (compressed sparse row) snapshot of a cprn DiGraph
+description : integer vertex ids, forward / reverse adjacency, weight and
+    edge code arrays and per-vertex facility offsets, compiled once from a
+    loaded cprn `nx.DiGraph` so that searches skip networkx dict lookups
+"""
+
+
+import numpy as np
+import networkx as nx
+
+from cprn.model.topo.edge_mask import EdgeMask
+
+
+class CprnCsrGraph:
+    """ Frozen, array-backed snapshot of a cprn DiGraph
+
+    Attributes (all numpy arrays are read-only):
+        vtx_codes: object array, vertex id (geohashZ) by integer vertex id
+        vtx_index: dict, geohashZ -> integer vertex id
+        fwd_indptr, fwd_nbr, fwd_eid: forward CSR, successors of v are
+            fwd_nbr[fwd_indptr[v]:fwd_indptr[v+1]] reached by edges fwd_eid[...]
+        rev_indptr, rev_nbr, rev_eid: reverse CSR (predecessors)
+        edge_src, edge_tgt: int arrays, endpoints by edge id
+        weight: numeric array, edge weight by edge id (default 1)
+        edge_codes: object array, edge code by edge id (None if missing)
+        edge_attrs: list, original edge attribute dicts by edge id
+        fac_type_bits: dict, fac_type -> bit index
+        vtx_fac_mask: int64 array, bitmask of node attribute `fac_types`
+        fac_indptr: facility records of v are fac_records[fac_indptr[v]:fac_indptr[v+1]]
+        fac_records: list, facility record dicts (from node `lst_fac_attr`)
+        fac_rec_mask: int64 array, fac_type bit of every facility record
+
+    Neighbor order follows `DG.successors` / `DG.predecessors`, so a search on
+    the snapshot visits vertices in the same order as on the DiGraph.
+
+    Example:
+        >>> csr = CprnCsrGraph.from_digraph(dg_cprn)
+        >>> CprnTopoSearch.fac_bfs_depth(csr, vtx, ['G1'], 'downstream')
+    """
+
+    def __init__(self, vtx_codes, fwd_indptr, fwd_nbr, fwd_eid,
+                 rev_indptr, rev_nbr, rev_eid, edge_src, edge_tgt,
+                 weight, edge_codes, edge_attrs, fac_type_bits, vtx_fac_mask,
+                 fac_indptr, fac_records, fac_rec_mask,
+                 edge_code_attr: str = 'edge_code'):
+        self.vtx_codes = vtx_codes
+        self.vtx_index = {code: i for i, code in enumerate(vtx_codes)}
+        self.fwd_indptr, self.fwd_nbr, self.fwd_eid = fwd_indptr, fwd_nbr, fwd_eid
+        self.rev_indptr, self.rev_nbr, self.rev_eid = rev_indptr, rev_nbr, rev_eid
+        self.edge_src, self.edge_tgt = edge_src, edge_tgt
+        self.weight = weight
+        self.edge_codes = edge_codes
+        self.edge_attrs = edge_attrs
+        self.fac_type_bits = fac_type_bits
+        self.vtx_fac_mask = vtx_fac_mask
+        self.fac_indptr = fac_indptr
+        self.fac_records = fac_records
+        self.fac_rec_mask = fac_rec_mask
+        self.edge_code_attr = edge_code_attr
+        self._hot = {}  # cached python list views for the search hot loop
+        self._edge_masks = {}   # query_avoid_edge -> blocked edge mask
+
+        for arr in (vtx_codes, fwd_indptr, fwd_nbr, fwd_eid, rev_indptr, rev_nbr, rev_eid,
+                    edge_src, edge_tgt, weight, edge_codes, vtx_fac_mask, fac_indptr, fac_rec_mask):
+            arr.flags.writeable = False
+
+    def __repr__(self) -> str:
+        return (f"CprnCsrGraph with {self.number_of_nodes()} nodes, "
+                f"{self.number_of_edges()} edges and {len(self.fac_records)} facility records")
+
+    def number_of_nodes(self) -> int:
+        return len(self.vtx_codes)
+
+    def number_of_edges(self) -> int:
+        return len(self.edge_src)
+
+    @staticmethod
+    def from_digraph(DG: nx.DiGraph, edge_code_attr: str = 'edge_code') -> 'CprnCsrGraph':
+        """ compile a cprn DiGraph (facility may embedded) into a frozen CSR snapshot
+        """
+        vtx_codes = np.empty(DG.number_of_nodes(), dtype=object)
+        vtx_codes[:] = list(DG.nodes)
+        vtx_index = {code: i for i, code in enumerate(vtx_codes)}
+        n_vtx, n_edge = len(vtx_codes), DG.number_of_edges()
+
+        # edges, in `DG.edges` order (grouped by source, successor order kept)
+        edge_src = np.empty(n_edge, dtype=np.int64)
+        edge_tgt = np.empty(n_edge, dtype=np.int64)
+        lst_weight = []
+        edge_codes = np.empty(n_edge, dtype=object)
+        edge_attrs = []
+        dct_eid = {}
+        for eid, (u, v, data) in enumerate(DG.edges(data=True)):
+            edge_src[eid], edge_tgt[eid] = vtx_index[u], vtx_index[v]
+            lst_weight.append(data.get('weight', 1))
+            edge_codes[eid] = data.get(edge_code_attr, None)
+            edge_attrs.append(data)
+            dct_eid[(u, v)] = eid
+        # int weights stay int64, any float weight promotes the array to float64
+        weight = np.array(lst_weight) if lst_weight else np.empty(0, dtype=np.float64)
+
+        # forward CSR : `DG.edges` is already grouped by source in successor order
+        fwd_indptr = np.zeros(n_vtx + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_src, minlength=n_vtx), out=fwd_indptr[1:])
+        fwd_nbr = edge_tgt.copy()
+        fwd_eid = np.arange(n_edge, dtype=np.int64)
+
+        # reverse CSR : follow `DG.pred` order to keep predecessor order
+        rev_indptr = np.zeros(n_vtx + 1, dtype=np.int64)
+        rev_nbr = np.empty(n_edge, dtype=np.int64)
+        rev_eid = np.empty(n_edge, dtype=np.int64)
+        pos = 0
+        for i, v in enumerate(vtx_codes):
+            for u in DG.pred[v]:
+                rev_nbr[pos], rev_eid[pos] = vtx_index[u], dct_eid[(u, v)]
+                pos += 1
+            rev_indptr[i + 1] = pos
+
+        # facilities : per-vertex `fac_types` mask and flattened `lst_fac_attr`
+        fac_type_bits = {}
+
+        def type_mask(fac_type) -> int:
+            if fac_type not in fac_type_bits:
+                if len(fac_type_bits) >= 63:
+                    raise ValueError("CprnCsrGraph supports at most 63 distinct facility types")
+                fac_type_bits[fac_type] = len(fac_type_bits)
+            return 1 << fac_type_bits[fac_type]
+
+        vtx_fac_mask = np.zeros(n_vtx, dtype=np.int64)
+        fac_indptr = np.zeros(n_vtx + 1, dtype=np.int64)
+        fac_records, lst_rec_mask = [], []
+        for i, (v, data) in enumerate(DG.nodes(data=True)):
+            mask = 0
+            for fac_type in data.get('fac_types', ()):
+                mask |= type_mask(fac_type)
+            vtx_fac_mask[i] = mask
+            for fac in data.get('lst_fac_attr', None) or ():
+                fac_records.append(fac)
+                lst_rec_mask.append(type_mask(fac.get('fac_type')))
+            fac_indptr[i + 1] = len(fac_records)
+        fac_rec_mask = np.array(lst_rec_mask, dtype=np.int64)
+
+        return CprnCsrGraph(vtx_codes, fwd_indptr, fwd_nbr, fwd_eid,
+            rev_indptr, rev_nbr, rev_eid, edge_src, edge_tgt,
+            weight, edge_codes, edge_attrs, fac_type_bits, vtx_fac_mask,
+            fac_indptr, fac_records, fac_rec_mask, edge_code_attr=edge_code_attr)
+
+    def fac_vertices(self) -> np.ndarray:
+        """ vertex id (geohashZ) of every facility record, aligned with `fac_records`
+        """
+        rows = np.repeat(np.arange(self.number_of_nodes()), np.diff(self.fac_indptr))
+        return self.vtx_codes[rows]
+
+    def fac_mask(self, fac_types) -> int:
+        """ bitmask of given facility types (unknown types are ignored)
+        """
+        mask = 0
+        for fac_type in fac_types:
+            bit = self.fac_type_bits.get(fac_type)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def hot_views(self, direction: str) -> tuple:
+        """ python list views (indptr, nbr, eid) of the adjacency in `direction`
+
+        Indexing python lists is several times faster than indexing numpy
+        scalars from pure python loops; the views are built once and cached.
+        """
+        if direction not in self._hot:
+            if direction == 'downstream':
+                arrs = (self.fwd_indptr, self.fwd_nbr, self.fwd_eid)
+            elif direction == 'upstream':
+                arrs = (self.rev_indptr, self.rev_nbr, self.rev_eid)
+            else:
+                raise ValueError("Direction must be 'downstream' or 'upstream'.")
+            self._hot[direction] = tuple(arr.tolist() for arr in arrs)
+        return self._hot[direction]
+
+    def hot_edges(self) -> tuple:
+        """ python list views (weight, edge_codes) by edge id
+        """
+        if 'edges' not in self._hot:
+            self._hot['edges'] = (self.weight.tolist(), self.edge_codes.tolist())
+        return self._hot['edges']
+
+    def hot_facilities(self) -> tuple:
+        """ python list views (vtx_fac_mask, fac_indptr, fac_rec_mask)
+        """
+        if 'facilities' not in self._hot:
+            self._hot['facilities'] = (self.vtx_fac_mask.tolist(),
+                self.fac_indptr.tolist(), self.fac_rec_mask.tolist())
+        return self._hot['facilities']
+
+    def edge_mask(self, query_avoid_edge: str) -> np.ndarray:
+        """ boolean mask by edge id of edges matching a `DictQuery` expression
+        (evaluated column-wise by `EdgeMask`)
+
+        The snapshot is frozen, so masks are computed once per expression and cached.
+        """
+        if query_avoid_edge not in self._edge_masks:
+            mask = EdgeMask.evaluate(query_avoid_edge, self.edge_attrs).copy()
+            mask.flags.writeable = False
+            self._edge_masks[query_avoid_edge] = mask
+        return self._edge_masks[query_avoid_edge]
+
+    def hot_edge_mask(self, query_avoid_edge: str) -> list:
+        """ python list view of `edge_mask`
+        """
+        key = ('edge_mask', query_avoid_edge)
+        if key not in self._hot:
+            self._hot[key] = self.edge_mask(query_avoid_edge).tolist()
+        return self._hot[key]
@@ -0,0 +1,105 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : divergent / convergent (DC) node detection (cprn)
+description : vertices are classified as convergent (CONV, DC1), divergent
+    (DIV, DC2) or both (MULTI, DC3) from in / out degree arrays in one
+    vectorized pass, the result is a facility table ready to be embedded
+    (`vtx_fac`, `fac_code`, `fac_type`, `fac_name`)
+"""
+
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger as log
+
+from cprn.model.topo.csr_graph import CprnCsrGraph
+
+
+class DcNodes:
+    """ Divergent / convergent node detection
+
+    Classification (as `get_dc_type` of the facility binding notebooks):
+        - CONV  (DC1): in_degree > 1 and out_degree == 1
+        - DIV   (DC2): in_degree == 1 and out_degree > 1
+        - MULTI (DC3): in_degree > 1 and out_degree > 1
+        - OTHER (DCX): everything else, not embedded (e.g. 0->2, 3->0)
+
+    Example:
+        >>> df_fac_dcp_bind = DcNodes.find(dg_cprn)
+        >>> df_fac_dcp_bind.sample(4)
+                          vtx_fac            fac_code fac_type fac_name
+        WTSW3V30BSGD002220  WTSW3V30BSGD002220  WTSW3V30BSGD002220      DC2      1|2
+        >>> FacEmbd.fac_embed_cprn(cprn=dg_cprn, gdf_fac=df_fac_dcp_bind, col_vtx='vtx_fac')
+    """
+    DC_TYPES = ('CONV', 'DIV', 'MULTI', 'OTHER')
+    FAC_TYPES = {'CONV': 'DC1', 'DIV': 'DC2', 'MULTI': 'DC3', 'OTHER': 'DCX'}
+
+    @staticmethod
+    def degree_arrays(DG) -> tuple:
+        """ vertex ids, in_degree and out_degree arrays (in node order)
+
+        Args:
+            DG: networkx.DiGraph or CprnCsrGraph
+        """
+        if isinstance(DG, CprnCsrGraph):
+            return DG.vtx_codes, np.diff(DG.rev_indptr), np.diff(DG.fwd_indptr)
+        n = DG.number_of_nodes()
+        vtx_codes = np.empty(n, dtype=object)
+        vtx_codes[:] = list(DG.nodes)
+        # pred / succ 邻接字典与节点同序, 仅取长度
+        in_degree = np.fromiter(map(len, DG.pred.values()), dtype=np.int64, count=n)
+        out_degree = np.fromiter(map(len, DG.succ.values()), dtype=np.int64, count=n)
+        return vtx_codes, in_degree, out_degree
+
+    @staticmethod
+    def classify(in_degree: np.ndarray, out_degree: np.ndarray) -> np.ndarray:
+        """ DC type code per vertex, index into `DC_TYPES` (3: OTHER)
+        """
+        in_degree, out_degree = np.asarray(in_degree), np.asarray(out_degree)
+        return np.select(
+            [(in_degree > 1) & (out_degree == 1),
+             (in_degree == 1) & (out_degree > 1),
+             (in_degree > 1) & (out_degree > 1)],
+            [0, 1, 2], default=3).astype(np.int8)
+
+    @staticmethod
+    def find(DG, dc_types: list = ('CONV', 'DIV', 'MULTI'),
+             with_degree: bool = False,
+             verbose: bool = False) -> pd.DataFrame:
+        """ facility table of divergent / convergent vertices
+
+        Args:
+            DG: networkx.DiGraph or CprnCsrGraph
+            dc_types: DC types to keep (of `DC_TYPES`), OTHER is dropped by default
+            with_degree: add columns `dc_type`, `in_degree`, `out_degree`
+        Returns:
+            DataFrame indexed by vertex, columns `vtx_fac`, `fac_code` (both the
+            vertex), `fac_type` (DC1 / DC2 / DC3) and `fac_name` ("in|out"), in
+            node order
+        """
+        vtx_codes, in_degree, out_degree = DcNodes.degree_arrays(DG)
+        code = DcNodes.classify(in_degree, out_degree)
+        codes_keep = [DcNodes.DC_TYPES.index(dc_type) for dc_type in dc_types]
+        idx = np.flatnonzero(np.isin(code, codes_keep))
+
+        vtx = vtx_codes[idx]
+        deg_in, deg_out = in_degree[idx], out_degree[idx]
+        arr_fac_type = np.array([DcNodes.FAC_TYPES[t] for t in DcNodes.DC_TYPES], dtype=object)
+        fac_name = np.char.add(np.char.add(deg_in.astype(str), '|'), deg_out.astype(str)).astype(object)
+
+        df_dc = pd.DataFrame({'vtx_fac': vtx, 'fac_code': vtx,
+                              'fac_type': arr_fac_type[code[idx]],
+                              'fac_name': fac_name},
+                             index=pd.Index(vtx))
+        if with_degree:
+            df_dc['dc_type'] = np.array(DcNodes.DC_TYPES, dtype=object)[code[idx]]
+            df_dc['in_degree'] = deg_in
+            df_dc['out_degree'] = deg_out
+        log.info(f"DC nodes : {len(df_dc)} of {len(vtx_codes)} vertices "
+                 f"{df_dc['fac_type'].value_counts().to_dict()}") if verbose else None
+        return df_dc
@@ -0,0 +1,228 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : shortened edge -> original edge / geometry index (cprn)
+description : every `edge_code` of a (shortened) cprn DiGraph is mapped to
+    its ordered original `edge_id`s and to their coordinates in one packed
+    coordinate array (CSR offsets), carried by the model so that geometry of
+    search intervals is assembled in memory, without the explode / merge /
+    groupby against the roads table or a database round-trip
+"""
+
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+import shapely
+from shapely.geometry import LineString
+
+from loguru import logger as log
+
+from cprn.model.geohash import Geohash
+
+
+class EdgeGeometryIndex:
+    """ Packed edge geometry index of a cprn DiGraph
+
+    Attributes:
+        edge_codes: object array, edge code by row
+        code_index: dict, edge code -> row
+        eid_indptr: original edge ids of row r are eids[eid_indptr[r]:eid_indptr[r+1]]
+        eids: array of original edge ids (int64 if all integer, else object)
+        coord_indptr: coordinates of original edge slot k are coords[coord_indptr[k]:coord_indptr[k+1]]
+        coords: float64 array (n, 2) of lon, lat, or (n, 3) with z
+
+    Original edges of one edge code occupy consecutive slots, so the geometry
+    of an edge code is one slice of `coords`.
+
+    Example:
+        >>> sr_geom = gdf_roads_cprn.set_index('edge_idx')['geom']
+        >>> EdgeGeometryIndex.build(dg_cprn_short, sr_geom)     # attached to dg_cprn_short.graph
+        >>> gidx = EdgeGeometryIndex.of(dg_cprn_short)
+        >>> gidx.edge_ids(edge_code)
+        >>> gidx.path_geometry(dct_interval['interval_edges'], direction='upstream')
+        <LINESTRING (120.1 31.2, ...)>
+    """
+    GRAPH_KEY = 'edge_geom_index'
+
+    def __init__(self, edge_codes: np.ndarray, eid_indptr: np.ndarray, eids: np.ndarray,
+                 coord_indptr: np.ndarray, coords: np.ndarray):
+        self.edge_codes = edge_codes
+        self.eid_indptr = eid_indptr
+        self.eids = eids
+        self.coord_indptr = coord_indptr
+        self.coords = coords
+        self.code_index = {code: i for i, code in enumerate(edge_codes)}
+
+    def __repr__(self) -> str:
+        return (f"EdgeGeometryIndex({len(self.edge_codes)} edge codes, {len(self.eids)} original edges, "
+                f"{len(self.coords)} coordinates)")
+
+    def __len__(self) -> int:
+        return len(self.edge_codes)
+
+    def __getstate__(self) -> dict:
+        # code_index 可由 edge_codes 重建, 不随模型持久化
+        return {k: v for k, v in self.__dict__.items() if k != 'code_index'}
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.code_index = {code: i for i, code in enumerate(self.edge_codes)}
+
+    @staticmethod
+    def build(DG: nx.DiGraph, geoms=None,
+              edge_code_attr: str = 'edge_code',
+              edge_id_attr: str = 'edge_id',
+              with_z: bool = False,
+              attach: bool = True,
+              verbose: bool = False) -> 'EdgeGeometryIndex':
+        """ build the index of all edges of DG
+
+        Args:
+            DG: cprn DiGraph, shortened (`edge_id` lists, see `CprnShortener`) or not
+            geoms: original edge geometries by edge id, pandas Series or dict of
+                shapely (Multi)LineString (e.g. roads table `geom` indexed by
+                `edge_idx`); edge ids without geometry (connectors) become a
+                straight segment between the decoded vertices of the id
+                "{u}_{v}", or of the edge
+            edge_code_attr: edge code attribute ("{u}_{v}" if missing)
+            edge_id_attr: list of original edge ids ([edge code] if missing)
+            with_z: keep z coordinates (3 columns)
+            attach: store the index in `DG.graph` (persisted with the model)
+        """
+        lst_codes, lst_eids, lst_ends, lst_nids = [], [], [], []
+        for u, v, data in DG.edges(data=True):
+            edge_code = data.get(edge_code_attr) or f"{u}_{v}"
+            edge_ids = data.get(edge_id_attr)
+            if edge_ids is None:
+                edge_ids = [edge_code]
+            elif not isinstance(edge_ids, list):
+                edge_ids = [edge_ids]
+            lst_codes.append(edge_code)
+            lst_nids.append(len(edge_ids))
+            lst_eids.extend(edge_ids)
+            lst_ends.extend([(u, v)] * len(edge_ids))
+
+        edge_codes = np.empty(len(lst_codes), dtype=object)
+        edge_codes[:] = lst_codes
+        eid_indptr = np.zeros(len(lst_codes) + 1, dtype=np.int64)
+        np.cumsum(lst_nids, out=eid_indptr[1:])
+        eids = np.empty(len(lst_eids), dtype=object)
+        eids[:] = lst_eids
+        if len(lst_eids) and all(isinstance(e, (int, np.integer)) for e in lst_eids):
+            eids = eids.astype(np.int64)
+
+        # geometry per original edge slot (None if missing)
+        n_slot = len(eids)
+        arr_geom = np.full(n_slot, None, dtype=object)
+        if geoms is not None and n_slot:
+            if isinstance(geoms, pd.Series):
+                sr_geom = geoms[~geoms.index.duplicated(keep='first')]
+                rows = sr_geom.index.get_indexer(pd.Index(lst_eids, dtype=object))
+                found = rows >= 0
+                arr_geom[found] = sr_geom.to_numpy(dtype=object)[rows[found]]
+            else:
+                arr_geom[:] = [geoms.get(e) for e in lst_eids]
+
+        xy, idx_geom = shapely.get_coordinates(arr_geom, include_z=with_z, return_index=True)
+        n_geom_coords = np.bincount(idx_geom, minlength=n_slot)
+        is_fallback = n_geom_coords == 0
+        n_coords = np.where(is_fallback, 2, n_geom_coords)
+        coord_indptr = np.zeros(n_slot + 1, dtype=np.int64)
+        np.cumsum(n_coords, out=coord_indptr[1:])
+
+        coords = np.empty((coord_indptr[-1], 3 if with_z else 2), dtype=np.float64)
+        # 几何坐标整体散布到各槽位
+        geom_start = np.cumsum(n_geom_coords) - n_geom_coords
+        rank = np.arange(len(idx_geom)) - geom_start[idx_geom]
+        coords[coord_indptr[idx_geom] + rank] = xy
+
+        # 无几何的边 (连接线) : 以 edge_id "{u}_{v}" 或边两端顶点的解码坐标连线
+        dct_vtx = {}
+
+        def decode(vtx: str) -> tuple:
+            if vtx not in dct_vtx:
+                lon, lat, z = Geohash.ghz_decode(vtx)
+                dct_vtx[vtx] = (lon, lat, z) if with_z else (lon, lat)
+            return dct_vtx[vtx]
+
+        n_failed = 0
+        for k in np.flatnonzero(is_fallback).tolist():
+            ends = lst_ends[k]
+            edge_id = lst_eids[k]
+            if isinstance(edge_id, str) and edge_id.count('_') == 1:
+                ends = tuple(edge_id.split('_'))
+            try:
+                coords[coord_indptr[k]] = decode(ends[0])
+                coords[coord_indptr[k] + 1] = decode(ends[1])
+            except Exception:
+                coords[coord_indptr[k]:coord_indptr[k + 1]] = np.nan
+                n_failed += 1
+
+        gidx = EdgeGeometryIndex(edge_codes, eid_indptr, eids, coord_indptr, coords)
+        if attach:
+            DG.graph[EdgeGeometryIndex.GRAPH_KEY] = gidx
+        log.info(f"Built {gidx}: {int(is_fallback.sum())} original edges without geometry "
+                 f"({n_failed} not decodable)") if verbose else None
+        return gidx
+
+    @staticmethod
+    def of(DG: nx.DiGraph) -> 'EdgeGeometryIndex':
+        """ index attached to DG by `build`, None if missing
+        """
+        return DG.graph.get(EdgeGeometryIndex.GRAPH_KEY)
+
+    def edge_ids(self, edge_code: str) -> list:
+        """ ordered original edge ids of an edge code
+        """
+        r = self.code_index[edge_code]
+        return self.eids[self.eid_indptr[r]:self.eid_indptr[r + 1]].tolist()
+
+    def coords_of(self, edge_code: str) -> np.ndarray:
+        """ coordinates of an edge code (read-only view into the packed array)
+        """
+        r = self.code_index[edge_code]
+        view = self.coords[self.coord_indptr[self.eid_indptr[r]]:self.coord_indptr[self.eid_indptr[r + 1]]]
+        view.flags.writeable = False
+        return view
+
+    def path_coords(self, lst_edge_codes: list, direction: str = 'downstream') -> np.ndarray:
+        """ coordinates of a path of edge codes (e.g. `interval_edges`), joints
+        shared by consecutive original edges kept once
+
+        Args:
+            lst_edge_codes: edge codes in search order (outward from the start vertex)
+            direction: search direction of the path; upstream paths are listed
+                against the flow (C->B->A searched from A is [B_A, C_B]) and are
+                chained in reverse, so the line follows the flow and ends at
+                the start vertex
+        """
+        if direction not in ('downstream', 'upstream'):
+            raise ValueError("Direction must be 'downstream' or 'upstream'.")
+        if not lst_edge_codes:
+            return np.empty((0, self.coords.shape[1]), dtype=np.float64)
+        if direction == 'upstream':
+            lst_edge_codes = list(lst_edge_codes)[::-1]
+        arr = np.concatenate([self.coords_of(edge_code) for edge_code in lst_edge_codes])
+        keep = np.ones(len(arr), dtype=bool)
+        keep[1:] = np.any(arr[1:] != arr[:-1], axis=1)
+        return arr[keep]
+
+    def path_geometry(self, lst_edge_codes: list, direction: str = 'downstream') -> LineString:
+        """ path of edge codes as a LineString, None if fewer than 2 points
+        """
+        arr = self.path_coords(lst_edge_codes, direction)
+        return LineString(arr) if len(arr) >= 2 else None
+
+    def interval_geometries(self, lst_records: list[dict], col_edges: str = 'interval_edges',
+                            direction: str = 'downstream') -> list:
+        """ LineString per search record (of `fac_bfs_depth`), None for empty paths
+
+        `direction` is the search direction of the records; a record's own
+        `direction` value (if any) takes precedence.
+        """
+        return [self.path_geometry(rec.get(col_edges) or [], rec.get('direction', direction))
+                for rec in lst_records]
@@ -0,0 +1,179 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : vectorized edge predicate evaluation over a columnar edge table
+description : a `DictQuery` expression on static edge attributes (e.g.
+    "rtype in ['SA'] or (knd == 'ST' and cls == 'MR')") is evaluated once over
+    all edges with numpy / pandas column operations; the blocked-edge set is
+    cached by (graph fingerprint, expression) and consumed by `fac_bfs_depth`
+"""
+
+
+import ast
+import operator
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+from cprn.model.dict_query import DictQuery
+from cprn.model.topo.fingerprint import GraphFingerprint
+
+
+class _NotVectorizable(Exception):
+    """ expression (or data) outside the columnar subset, use row-wise evaluation """
+
+
+class EdgeMask:
+    """ Columnar evaluation of `DictQuery` expressions over graph edges
+
+    Grammar is the one of `DictQuery` (comparisons, and / or, in / not in,
+    names, constants, lists). Expressions or data the columnar path cannot
+    evaluate exactly (e.g. comparisons raising on `None`, unhashable values)
+    fall back to the compiled row-wise predicate, so results always equal
+    `DictQuery(edge_attr).query(expr)` per edge.
+
+    Example:
+        >>> blocked = EdgeMask.blocked_edges(dg_cprn, "rtype in ['SA']")
+        >>> CprnTopoSearch.fac_bfs_depth(dg_cprn, vtx, ['G1'], 'downstream',
+        ...     query_avoid_edge="rtype in ['SA']", vectorize_avoid_edge=True)
+    """
+    _cache = OrderedDict()  # (graph fingerprint, expression) -> frozenset of (u, v)
+    maxsize = 64
+
+    _CMP_OPS = {
+        ast.Eq: operator.eq,
+        ast.Gt: operator.gt,
+        ast.Lt: operator.lt,
+        ast.GtE: operator.ge,
+        ast.LtE: operator.le,
+        ast.NotEq: operator.ne,
+    }
+
+    @staticmethod
+    def blocked_edges(DG: nx.DiGraph, query_str: str) -> frozenset:
+        """ edges (u, v) of DG matching the expression, cached by (fingerprint,
+        expression) for graphs tracked by `GraphFingerprint.track`, evaluated
+        afresh for other graphs (their in-place edits are not announced)
+        """
+        key = (GraphFingerprint.of(DG), query_str.strip()) if GraphFingerprint.is_tracked(DG) else None
+        if key in EdgeMask._cache:
+            EdgeMask._cache.move_to_end(key)
+            return EdgeMask._cache[key]
+
+        lst_uv, lst_attr = [], []
+        for u, v, attr in DG.edges(data=True):
+            lst_uv.append((u, v))
+            lst_attr.append(attr)
+        mask = EdgeMask.evaluate(query_str, lst_attr)
+        blocked = frozenset(uv for uv, is_blocked in zip(lst_uv, mask.tolist()) if is_blocked)
+        if key is None:
+            return blocked
+
+        EdgeMask._cache[key] = blocked
+        while len(EdgeMask._cache) > EdgeMask.maxsize:
+            EdgeMask._cache.popitem(last=False)
+        return blocked
+
+    @staticmethod
+    def clear_cache():
+        EdgeMask._cache.clear()
+
+    @staticmethod
+    def edge_table(DG: nx.DiGraph, columns: list[str]) -> pd.DataFrame:
+        """ columnar edge table (`u`, `v` and given attributes, missing as None)
+        """
+        lst_attr = [attr for _, _, attr in DG.edges(data=True)]
+        dct_cols = {'u': [u for u, _ in DG.edges()], 'v': [v for _, v in DG.edges()]}
+        for col in columns:
+            dct_cols[col] = EdgeMask._column(lst_attr, col)
+        return pd.DataFrame(dct_cols)
+
+    @staticmethod
+    def evaluate(query_str: str, lst_attr: list[dict], get_column=None) -> np.ndarray:
+        """ boolean mask of records matching the expression (columnar, with fallback)
+
+        `get_column(name)` may supply the object column of an attribute (None
+        where missing) when records are stored column-wise
+        """
+        n = len(lst_attr)
+        get_column = get_column if get_column is not None else lambda name: EdgeMask._column(lst_attr, name)
+        try:
+            tree = ast.parse(query_str.strip(), mode='eval')
+            columns = {name.id: get_column(name.id)
+                       for name in ast.walk(tree) if isinstance(name, ast.Name)}
+            result = EdgeMask._eval(tree.body, columns)
+            return EdgeMask._truth(result, n)
+        except Exception:
+            func_query = DictQuery.compile(query_str)
+            return np.fromiter((bool(func_query(attr)) for attr in lst_attr), dtype=bool, count=n)
+
+    @staticmethod
+    def _column(lst_attr: list[dict], name: str) -> np.ndarray:
+        return np.fromiter((attr.get(name) for attr in lst_attr), dtype=object, count=len(lst_attr))
+
+    @staticmethod
+    def _truth(value, n: int) -> np.ndarray:
+        """ element-wise truthiness, broadcast to n """
+        if isinstance(value, np.ndarray):
+            return value if value.dtype == bool else value.astype(bool)
+        return np.full(n, bool(value))
+
+    @staticmethod
+    def _eval(node, columns: dict):
+        """ evaluate an AST node to a column (ndarray) or a scalar """
+        if isinstance(node, ast.Compare):
+            left = EdgeMask._eval(node.left, columns)
+            result = None
+            for op, comp in zip(node.ops, node.comparators):
+                right = EdgeMask._eval(comp, columns)
+                res = EdgeMask._compare(op, left, right)
+                result = res if result is None else np.logical_and(result, res)
+                left = right
+            return result
+
+        elif isinstance(node, ast.BoolOp):
+            lst_val = [EdgeMask._eval(value, columns) for value in node.values]
+            n = next((len(val) for val in lst_val if isinstance(val, np.ndarray)), None)
+            if n is None:
+                raise _NotVectorizable(node)
+            lst_truth = [EdgeMask._truth(val, n) for val in lst_val]
+            if isinstance(node.op, ast.And):
+                return np.logical_and.reduce(lst_truth)
+            elif isinstance(node.op, ast.Or):
+                return np.logical_or.reduce(lst_truth)
+            raise _NotVectorizable(node)
+
+        elif isinstance(node, ast.Name):
+            return columns[node.id]
+
+        elif isinstance(node, ast.Constant):
+            return node.value
+
+        elif isinstance(node, ast.List):
+            if all(isinstance(elt, ast.Constant) for elt in node.elts):
+                return [elt.value for elt in node.elts]
+
+        raise _NotVectorizable(node)
+
+    @staticmethod
+    def _compare(op, left, right) -> np.ndarray:
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not (isinstance(left, np.ndarray) and isinstance(right, list)):
+                raise _NotVectorizable(op)
+            res = pd.Series(left, dtype=object).isin(right).to_numpy(dtype=bool)
+            return ~res if isinstance(op, ast.NotIn) else res
+
+        func_op = EdgeMask._CMP_OPS.get(type(op))
+        if func_op is None or isinstance(left, list) or isinstance(right, list):
+            raise _NotVectorizable(op)
+        if not isinstance(left, np.ndarray) and not isinstance(right, np.ndarray):
+            raise _NotVectorizable(op)
+        res = func_op(left, right)      # object arrays compare element-wise, raising as python does
+        if not isinstance(res, np.ndarray) or res.dtype != bool:
+            raise _NotVectorizable(op)
+        return res
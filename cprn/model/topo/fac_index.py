@@ -0,0 +1,159 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : facility index of a cprn DiGraph (fac_code / fac_type / vertex lookups)
+description : built once per graph and cached; rebuilt automatically when the
+    facility embedding of the graph (node `lst_fac_attr` / `fac_types`) or its
+    content version (`GraphFingerprint.bump`) changes
+"""
+
+
+import weakref
+
+import pandas as pd
+import networkx as nx
+
+from cprn.model.topo.fingerprint import GraphFingerprint
+
+
+class FacilityIndex:
+    """ Facility index of a cprn DiGraph
+
+    Lookups:
+        - records(fac_code): list of facility records (dicts) with the code
+        - vertices(fac_type): set of vertices carrying the facility type
+        - vertex_mask(vtx): bitmask of the facility types of a vertex
+        - catalog_df(): cached DataFrame of all records (as `list_fac_df`)
+
+    Use `FacilityIndex.of(DG)` to get the cached index of a graph; the cache is
+    checked against the facility embedding (one light pass comparing every
+    node's `lst_fac_attr` / `fac_types` container by identity and length, the
+    containers are held so identities are never reused) and rebuilt when
+    facilities are (re-)embedded. Editing a record dict in place is not
+    detected, call `GraphFingerprint.bump(DG)` or `FacilityIndex.invalidate(DG)`
+    after such edits.
+
+    Example:
+        >>> fidx = FacilityIndex.of(dg_cprn)
+        >>> fidx.vertex_of('G001532001000810010')
+        >>> fidx.vertices('DC2')
+    """
+    _cache = weakref.WeakKeyDictionary()
+
+    def __init__(self, DG: nx.DiGraph):
+        self.version = GraphFingerprint.version(DG)
+        self.embedding = []     # (vtx, lst_fac_attr, len, fac_types, is_fac) of facility nodes
+        self.type_bits = {}
+        self.vtx_mask = {}
+        self.vtx_by_type = {}
+        self.rows_by_code = {}
+        self.fac_records = []
+
+        for vtx, attr in DG.nodes(data=True):
+            lst_fac, fac_types = attr.get('lst_fac_attr'), attr.get('fac_types')
+            if lst_fac or fac_types:
+                self.embedding.append((vtx, lst_fac, len(lst_fac or ()), fac_types, attr.get('is_fac', False)))
+            mask = 0
+            for fac_type in attr.get('fac_types', None) or ():
+                mask |= self._type_bit(fac_type)
+                self.vtx_by_type.setdefault(fac_type, set()).add(vtx)
+            if mask:
+                self.vtx_mask[vtx] = mask
+            # 与 `list_fac_df` 一致: 仅收录 is_fac 节点的设施记录
+            if attr.get('is_fac', False):
+                for fac in attr.get('lst_fac_attr', []):
+                    self.rows_by_code.setdefault(fac.get('fac_code'), []).append(len(self.fac_records))
+                    self.fac_records.append(fac)
+        self._catalog = None
+
+    def _type_bit(self, fac_type) -> int:
+        if fac_type not in self.type_bits:
+            self.type_bits[fac_type] = len(self.type_bits)
+        return 1 << self.type_bits[fac_type]
+
+    def is_current(self, DG: nx.DiGraph) -> bool:
+        """ whether the index still matches the facility embedding of DG
+        (content version and, per node, the same containers of the same length)
+        """
+        if self.version != GraphFingerprint.version(DG):
+            return False
+        it_embedding = iter(self.embedding)
+        for vtx, attr in DG.nodes(data=True):
+            lst_fac, fac_types = attr.get('lst_fac_attr'), attr.get('fac_types')
+            if not lst_fac and not fac_types:
+                continue
+            ref = next(it_embedding, None)
+            if (ref is None or ref[0] != vtx or ref[1] is not lst_fac or ref[2] != len(lst_fac or ())
+                    or ref[3] is not fac_types or ref[4] != attr.get('is_fac', False)):
+                return False
+        return next(it_embedding, None) is None
+
+    @staticmethod
+    def of(DG: nx.DiGraph, validate: bool = True) -> 'FacilityIndex':
+        """ cached facility index of DG, rebuilt if the facility embedding changed
+
+        Args:
+            DG: cprn DiGraph (facility embedded)
+            validate: check the cached index against the current embedding (one
+                light pass over the nodes); if False only the content version
+                is checked (O(1)), for repeated lookups on a graph known unchanged
+        """
+        fidx = FacilityIndex._cache.get(DG)
+        if fidx is None or not (fidx.is_current(DG) if validate else fidx.version == GraphFingerprint.version(DG)):
+            fidx = FacilityIndex(DG)
+            FacilityIndex._cache[DG] = fidx
+        return fidx
+
+    @staticmethod
+    def invalidate(DG: nx.DiGraph):
+        """ drop the cached index of DG
+        """
+        FacilityIndex._cache.pop(DG, None)
+
+    def records(self, fac_code: str) -> list[dict]:
+        """ facility records with the given code
+        """
+        return [self.fac_records[i] for i in self.rows_by_code.get(fac_code, [])]
+
+    def vertex_of(self, fac_code: str):
+        """ vertex (`vtx_fac`) of the first record of the given code, None if missing
+        """
+        rows = self.rows_by_code.get(fac_code)
+        return self.fac_records[rows[0]].get('vtx_fac') if rows else None
+
+    def vertices(self, fac_type: str) -> set:
+        """ vertices carrying the given facility type
+        """
+        return self.vtx_by_type.get(fac_type, set())
+
+    def vertex_mask(self, vtx: str) -> int:
+        """ bitmask of facility types at a vertex (bits in `type_bits`)
+        """
+        return self.vtx_mask.get(vtx, 0)
+
+    def type_mask(self, fac_types) -> int:
+        """ bitmask of given facility types (unknown types are ignored)
+        """
+        return sum(1 << self.type_bits[t] for t in set(fac_types) if t in self.type_bits)
+
+    def code_to_vertex(self, fac_types: list = None) -> dict:
+        """ dict fac_code -> vtx_fac, optionally limited to some facility types
+        """
+        set_fac_types = set(fac_types) if fac_types else None
+        return {fac['fac_code']: fac.get('vtx_fac') for fac in self.fac_records
+                if set_fac_types is None or fac.get('fac_type') in set_fac_types}
+
+    def catalog_df(self) -> pd.DataFrame:
+        """ cached DataFrame of all facility records (do not modify in place)
+        """
+        if self._catalog is None:
+            self._catalog = pd.DataFrame(self.fac_records)
+        return self._catalog
+
+    def query_df(self, fac_code: str) -> pd.DataFrame:
+        """ catalog rows of the given facility code (index labels kept)
+        """
+        return self.catalog_df().iloc[self.rows_by_code.get(fac_code, [])]
@@ -0,0 +1,247 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : facility layer overlaid on a base cprn DiGraph (copy-free embedding)
+description : facility sets (gantries, DC nodes, SA-DCPs, interchanges ...)
+    are kept as independent, serializable tables keyed by vertex and seen
+    through a read-only view of an unchanged base graph; swapping or adding a
+    facility set costs O(facilities) instead of a deep copy of the graph
+"""
+
+
+import hashlib
+import weakref
+from collections.abc import Mapping
+
+import pandas as pd
+import networkx as nx
+
+from loguru import logger as log
+
+from cprn.model.topo.fingerprint import GraphFingerprint
+
+
+class _OverlayNodes(Mapping):
+    """ node attribute mapping of a base graph with facility attributes overlaid
+    """
+
+    def __init__(self, base_node: dict, dct_fac_node: dict, keep_base: bool):
+        self._base = base_node
+        self._fac = dct_fac_node
+        self._keep_base = keep_base
+        self._masked = {}
+
+    def __getitem__(self, vtx) -> dict:
+        attr = self._fac.get(vtx)
+        if attr is not None:
+            return attr
+        attr = self._base[vtx]
+        if not self._keep_base and not attr.keys().isdisjoint(FacilityLayer.FAC_KEYS):
+            # 隐藏底图已嵌入的设施 (按需生成并缓存)
+            if vtx not in self._masked:
+                self._masked[vtx] = FacilityLayer._strip(attr)
+            return self._masked[vtx]
+        return attr
+
+    def __contains__(self, vtx) -> bool:
+        return vtx in self._base
+
+    def __iter__(self):
+        return iter(self._base)
+
+    def __len__(self) -> int:
+        return len(self._base)
+
+
+class FacilityLayer:
+    """ Facility set keyed by vertex, overlaid on a base cprn DiGraph
+
+    Records have the shape of the node attribute `lst_fac_attr` embedded by
+    the facility binding (`vtx_fac`, `fac_code`, `fac_type`, `fac_name`, ...).
+    A view of the base graph shows, at every layer vertex, `is_fac=True`,
+    `fac_types` and `lst_fac_attr` (after the base's own facilities when
+    `keep_base`), so all searches of `CprnTopoSearch` run on it unchanged.
+
+    Example:
+        >>> lyr_gtr = FacilityLayer.from_df(gdf_fac_gtr_bind, name='gtr')
+        >>> lyr_dcp = FacilityLayer.from_df(CprnTopoSearch.find_dc_nodes(dg_cprn), name='dcp')
+        >>> dg_fac = CprnTopoSearch.with_facilities(dg_cprn, lyr_gtr, lyr_dcp)
+        >>> CprnTopoSearch.fac_bfs_depth(dg_fac, vtx, ['G1', 'DC2'], 'downstream')
+        >>> CprnTopoSearch.fac_bfs_depth(dg_cprn, vtx, ['G1'], 'downstream', fac_layer=lyr_gtr)
+        >>> PickleIO.dump_as_pickle(lyr_gtr, './FAC_LAYER_GTR.pkl')
+
+    Notes:
+        The view is read-only and reflects the base graph; node attribute dicts
+        of layer vertices are new dicts (shallow, base values shared), all other
+        node and edge attributes are the base's own.
+    """
+    FAC_KEYS = ('is_fac', 'fac_types', 'lst_fac_attr')
+
+    def __init__(self, dct_vtx_fac: dict = None, name: str = None):
+        """
+        Args:
+            dct_vtx_fac: vertex -> list of facility records (dicts)
+            name: label of the layer (e.g. 'gtr', 'dcp')
+        """
+        self.dct_vtx_fac = dct_vtx_fac if dct_vtx_fac is not None else {}
+        self.name = name
+        self._digest = None
+        self._views = {}
+
+    def __len__(self) -> int:
+        return sum(len(lst_fac) for lst_fac in self.dct_vtx_fac.values())
+
+    def __repr__(self) -> str:
+        return f"FacilityLayer({self.name!r}: {len(self)} facilities at {len(self.dct_vtx_fac)} vertices)"
+
+    def __add__(self, other: 'FacilityLayer') -> 'FacilityLayer':
+        return FacilityLayer.merge(self, other)
+
+    def __getstate__(self) -> dict:
+        return {'dct_vtx_fac': self.dct_vtx_fac, 'name': self.name}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['dct_vtx_fac'], state.get('name'))
+
+    @staticmethod
+    def _strip(attr: dict) -> dict:
+        return {k: v for k, v in attr.items() if k not in FacilityLayer.FAC_KEYS}
+
+    @staticmethod
+    def from_df(df_fac: pd.DataFrame, col_vtx: str = 'vtx_fac',
+                cols_fac: list = None, name: str = None) -> 'FacilityLayer':
+        """ layer from a facility table (one row per facility, as passed to
+        `fac_embed_cprn`), records keep all columns (or `cols_fac`)
+        """
+        cols_fac = list(df_fac.columns) if cols_fac is None else list(cols_fac)
+        if col_vtx not in cols_fac:
+            cols_fac = [col_vtx] + cols_fac
+        dct_vtx_fac = {}
+        for rec in df_fac[cols_fac].to_dict('records'):
+            dct_vtx_fac.setdefault(rec[col_vtx], []).append(rec)
+        return FacilityLayer(dct_vtx_fac, name)
+
+    @staticmethod
+    def from_graph(DG: nx.DiGraph, fac_types: list = None, name: str = None) -> 'FacilityLayer':
+        """ layer of the facilities embedded in DG (e.g. to split an embedded
+        model into a bare base and layers), records are shared, not copied
+        """
+        set_types = set(fac_types) if fac_types is not None else None
+        dct_vtx_fac = {}
+        for vtx, attr in DG.nodes(data=True):
+            if not attr.get('is_fac', False):
+                continue
+            lst_fac = [fac for fac in attr.get('lst_fac_attr', None) or ()
+                       if set_types is None or fac.get('fac_type') in set_types]
+            if lst_fac:
+                dct_vtx_fac[vtx] = lst_fac
+        return FacilityLayer(dct_vtx_fac, name)
+
+    @staticmethod
+    def merge(*layers: 'FacilityLayer', name: str = None) -> 'FacilityLayer':
+        """ union of layers (records of a vertex in layer order)
+        """
+        dct_vtx_fac = {}
+        for layer in layers:
+            for vtx, lst_fac in layer.dct_vtx_fac.items():
+                dct_vtx_fac.setdefault(vtx, []).extend(lst_fac)
+        name = name if name is not None else '+'.join(str(layer.name) for layer in layers)
+        return FacilityLayer(dct_vtx_fac, name)
+
+    def select(self, fac_types: list) -> 'FacilityLayer':
+        """ sub-layer of the given facility types
+        """
+        set_types = set(fac_types)
+        dct_vtx_fac = {}
+        for vtx, lst_fac in self.dct_vtx_fac.items():
+            lst_fit = [fac for fac in lst_fac if fac.get('fac_type') in set_types]
+            if lst_fit:
+                dct_vtx_fac[vtx] = lst_fit
+        return FacilityLayer(dct_vtx_fac, self.name)
+
+    def records(self, vtx: str) -> list[dict]:
+        """ facility records at a vertex """
+        return self.dct_vtx_fac.get(vtx, [])
+
+    def to_df(self) -> pd.DataFrame:
+        """ facility table (one row per record) """
+        return pd.DataFrame([fac for lst_fac in self.dct_vtx_fac.values() for fac in lst_fac])
+
+    def digest(self) -> str:
+        """ content digest of the layer (memoized; in-place edits of records are not noticed)
+        """
+        if self._digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            for vtx, lst_fac in self.dct_vtx_fac.items():
+                h.update(GraphFingerprint._canon(vtx) + GraphFingerprint._canon(lst_fac))
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def view(self, DG: nx.DiGraph, keep_base: bool = True, verbose: bool = False) -> nx.DiGraph:
+        """ read-only view of DG with the layer's facilities embedded
+
+        Args:
+            DG: base cprn DiGraph (bare or facility embedded), not modified
+            keep_base: keep facilities embedded in DG (layer records appended),
+                or hide them so the layer replaces them
+        Returns:
+            frozen networkx.DiGraph sharing the adjacency and attributes of DG,
+            cached per (base graph, keep_base) and rebuilt after the base graph
+            is edited (`GraphFingerprint.bump`); O(facilities), the
+            fingerprint of the view is derived on the first `GraphFingerprint.of`
+        """
+        key = (id(DG), keep_base)
+        version = GraphFingerprint.version(DG)
+        cached = self._views.get(key)
+        if cached is not None and cached[0]() is DG and cached[2] == version:
+            return cached[1]
+
+        dct_fac_node = {}
+        n_missing = 0
+        for vtx, lst_fac in self.dct_vtx_fac.items():
+            if vtx not in DG:
+                n_missing += 1
+                continue
+            attr = DG.nodes[vtx]
+            if keep_base and attr.get('is_fac', False):
+                lst_fac = list(attr.get('lst_fac_attr', None) or ()) + lst_fac
+            dct_fac_node[vtx] = {**FacilityLayer._strip(attr), 'is_fac': True,
+                                 'fac_types': {fac.get('fac_type') for fac in lst_fac},
+                                 'lst_fac_attr': lst_fac}
+
+        DG_view = nx.graphviews.generic_graph_view(DG)
+        DG_view._node = _OverlayNodes(DG._node, dct_fac_node, keep_base)
+
+        def fingerprint() -> str:
+            # 指纹仅在缓存首次读取时派生 (底图全量摘要 O(graph)); 底图其后被修改则按视图内容求摘要
+            if GraphFingerprint.version(DG) != version:
+                return None
+            return hashlib.blake2b(f'{GraphFingerprint.of(DG)}|{self.digest()}|{keep_base}'.encode(),
+                                   digest_size=16).hexdigest()
+
+        GraphFingerprint.register(DG_view, fingerprint)
+        self._views[key] = (weakref.ref(DG), DG_view, version)
+        log.info(f"Overlay {self} on {DG}, {n_missing} vertices not in graph") if verbose else None
+        return DG_view
+
+    def embed(self, DG: nx.DiGraph, verbose: bool = False) -> nx.DiGraph:
+        """ embed the layer into DG in place (appending to existing facilities),
+        O(facilities), for when a standalone graph is needed
+        """
+        n_missing = 0
+        for vtx, lst_fac in self.dct_vtx_fac.items():
+            if vtx not in DG:
+                n_missing += 1
+                continue
+            attr = DG.nodes[vtx]
+            lst_fac_node = list(attr.get('lst_fac_attr', None) or ()) if attr.get('is_fac', False) else []
+            lst_fac_node.extend(lst_fac)
+            attr['is_fac'] = True
+            attr['fac_types'] = {fac.get('fac_type') for fac in lst_fac_node}
+            attr['lst_fac_attr'] = lst_fac_node
+        GraphFingerprint.bump(DG)
+        log.info(f"Embedded {self} into {DG}, {n_missing} vertices not in graph") if verbose else None
+        return DG
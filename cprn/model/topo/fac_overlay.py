@@ -0,0 +1,183 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : facility interval overlay graph (cprn)
+description : condensed facility -> facility graph of level-1 intervals for a
+    facility type set and an avoid rule, derived once from the road graph;
+    level-1 queries (up- and downstream) become dict lookups and level-k
+    queries small walks on the overlay
+"""
+
+
+import heapq
+
+import pandas as pd
+import networkx as nx
+
+from loguru import logger as log
+
+from cprn.model.topo.csr_graph import CprnCsrGraph
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+class FacIntervalOverlay:
+    """ Facility interval overlay of a cprn DiGraph
+
+    Overlay vertices are the facility vertices of `fac_types`; an overlay edge
+    (A, B) is a level-1 downstream interval found by `fac_bfs_depth` from A,
+    carrying `interval_weight` and `interval_edges`. Upstream neighbors are the
+    overlay predecessors, no second traversal is needed.
+
+    Example:
+        >>> ovl = FacIntervalOverlay.build(dg_cprn, ['G1','G2','G3'], max_dist=30000,
+        ...     query_avoid_edge="rtype in ['SA'] or (knd == 'ST' and cls == 'MR')")
+        >>> ovl.adjacent(vtx_gtr, direction='upstream')
+        >>> ovl.walk(vtx_gtr, max_depth=3)
+
+    Notes:
+        Level-1 results equal a `max_depth=1` search on the road graph within
+        the build `max_dist`. Upstream results use the downstream intervals, so
+        they can differ from an upstream BFS where several shortest-first
+        branches meet. Level-k walks chain level-1 intervals (shortest first)
+        and may differ from a depth-k BFS in the same way.
+
+        `fac_types` of `walk` / `adjacent` only filters the reported records:
+        intervals, depth and `vtx_intvl_src` still count every overlay facility
+        type, i.e. the result equals the walk over all build types with the
+        other types' records dropped. For A(G1) -> B(G2) -> C(G1) on an overlay
+        of ['G1', 'G2'], `walk(A, max_depth=2, fac_types=['G1'])` reports C at
+        depth 2 from B, where `fac_bfs_depth(..., ['G1'], max_depth=1)` reports
+        C at depth 1 from A. Build an overlay of the subset for its own topology.
+    """
+
+    def __init__(self, OG: nx.DiGraph, spec: dict):
+        self.OG = OG
+        self.spec = spec
+        self._code_vtx = None   # fac_code -> overlay vertex, built on first lookup
+
+    def __repr__(self) -> str:
+        return (f"FacIntervalOverlay of {self.spec['fac_types']} with "
+                f"{self.OG.number_of_nodes()} facility vertices and {self.OG.number_of_edges()} intervals")
+
+    @staticmethod
+    def build(DG, fac_types: list, max_dist: int = 1000000,
+              query_avoid_fac: list = None,
+              query_avoid_edge: str = None,
+              edge_code_attr: str = 'edge_code',
+              verbose: bool = False) -> 'FacIntervalOverlay':
+        """ derive the overlay from a cprn DiGraph (or its CprnCsrGraph snapshot)
+
+        Args:
+            DG: cprn DiGraph or CprnCsrGraph (facility embedded)
+            fac_types: facility types of the overlay
+            max_dist: longest interval kept (queries may only narrow it)
+            query_avoid_fac: facility codes to ignore
+            query_avoid_edge: edge avoidance expression, see `fac_bfs_depth`
+        """
+        G = DG if isinstance(DG, CprnCsrGraph) else CprnCsrGraph.from_digraph(DG, edge_code_attr)
+        set_fac_types = set(fac_types)
+        set_fac_avoid = set(query_avoid_fac) if query_avoid_fac else set()
+
+        OG = nx.DiGraph()
+        for v, vtx in enumerate(G.vtx_codes):
+            lst_fac = [fac for fac in G.fac_records[G.fac_indptr[v]:G.fac_indptr[v + 1]]
+                       if fac.get('fac_type') in set_fac_types and fac.get('fac_code') not in set_fac_avoid]
+            if lst_fac:
+                OG.add_node(vtx, lst_fac_attr=lst_fac)
+
+        lst_interval = CprnTopoSearch.fac_bfs_depth_batch(G, list(OG.nodes),
+            fac_types=fac_types, direction='downstream', max_depth=1, max_dist=max_dist,
+            query_avoid_fac=query_avoid_fac, query_avoid_edge=query_avoid_edge,
+            edge_code_attr=edge_code_attr, as_df=False)
+        for rec in lst_interval:
+            src, tgt = rec['vtx_intvl_src'], rec['vtx_intvl_tgt']
+            if rec['depth'] != 1 or src == tgt or OG.has_edge(src, tgt):
+                continue
+            OG.add_edge(src, tgt, interval_weight=rec['interval_weight'],
+                        interval_edges=list(rec['interval_edges']))
+
+        spec = dict(fac_types=list(fac_types), max_dist=max_dist,
+                    query_avoid_fac=query_avoid_fac, query_avoid_edge=query_avoid_edge)
+        ovl = FacIntervalOverlay(OG, spec)
+        log.info(f"Built {ovl}") if verbose else None
+        return ovl
+
+    def _resolve(self, start) -> str:
+        """ overlay vertex of a vertex id or a facility code """
+        if start in self.OG:
+            return start
+        if self._code_vtx is None:
+            self._code_vtx = {fac.get('fac_code'): vtx
+                              for vtx, lst_fac in self.OG.nodes(data='lst_fac_attr') for fac in lst_fac}
+        if start in self._code_vtx:
+            return self._code_vtx[start]
+        raise KeyError(f"{start} is neither a facility vertex nor a facility code of the overlay")
+
+    def _neighbors(self, vtx: str, direction: str):
+        """ (neighbor, interval_weight, interval_edges in search order) """
+        if direction == 'downstream':
+            for nbr, attr in self.OG.succ[vtx].items():
+                yield nbr, attr['interval_weight'], attr['interval_edges']
+        elif direction == 'upstream':
+            for nbr, attr in self.OG.pred[vtx].items():
+                # upstream search lists edges from the start backwards
+                yield nbr, attr['interval_weight'], attr['interval_edges'][::-1]
+        else:
+            raise ValueError("Direction must be 'downstream' or 'upstream'.")
+
+    def adjacent(self, start, direction: str = 'downstream',
+                 max_dist: float = None, fac_types: list = None) -> list[dict]:
+        """ level-1 adjacent facilities of a facility vertex (or facility code)
+
+        Returns records shaped like `fac_bfs_depth` results (depth 1).
+        """
+        return self.walk(start, direction=direction, max_depth=1,
+                         max_dist=max_dist, fac_types=fac_types)
+
+    def walk(self, start, direction: str = 'downstream', max_depth: int = 1,
+             max_dist: float = None, fac_types: list = None) -> list[dict]:
+        """ level-k facility topology by chaining overlay intervals (shortest first)
+
+        Args:
+            start: facility vertex or facility code
+            direction: 'downstream' or 'upstream'
+            max_depth: number of facility hops
+            max_dist: cumulative weight limit (default: build `max_dist`)
+            fac_types: subset of the overlay facility types to report (a filter
+                of the records only, hops still count all overlay types, see Notes)
+        """
+        vtx_start = self._resolve(start)
+        set_fac_types = set(fac_types) if fac_types else None
+        max_dist = self.spec['max_dist'] if max_dist is None else max_dist
+
+        lst_found, settled = [], set()
+        # heap : cumulative_weight, depth, vertex, interval src, interval weight, interval edges, cumulative edges
+        heap = [(0, 0, vtx_start, None, 0, [], [])]
+        while heap:
+            cum_weight, depth, vtx, vtx_src, weight, edges, cum_edges = heapq.heappop(heap)
+            if vtx in settled:
+                continue
+            settled.add(vtx)
+            if vtx_src is not None:
+                for fac in self.OG.nodes[vtx]['lst_fac_attr']:
+                    if set_fac_types is None or fac.get('fac_type') in set_fac_types:
+                        lst_found.append({'depth': depth, 'vtx_intvl_src': vtx_src, 'vtx_intvl_tgt': vtx,
+                            'interval_weight': weight, 'cumulative_weight': cum_weight,
+                            'interval_edges': list(edges), 'cumulative_edges': list(cum_edges),
+                            'reach_max_depth': depth >= max_depth, **fac})
+            if depth >= max_depth:
+                continue
+            for nbr, nbr_weight, nbr_edges in self._neighbors(vtx, direction):
+                if nbr not in settled and cum_weight + nbr_weight <= max_dist:
+                    heapq.heappush(heap, (cum_weight + nbr_weight, depth + 1, nbr, vtx,
+                                          nbr_weight, nbr_edges, cum_edges + nbr_edges))
+        return lst_found
+
+    def interval_df(self) -> pd.DataFrame:
+        """ all level-1 intervals of the overlay as a DataFrame
+        """
+        return pd.DataFrame([{'vtx_intvl_src': u, 'vtx_intvl_tgt': v, **attr}
+                             for u, v, attr in self.OG.edges(data=True)])
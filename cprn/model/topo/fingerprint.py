@@ -0,0 +1,174 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : content fingerprint of a cprn DiGraph
+description : stable (cross-session) key of a graph for caches of derived data
+    (edge masks, search results); models loaded by `CprnTopoSearch.load_cprn`
+    are registered with the sha-256 of their pickle file, other graphs are
+    digested once from their nodes and edges; in-place edits bump a content
+    version that invalidates both
+"""
+
+
+import hashlib
+import pickle
+import weakref
+
+import numpy as np
+import networkx as nx
+
+
+class GraphFingerprint:
+    """ Content fingerprint of a cprn DiGraph
+
+    Example:
+        >>> GraphFingerprint.of(dg_cprn)
+        'ab5083814993673ac4ecd9863a3013d8428c9c62743d44785df13f1b31dbbacd'
+        >>> FacilityLayer(dct_vtx_fac).embed(dg_cprn)    # bumps the content version
+        >>> GraphFingerprint.bump(dg_cprn)              # after other in-place edits
+
+    Caches of derived data keyed by the fingerprint (search results, blocked
+    edge sets) are opt-in per graph: they serve only graphs marked with
+    `GraphFingerprint.track(DG)`, whose owner announces every in-place edit
+    (edge / node attributes, facility records) by `GraphFingerprint.bump(DG)`.
+    An in-place edit of an untracked graph is never answered from a cache.
+    """
+    # graph -> ((n_nodes, n_edges, version), fingerprint)
+    _memo = weakref.WeakKeyDictionary()
+    # graph -> content version, bumped by in-place edits (facility embedding ...)
+    _versions = weakref.WeakKeyDictionary()
+    # graphs opted in to fingerprint-keyed caches (edits announced by `bump`)
+    _tracked = weakref.WeakSet()
+
+    @staticmethod
+    def of(DG: nx.DiGraph, refresh: bool = False) -> str:
+        """ content fingerprint (hex str) of a cprn DiGraph
+
+        The digest (blake2b over all nodes and edges with their attributes) is
+        computed once per graph object and memoized while the node and edge
+        counts and the content version are unchanged. `FacilityLayer.embed`
+        bumps the version; after other in-place attribute edits (e.g. an
+        external facility embedding) call `GraphFingerprint.bump`, or pass
+        `refresh=True`.
+        """
+        guard = GraphFingerprint._guard(DG)
+        memo = GraphFingerprint._memo.get(DG)
+        if memo is not None and memo[0] == guard and not refresh:
+            fingerprint = memo[1]
+            if not callable(fingerprint):
+                return fingerprint
+            # 延迟注册的指纹, 首次读取时求值 (返回 None 则按内容求摘要)
+            fingerprint = fingerprint()
+            if fingerprint is not None:
+                GraphFingerprint._memo[DG] = (guard, str(fingerprint))
+                return str(fingerprint)
+
+        canon = GraphFingerprint._canon
+        h = hashlib.blake2b(digest_size=16)
+        for vtx, attr in DG.nodes(data=True):
+            h.update(b'V' + canon(vtx) + canon(attr))
+        for u, v, attr in DG.edges(data=True):
+            h.update(b'E' + canon(u) + canon(v) + canon(attr))
+        fingerprint = h.hexdigest()
+        GraphFingerprint._memo[DG] = (guard, fingerprint)
+        return fingerprint
+
+    @staticmethod
+    def version(DG: nx.DiGraph) -> int:
+        """ content version of DG (number of `bump` calls)
+        """
+        return GraphFingerprint._versions.get(DG, 0)
+
+    @staticmethod
+    def bump(DG: nx.DiGraph) -> int:
+        """ mark DG as edited in place: bump its content version, so the
+        fingerprint (registered ones included) and caches keyed by the
+        version are recomputed; returns the new version
+        """
+        version = GraphFingerprint._versions.get(DG, 0) + 1
+        GraphFingerprint._versions[DG] = version
+        GraphFingerprint._memo.pop(DG, None)
+        return version
+
+    @staticmethod
+    def track(DG: nx.DiGraph, tracked: bool = True):
+        """ opt DG in (or out) of fingerprint-keyed caches; the caller then
+        calls `bump(DG)` after every in-place edit of DG
+        """
+        if tracked:
+            GraphFingerprint._tracked.add(DG)
+        else:
+            GraphFingerprint._tracked.discard(DG)
+
+    @staticmethod
+    def is_tracked(DG) -> bool:
+        """ whether fingerprint-keyed caches may serve DG (see `track`)
+        """
+        try:
+            return DG in GraphFingerprint._tracked
+        except TypeError:
+            return False
+
+    @staticmethod
+    def register(DG: nx.DiGraph, fingerprint):
+        """ register a known fingerprint of DG (e.g. the hash of the file it was
+        loaded from), valid until DG is edited; copies of DG do not inherit it
+
+        `fingerprint` may also be a callable, evaluated on the first `of(DG)`
+        only (the graph is digested instead if it returns None).
+        """
+        if not callable(fingerprint):
+            fingerprint = str(fingerprint)
+        GraphFingerprint._memo[DG] = (GraphFingerprint._guard(DG), fingerprint)
+
+    @staticmethod
+    def invalidate(DG: nx.DiGraph):
+        """ drop the memoized fingerprint of DG
+        """
+        GraphFingerprint._memo.pop(DG, None)
+
+    @staticmethod
+    def _guard(DG: nx.DiGraph) -> tuple:
+        return DG.number_of_nodes(), DG.number_of_edges(), GraphFingerprint._versions.get(DG, 0)
+
+    @staticmethod
+    def _canon(obj) -> bytes:
+        """ exact, deterministic byte serialization of an attribute value
+
+        Typed and length-prefixed (no truncation as in the repr of arrays),
+        floats in hex (exact), dict items and set members sorted by their
+        encoding (independent of the hash seed); other objects are pickled,
+        so no memory address enters the digest.
+        """
+        canon = GraphFingerprint._canon
+        if isinstance(obj, str):
+            data = obj.encode('utf-8', 'surrogatepass')
+            return b's%d:' % len(data) + data
+        if obj is None:
+            return b'N'
+        if isinstance(obj, bool):
+            return b'T' if obj else b'F'
+        if isinstance(obj, int):
+            return b'i%d;' % obj
+        if isinstance(obj, float):
+            return b'f' + obj.hex().encode() + b';'
+        if isinstance(obj, (bytes, bytearray)):
+            return b'b%d:' % len(obj) + bytes(obj)
+        if isinstance(obj, (list, tuple)):
+            return (b'l' if isinstance(obj, list) else b't') + b'%d:' % len(obj) + b''.join(map(canon, obj))
+        if isinstance(obj, dict):
+            lst_items = sorted(canon(k) + canon(v) for k, v in obj.items())
+            return b'd%d:' % len(lst_items) + b''.join(lst_items)
+        if isinstance(obj, (set, frozenset)):
+            lst_items = sorted(map(canon, obj))
+            return b'S%d:' % len(lst_items) + b''.join(lst_items)
+        if isinstance(obj, np.generic):
+            return canon(obj.item())
+        if isinstance(obj, np.ndarray):
+            data = np.ascontiguousarray(obj).tobytes()
+            return b'a' + canon(obj.dtype.str) + canon(obj.shape) + b'%d:' % len(data) + data
+        data = pickle.dumps(obj, protocol=4)
+        return b'p%d:' % len(data) + data
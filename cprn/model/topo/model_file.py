@@ -0,0 +1,266 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : native columnar cprn model file (.cprn.npz)
+description : a `CompactCprnGraph` is stored as typed numpy arrays (vertex
+    codes, CSR adjacency, categorical edge / node / facility columns and their
+    dictionaries) in one npz archive, loaded straight into a searchable
+    snapshot without rebuilding networkx dicts; export / import round-trip
+    losslessly to the pickled `nx.DiGraph` model
+"""
+
+
+import os
+import pickle
+import zipfile
+
+import numpy as np
+import networkx as nx
+
+from loguru import logger as log
+
+from cprn.data.pickle import PickleIO
+from cprn.model.topo.compact import CompactCprnGraph, FacTable, _Column, _MISSING
+from cprn.model.topo.edge_geom import EdgeGeometryIndex
+
+
+class CprnModelFile:
+    """ Columnar cprn model file (.cprn.npz)
+
+    Layout (npz keys, all arrays typed, no pickled objects except blobs):
+        - meta/format, meta/version, meta/attrs: format tag, version, attribute names
+        - csr/*: vertex codes (bytes), adjacency, weights, facility offsets and masks
+        - {edge,node,fac}/names, {group}/{i}/codes, {group}/{i}/cat/*: categorical
+          columns, category dictionaries stored by type (int, float, str arrays
+          and a type tag per category)
+        - graph/*: graph attributes, an attached `EdgeGeometryIndex` as arrays
+
+    Values other than None / bool / int / float / str (lists, sets, numpy
+    scalars ...) keep their exact type in a pickled byte blob (uint8 array).
+
+    Example:
+        >>> fp = CprnModelFile.dump(dg_cprn, './DG_CPRN_JS.cprn.npz')
+        >>> cg = CprnModelFile.load(fp)         # CompactCprnGraph, ready to search
+        >>> dg_cprn = cg.to_digraph()           # same nodes, edges and attributes
+        >>> CprnModelFile.from_pickle('./DG_CPRN_JS_250924_<sha256>.pkl', './DG_CPRN_JS.cprn.npz')
+    """
+    FORMAT = 'cprn-npz'
+    VERSION = 1
+    EXTENSION = '.cprn.npz'
+
+    # 标量类型标签 (None, bool, int, float, str)
+    TAGS = (type(None), bool, int, float, str)
+
+    @staticmethod
+    def _put_values(dct: dict, prefix: str, values: list):
+        """ store a list of python values as typed arrays (blob if not scalars)
+        """
+        tags = np.empty(len(values), dtype=np.int8)
+        try:
+            for i, x in enumerate(values):
+                tags[i] = CprnModelFile.TAGS.index(type(x))
+            arr_int = np.array([int(x) if t in (1, 2) else 0 for x, t in zip(values, tags.tolist())], dtype=np.int64)
+        except (ValueError, OverflowError):
+            dct[f'{prefix}/blob'] = np.frombuffer(pickle.dumps(list(values), protocol=5), dtype=np.uint8)
+            return
+        dct[f'{prefix}/tag'] = tags
+        dct[f'{prefix}/int'] = arr_int
+        dct[f'{prefix}/float'] = np.array([x if t == 3 else 0. for x, t in zip(values, tags.tolist())], dtype=np.float64)
+        dct[f'{prefix}/str'] = np.array([x if t == 4 else '' for x, t in zip(values, tags.tolist())], dtype=str)
+
+    @staticmethod
+    def _get_values(npz, prefix: str) -> list:
+        if f'{prefix}/blob' in npz:
+            return pickle.loads(npz[f'{prefix}/blob'].tobytes())
+        tags = npz[f'{prefix}/tag'].tolist()
+        arr_int, arr_float = npz[f'{prefix}/int'].tolist(), npz[f'{prefix}/float'].tolist()
+        arr_str = npz[f'{prefix}/str'].tolist()
+        decode = (lambda i: None, lambda i: bool(arr_int[i]), lambda i: arr_int[i],
+                  lambda i: arr_float[i], lambda i: arr_str[i])
+        return [decode[t](i) for i, t in enumerate(tags)]
+
+    @staticmethod
+    def _object_array(values: list) -> np.ndarray:
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+        return arr
+
+    @staticmethod
+    def _put_column(dct: dict, prefix: str, col: _Column):
+        if col.codes is not None:
+            dct[f'{prefix}/codes'] = col.codes
+            CprnModelFile._put_values(dct, f'{prefix}/cat', col.categories.tolist())
+        else:
+            is_missing = np.array([x is _MISSING for x in col.values], dtype=bool)
+            dct[f'{prefix}/missing'] = is_missing
+            CprnModelFile._put_values(dct, f'{prefix}/values',
+                                      [None if x is _MISSING else x for x in col.values])
+
+    @staticmethod
+    def _get_column(npz, prefix: str) -> _Column:
+        if f'{prefix}/codes' in npz:
+            return _Column(codes=npz[f'{prefix}/codes'],
+                           categories=CprnModelFile._object_array(CprnModelFile._get_values(npz, f'{prefix}/cat')))
+        values = CprnModelFile._object_array(CprnModelFile._get_values(npz, f'{prefix}/values'))
+        values[npz[f'{prefix}/missing']] = _MISSING
+        return _Column(values=values)
+
+    @staticmethod
+    def _put_columns(dct: dict, group: str, columns: dict):
+        CprnModelFile._put_values(dct, f'{group}/names', list(columns))
+        for i, col in enumerate(columns.values()):
+            CprnModelFile._put_column(dct, f'{group}/{i}', col)
+
+    @staticmethod
+    def _get_columns(npz, group: str) -> dict:
+        names = CprnModelFile._get_values(npz, f'{group}/names')
+        return {name: CprnModelFile._get_column(npz, f'{group}/{i}') for i, name in enumerate(names)}
+
+    @staticmethod
+    def to_arrays(cg: CompactCprnGraph) -> dict:
+        """ npz arrays of a compact model
+        """
+        dct = {'meta/format': np.array(CprnModelFile.FORMAT),
+               'meta/version': np.array(CprnModelFile.VERSION)}
+        CprnModelFile._put_values(dct, 'meta/attrs', [cg.edge_code_attr, cg.edge_id_attr])
+        CprnModelFile._put_values(dct, 'meta/edge_keys', list(cg.edge_keys))
+        CprnModelFile._put_values(dct, 'meta/node_keys', list(cg.node_keys))
+        for name in ('vtx_sorter', 'fwd_indptr', 'fwd_nbr', 'fwd_eid', 'rev_indptr', 'rev_nbr', 'rev_eid',
+                     'edge_src', 'edge_tgt', 'weight', 'vtx_fac_mask', 'fac_indptr', 'fac_rec_mask',
+                     'has_fac_types', 'has_lst_fac'):
+            dct[f'csr/{name}'] = getattr(cg, name) if name != 'vtx_sorter' else cg.vtx_index.sorter
+        dct['csr/vtx_codes'] = cg.vtx_codes.codes
+        if cg.weight_missing is not None:
+            dct['csr/weight_missing'] = cg.weight_missing
+        if cg.edge_id_indptr is not None:
+            dct['csr/edge_id_indptr'] = cg.edge_id_indptr
+            if cg.edge_id_flat.dtype == object:
+                CprnModelFile._put_values(dct, 'csr/edge_id_flat', cg.edge_id_flat.tolist())
+            else:
+                dct['csr/edge_id_flat'] = cg.edge_id_flat
+        if cg.edge_code_col is not None:
+            CprnModelFile._put_column(dct, 'edge_code', cg.edge_code_col)
+        # fac_type 按位序保存
+        CprnModelFile._put_values(dct, 'fac/types', sorted(cg.fac_type_bits, key=cg.fac_type_bits.get))
+
+        CprnModelFile._put_columns(dct, 'edge', cg.edge_cols)
+        CprnModelFile._put_columns(dct, 'node', cg.node_cols)
+        CprnModelFile._put_columns(dct, 'fac', cg.fac_records.columns)
+        dct['fac/n'] = np.array(len(cg.fac_records))
+
+        graph_attr = dict(cg.graph_attr)
+        gidx = graph_attr.pop(EdgeGeometryIndex.GRAPH_KEY, None)
+        if gidx is not None:
+            CprnModelFile._put_values(dct, 'graph/geom/edge_codes', gidx.edge_codes.tolist())
+            if gidx.eids.dtype == object:
+                CprnModelFile._put_values(dct, 'graph/geom/eids', gidx.eids.tolist())
+            else:
+                dct['graph/geom/eids'] = gidx.eids
+            for name in ('eid_indptr', 'coord_indptr', 'coords'):
+                dct[f'graph/geom/{name}'] = getattr(gidx, name)
+        dct['graph/attr'] = np.frombuffer(pickle.dumps(graph_attr, protocol=5), dtype=np.uint8)
+        return dct
+
+    @staticmethod
+    def from_arrays(npz) -> CompactCprnGraph:
+        """ compact model from npz arrays (mapping of name -> array)
+        """
+        if str(npz['meta/format']) != CprnModelFile.FORMAT or int(npz['meta/version']) > CprnModelFile.VERSION:
+            raise ValueError(f"Not a {CprnModelFile.FORMAT} model (version <= {CprnModelFile.VERSION})")
+        edge_code_attr, edge_id_attr = CprnModelFile._get_values(npz, 'meta/attrs')
+
+        if 'csr/edge_id_indptr' in npz:
+            edge_id_indptr = npz['csr/edge_id_indptr']
+            edge_id_flat = (npz['csr/edge_id_flat'] if 'csr/edge_id_flat' in npz else
+                CprnModelFile._object_array(CprnModelFile._get_values(npz, 'csr/edge_id_flat')))
+        else:
+            edge_id_indptr = edge_id_flat = None
+        edge_code_col = CprnModelFile._get_column(npz, 'edge_code') if 'edge_code/codes' in npz \
+            or 'edge_code/missing' in npz else None
+        fac_type_bits = {fac_type: bit for bit, fac_type in enumerate(CprnModelFile._get_values(npz, 'fac/types'))}
+
+        graph_attr = pickle.loads(npz['graph/attr'].tobytes())
+        if 'graph/geom/eid_indptr' in npz:
+            eids = (npz['graph/geom/eids'] if 'graph/geom/eids' in npz else
+                CprnModelFile._object_array(CprnModelFile._get_values(npz, 'graph/geom/eids')))
+            graph_attr[EdgeGeometryIndex.GRAPH_KEY] = EdgeGeometryIndex(
+                CprnModelFile._object_array(CprnModelFile._get_values(npz, 'graph/geom/edge_codes')),
+                npz['graph/geom/eid_indptr'], eids, npz['graph/geom/coord_indptr'], npz['graph/geom/coords'])
+
+        csr = {name: npz[f'csr/{name}'] for name in (
+            'vtx_codes', 'vtx_sorter', 'fwd_indptr', 'fwd_nbr', 'fwd_eid', 'rev_indptr', 'rev_nbr', 'rev_eid',
+            'edge_src', 'edge_tgt', 'weight', 'vtx_fac_mask', 'fac_indptr', 'fac_rec_mask',
+            'has_fac_types', 'has_lst_fac')}
+        return CompactCprnGraph(csr['vtx_codes'], csr['vtx_sorter'],
+            csr['fwd_indptr'], csr['fwd_nbr'], csr['fwd_eid'], csr['rev_indptr'], csr['rev_nbr'], csr['rev_eid'],
+            csr['edge_src'], csr['edge_tgt'], csr['weight'],
+            npz['csr/weight_missing'] if 'csr/weight_missing' in npz else None,
+            edge_code_col, CprnModelFile._get_columns(npz, 'edge'), edge_id_indptr, edge_id_flat,
+            CprnModelFile._get_columns(npz, 'node'), csr['has_fac_types'], csr['has_lst_fac'], fac_type_bits,
+            csr['vtx_fac_mask'], csr['fac_indptr'],
+            FacTable(CprnModelFile._get_columns(npz, 'fac'), int(npz['fac/n'])), csr['fac_rec_mask'],
+            graph_attr=graph_attr, edge_code_attr=edge_code_attr, edge_id_attr=edge_id_attr,
+            edge_keys=CprnModelFile._get_values(npz, 'meta/edge_keys'),
+            node_keys=CprnModelFile._get_values(npz, 'meta/node_keys'))
+
+    @staticmethod
+    def _extract_hash(file_path: str) -> str:
+        return os.path.basename(file_path)[:-len(CprnModelFile.EXTENSION)].split("_")[-1]
+
+    @staticmethod
+    def dump(G, file_path: str, compress: bool = False, verbose: bool = False) -> str:
+        """ write a model file, renamed "{name}_{yymmdd}_{sha256}.cprn.npz"
+
+        Args:
+            G: cprn nx.DiGraph (compiled to a compact model) or CompactCprnGraph
+            file_path: target file path
+            compress: zip-deflate the arrays (smaller, slower to load)
+        Returns:
+            str: final file path
+        """
+        cg = G if isinstance(G, CompactCprnGraph) else CompactCprnGraph.from_digraph(G)
+        dct = CprnModelFile.to_arrays(cg)
+
+        def write_npz(f):
+            # 与 np.savez 相同的 npz 结构, 直接写入 (经 hash) 文件流
+            with zipfile.ZipFile(f, mode='w', allowZip64=True,
+                                 compression=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED) as zipf:
+                for name, arr in dct.items():
+                    with zipf.open(f'{name}.npy', 'w', force_zip64=True) as f_arr:
+                        np.lib.format.write_array(f_arr, np.asanyarray(arr), allow_pickle=False)
+
+        file_path = file_path[:-len(CprnModelFile.EXTENSION)] + '.npz' \
+            if file_path.endswith(CprnModelFile.EXTENSION) else file_path
+        final_file_path = PickleIO._dump_hashed(write_npz, file_path, CprnModelFile.EXTENSION)
+        log.info(f"Saved {cg} as {final_file_path} ({len(dct)} arrays)") if verbose else None
+        return final_file_path
+
+    @staticmethod
+    def load(file_path: str, verify: bool = True, verbose: bool = False) -> CompactCprnGraph:
+        """ load a model file as a searchable `CompactCprnGraph`
+
+        Args:
+            verify: check the sha-256 of the file name
+        """
+        if verify:
+            PickleIO._check_hash(PickleIO._get_file_hash(file_path), CprnModelFile._extract_hash(file_path))
+        with np.load(file_path, allow_pickle=False) as npz:
+            cg = CprnModelFile.from_arrays({name: npz[name] for name in npz.files})
+        log.info(f"Loaded {cg} from {file_path}") if verbose else None
+        return cg
+
+    @staticmethod
+    def from_pickle(pkl_path: str, file_path: str, verbose: bool = False) -> str:
+        """ convert a pickled cprn DiGraph model (any `PickleIO` codec) to a model file
+        """
+        return CprnModelFile.dump(PickleIO.load_from_pickle(pkl_path), file_path, verbose=verbose)
+
+    @staticmethod
+    def to_pickle(file_path: str, pkl_path: str, codec: str = None) -> str:
+        """ convert a model file back to a pickled cprn DiGraph (`PickleIO` codec)
+        """
+        DG = CprnModelFile.load(file_path).to_digraph()
+        return PickleIO.dump_as_pickle(DG, pkl_path, codec=codec)
@@ -0,0 +1,121 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : process-pool parallel facility search (cprn)
+description : the CSR snapshot is built once in the parent process and
+    shared read-only with forked workers (copy-on-write), start vertices are
+    split into ordered chunks and results are merged in chunk order
+"""
+
+
+import gc
+import os
+import multiprocessing as mp
+
+import pandas as pd
+import networkx as nx
+
+from loguru import logger as log
+
+from cprn.model.topo.csr_graph import CprnCsrGraph
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+# snapshot inherited by forked workers, never pickled per task
+_WORKER_GRAPH = None
+
+
+def _search_chunk(args: tuple) -> list[dict]:
+    """ worker task: batch search of one chunk of start vertices
+    """
+    start_nodes, dct_spec = args
+    return CprnTopoSearch.fac_bfs_depth_batch(_WORKER_GRAPH, start_nodes,
+        as_df=False, **dct_spec)
+
+
+class ParallelFacSearch:
+    """ Parallel executor for `fac_bfs_depth` workloads
+
+    Example:
+        >>> pfs = ParallelFacSearch(dg_cprn, n_workers=16)
+        >>> df_intvl = pfs.run(lst_vtx_gtr, fac_types=['G1','G2','G3'],
+        ...     direction='downstream', max_depth=1, max_dist=30000)
+
+    Workers are started with the `fork` method so the snapshot is shared by
+    copy-on-write pages instead of being pickled for every task. Where `fork`
+    is unavailable (e.g. Windows) the search falls back to one in-process batch.
+    """
+
+    def __init__(self, DG, n_workers: int = None, chunk_size: int = None,
+                 edge_code_attr: str = 'edge_code', verbose: bool = False):
+        """
+        Args:
+            DG: networkx.DiGraph or CprnCsrGraph (compiled once if a DiGraph)
+            n_workers: number of worker processes (default: `os.cpu_count()`)
+            chunk_size: start vertices per task (default: ~4 tasks per worker)
+            edge_code_attr: edge code attribute used when compiling a DiGraph
+            verbose: whether to log the execution plan
+        """
+        if isinstance(DG, nx.DiGraph):
+            DG = CprnCsrGraph.from_digraph(DG, edge_code_attr=edge_code_attr)
+        self.G = DG
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+
+    def _chunks(self, start_nodes: list) -> list[list]:
+        chunk_size = self.chunk_size or max(1, -(-len(start_nodes) // (self.n_workers * 4)))
+        return [start_nodes[i:i + chunk_size] for i in range(0, len(start_nodes), chunk_size)]
+
+    def run(self, start_nodes: list[str], fac_types: list, direction: str,
+            max_depth: int = 3, max_dist: int = 1000000,
+            mark_max_dist: bool = False,
+            query_avoid_fac: list = None,
+            query_avoid_edge: str = None,
+            edge_code_attr: str = 'edge_code',
+            as_df: bool = True):
+        """ search all start vertices, same output as `fac_bfs_depth_batch`
+
+        Output order is the order of `start_nodes`, independent of the number of
+        workers and of task completion order.
+        """
+        global _WORKER_GRAPH
+        dct_spec = dict(fac_types=fac_types, direction=direction,
+            max_depth=max_depth, max_dist=max_dist, mark_max_dist=mark_max_dist,
+            query_avoid_fac=query_avoid_fac, query_avoid_edge=query_avoid_edge,
+            edge_code_attr=edge_code_attr)
+        start_nodes = list(start_nodes)
+        use_fork = 'fork' in mp.get_all_start_methods()
+
+        if self.n_workers <= 1 or len(start_nodes) <= 1 or not use_fork:
+            if not use_fork and self.n_workers > 1:
+                log.warning("start method `fork` unavailable, running search in-process")
+            return CprnTopoSearch.fac_bfs_depth_batch(self.G, start_nodes, as_df=as_df, **dct_spec)
+
+        # warm the hot-loop views (and the avoid-edge mask) before forking so workers inherit them
+        self.G.hot_views(direction)
+        self.G.hot_edges()
+        self.G.hot_facilities()
+        self.G.hot_edge_mask(query_avoid_edge) if query_avoid_edge else None
+
+        lst_chunks = self._chunks(start_nodes)
+        log.info(f"Parallel search: {len(start_nodes)} start nodes, {len(lst_chunks)} chunks, "
+                 f"{self.n_workers} workers") if self.verbose else None
+
+        _WORKER_GRAPH = self.G
+        gc.freeze()     # keep gc from touching (and copying) inherited pages
+        try:
+            ctx = mp.get_context('fork')
+            with ctx.Pool(processes=min(self.n_workers, len(lst_chunks))) as pool:
+                lst_results = pool.map(_search_chunk, [(chunk, dct_spec) for chunk in lst_chunks])
+        finally:
+            gc.unfreeze()
+            _WORKER_GRAPH = None
+
+        lst_interval = [dct for lst in lst_results for dct in lst]
+        if not as_df:
+            return lst_interval
+        return pd.DataFrame(lst_interval)
@@ -0,0 +1,156 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : result cache of facility searches (cprn)
+description : bounded LRU cache of `fac_bfs_depth` results keyed by a
+    normalized search spec and the graph fingerprint, with hit / miss
+    statistics and an optional on-disk tier reused across sessions
+"""
+
+
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+from loguru import logger as log
+
+
+class SearchResultCache:
+    """ LRU cache of facility search results
+
+    Example:
+        >>> cache = CprnTopoSearch.enable_result_cache(maxsize=4096, disk_dir='./cache_topo',
+        ...                                            graphs=[dg_cprn])
+        >>> CprnTopoSearch.fac_bfs_depth(dg_cprn, vtx, ['G1'], 'downstream')   # miss
+        >>> CprnTopoSearch.fac_bfs_depth(dg_cprn, vtx, ['G1'], 'downstream')   # hit
+        >>> cache.stats()
+        {'size': 1, 'maxsize': 4096, 'hits': 1, 'misses': 1, 'disk_hits': 0, 'evictions': 0}
+
+    Cached results are returned as copies (records and their list values), so
+    callers may modify them freely. Disk entries are keyed by the same spec and
+    fingerprint, models loaded by `load_cprn` keep their fingerprint (file
+    sha-256) across sessions until edited in place.
+
+    Only graphs opted in by `GraphFingerprint.track` are cached. In-place edits
+    of a tracked graph (weights, edge attributes, facility records) must be
+    followed by `GraphFingerprint.bump(DG)` (`FacilityLayer.embed` bumps by
+    itself), otherwise stale results are served.
+    """
+
+    # 结果一致的引擎共用缓存条目
+    _VERSION_FAMILY = {'csr': 'v2'}
+
+    def __init__(self, maxsize: int = 1024, disk_dir: str = None):
+        """
+        Args:
+            maxsize: number of results kept in memory
+            disk_dir: directory of the on-disk tier (None: memory only)
+        """
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"SearchResultCache({self.stats()})"
+
+    @staticmethod
+    def make_key(fingerprint: str, start_node: str, fac_types: list, direction: str,
+                 max_depth: int, max_dist: int, mark_max_dist: bool,
+                 query_avoid_fac: list, query_avoid_edge: str,
+                 edge_code_attr: str, version: str) -> tuple:
+        """ normalized (hashable, order-insensitive) key of a search
+        """
+        return (fingerprint, start_node,
+                tuple(sorted(set(fac_types), key=repr)), direction,
+                max_depth, max_dist, bool(mark_max_dist),
+                tuple(sorted(set(query_avoid_fac), key=repr)) if query_avoid_fac else (),
+                query_avoid_edge.strip() if query_avoid_edge else None,
+                edge_code_attr,
+                SearchResultCache._VERSION_FAMILY.get(version, version))
+
+    @staticmethod
+    def _copy(lst_records: list[dict]) -> list[dict]:
+        return [{k: list(v) if isinstance(v, list) else v for k, v in rec.items()}
+                for rec in lst_records]
+
+    def _disk_path(self, key: tuple) -> str:
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.pkl")
+
+    def get(self, key: tuple):
+        """ cached result (a copy) of the search key, None on miss
+        """
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._copy(self._data[key])
+
+        if self.disk_dir is not None:
+            file_path = self._disk_path(key)
+            if os.path.exists(file_path):
+                try:
+                    with open(file_path, 'rb') as f:
+                        stored_key, lst_records = pickle.load(f)
+                except Exception as e:
+                    log.warning(f"Unreadable search cache entry {file_path}: {e}")
+                else:
+                    if stored_key == key:
+                        self.disk_hits += 1
+                        self.hits += 1
+                        self._store(key, lst_records)
+                        return self._copy(lst_records)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, lst_records: list[dict]):
+        """ store a search result (copied) in memory and on disk
+        """
+        lst_records = self._copy(lst_records)
+        self._store(key, lst_records)
+        if self.disk_dir is not None:
+            file_path = self._disk_path(key)
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump((key, lst_records), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, file_path)
+            except Exception as e:
+                log.warning(f"Failed to write search cache entry {file_path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _store(self, key: tuple, lst_records: list[dict]):
+        self._data[key] = lst_records
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self, disk: bool = False):
+        """ drop memory entries and statistics (and disk entries if `disk`)
+        """
+        self._data.clear()
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+        if disk and self.disk_dir is not None:
+            for filename in os.listdir(self.disk_dir):
+                if filename.endswith('.pkl'):
+                    os.remove(os.path.join(self.disk_dir, filename))
+
+    def stats(self) -> dict:
+        return {'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'disk_hits': self.disk_hits, 'evictions': self.evictions}
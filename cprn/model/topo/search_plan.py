@@ -0,0 +1,144 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : precompiled facility search plan (cprn)
+description : a search spec (fac types, direction, limits, avoid rules) is
+    validated and compiled once (engine, avoid sets, blocked-edge set / mask)
+    and then executed against many start vertices without per-call dispatch
+"""
+
+
+from array import array
+from typing import Iterator
+
+import pandas as pd
+
+from loguru import logger as log
+
+from cprn.model.topo.csr_graph import CprnCsrGraph
+from cprn.model.topo.edge_mask import EdgeMask
+from cprn.model.topo.search_tree import SearchTree
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+class SearchPlan:
+    """ Compiled `fac_bfs_depth` spec, executable against many start vertices
+
+    Example:
+        >>> plan = SearchPlan(dg_cprn, ['DC2'], 'upstream', max_depth=1, max_dist=1000)
+        >>> plan.run(vtx_st, limit=1)
+        >>> df = plan.run_many(lst_vtx_st, as_df=True)
+
+    Results equal `CprnTopoSearch.fac_bfs_depth` with the same arguments. The
+    plan holds precompiled state of the graph (blocked-edge set or mask), so
+    build a new plan after editing the graph. Plans do not use the result cache.
+    """
+    VERSIONS = ('v2', 'v3', 'csr')
+
+    def __init__(self, DG, fac_types: list, direction: str,
+                 max_depth: int = 3, max_dist: int = 1000000,
+                 mark_max_dist: bool = False,
+                 query_avoid_fac: list = None,
+                 query_avoid_edge: str = None,
+                 edge_code_attr: str = 'edge_code',
+                 version: str = 'v2',
+                 lazy_edges: bool = False,
+                 verbose: bool = False):
+        """
+        Args:
+            DG: networkx.DiGraph or CprnCsrGraph (always searched by `csr`)
+            version: 'v2', 'v3' or 'csr' (a DiGraph is compiled once for `csr`)
+            (others): see `CprnTopoSearch.fac_bfs_depth_v2`
+        """
+        if direction not in ('downstream', 'upstream'):
+            raise ValueError("Direction must be 'downstream' or 'upstream'.")
+        if isinstance(DG, CprnCsrGraph):
+            version = 'csr'
+        if version not in SearchPlan.VERSIONS:
+            raise ValueError(f"Version '{version}' not supported. Available versions: {list(SearchPlan.VERSIONS)}")
+        if version == 'csr' and not isinstance(DG, CprnCsrGraph):
+            DG = CprnCsrGraph.from_digraph(DG, edge_code_attr=edge_code_attr)
+
+        self.DG = DG
+        self.version = version
+        self.fac_types = frozenset(fac_types)
+        self.direction = direction
+        self.max_depth = max_depth
+        self.max_dist = max_dist
+        self.mark_max_dist = mark_max_dist
+        self.set_fac_avoid = frozenset(query_avoid_fac) if query_avoid_fac else frozenset()
+        self.query_avoid_edge = query_avoid_edge
+        self.edge_code_attr = edge_code_attr
+        self.lazy_edges = lazy_edges
+        self.verbose = verbose
+
+        if version == 'csr':
+            # 预热快照视图及边掩码, 访问标记数组在各次检索间复用
+            DG.hot_views(direction)
+            DG.hot_edge_mask(query_avoid_edge) if query_avoid_edge else None
+            self._vtx_visited = array('q', [0]) * DG.number_of_nodes()
+            self._stamp = 0
+            self._tree = SearchTree()
+            self.set_avoid_edge = None
+        else:
+            # 规避表达式整图求值一次, 检索时仅查集合
+            self.set_avoid_edge = EdgeMask.blocked_edges(DG, query_avoid_edge) if query_avoid_edge else None
+            self._func = CprnTopoSearch.fac_bfs_iter_v2 if version == 'v2' else CprnTopoSearch.fac_bfs_iter_v3
+        log.info(f"Compiled {self}") if verbose else None
+
+    def __repr__(self) -> str:
+        return (f"SearchPlan({self.version}, {sorted(self.fac_types)}, {self.direction}, "
+                f"max_depth={self.max_depth}, max_dist={self.max_dist})")
+
+    def iter(self, start_node: str) -> Iterator[dict]:
+        """ stream the records of one start vertex (see `CprnTopoSearch.fac_bfs_iter`)
+        """
+        if self.version == 'csr':
+            # 独立的访问标记, 可与其他检索交替迭代
+            return self._csr_iter(start_node, bytearray(self.DG.number_of_nodes()), 1, SearchTree())
+        if start_node not in self.DG:
+            raise KeyError(f"Start node {start_node} not in graph")
+        return self._func(self.DG, start_node, self.fac_types, self.direction,
+            self.max_depth, self.max_dist, self.mark_max_dist, self.set_fac_avoid,
+            self.query_avoid_edge, self.edge_code_attr, self.lazy_edges,
+            self.set_avoid_edge, self.verbose)
+
+    def _csr_iter(self, start_node: str, vtx_visited, stamp: int, tree: SearchTree) -> Iterator[dict]:
+        G = self.DG
+        if start_node not in G.vtx_index:
+            raise KeyError(f"Start node {start_node} not in graph")
+        return CprnTopoSearch._fac_bfs_csr_core(G, G.vtx_index[start_node],
+            self.fac_types, self.direction, self.max_depth, self.max_dist, self.mark_max_dist,
+            self.set_fac_avoid, self.query_avoid_edge, self.edge_code_attr, self.lazy_edges,
+            self.verbose, vtx_visited=vtx_visited, stamp=stamp, tree=tree)
+
+    def run(self, start_node: str, limit: int = None) -> list[dict]:
+        """ records of one start vertex, optionally the first `limit` facilities only
+        """
+        if self.version == 'csr':
+            self._stamp += 1
+            if self.lazy_edges:
+                # 惰性边路径引用检索树, 每次检索须用新树 (复用会使先前结果失效)
+                tree = SearchTree()
+            else:
+                tree = self._tree
+                tree.reset()
+            iter_found = self._csr_iter(start_node, self._vtx_visited, self._stamp, tree)
+        else:
+            iter_found = self.iter(start_node)
+        if limit is not None:
+            return CprnTopoSearch._take(iter_found, limit)
+        return list(iter_found)
+
+    def run_many(self, start_nodes: list[str], limit: int = None, as_df: bool = False):
+        """ records of many start vertices (in order) with column `vtx_start`
+        """
+        lst_interval = []
+        for start_node in start_nodes:
+            lst_interval.extend({'vtx_start': start_node, **dct} for dct in self.run(start_node, limit))
+        if as_df:
+            return pd.DataFrame(lst_interval)
+        return lst_interval
@@ -0,0 +1,120 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : parent-pointer search tree for facility traversal (cprn)
+description : every enqueued vertex keeps one pointer to its parent entry and
+    the code of the edge it was reached by; interval / cumulative edge lists
+    are rebuilt by walking the pointers only when a caller really reads them
+"""
+
+
+from array import array
+from collections.abc import Sequence
+
+
+class SearchTree:
+    """ Parent-pointer tree of traversal entries
+
+    Entry `0` is the root (start vertex). Every other entry records the index
+    of its parent entry and the edge code of the edge from parent to itself.
+    """
+    __slots__ = ('parent', 'edge')
+
+    ROOT = 0
+
+    def __init__(self):
+        self.parent = array('q', [-1])
+        self.edge = [None]
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def reset(self):
+        """ drop all entries but the root (buffers are reused by the next search)
+
+        Lazy `EdgePath` handles still pointing into the tree become invalid.
+        """
+        del self.parent[1:]
+        del self.edge[1:]
+
+    def add(self, parent: int, edge_code) -> int:
+        """ append an entry reached from `parent` via `edge_code`, return its index
+        """
+        self.parent.append(parent)
+        self.edge.append(edge_code)
+        return len(self.parent) - 1
+
+    def edges_between(self, anchor: int, entry: int) -> list:
+        """ list edge codes (in traversal order) on the tree path anchor -> entry
+
+        Edges without code (`None`) are skipped, same as the copy-based search.
+        """
+        parent, edge = self.parent, self.edge
+        lst_edges = []
+        while entry != anchor and entry >= 0:
+            edge_code = edge[entry]
+            if edge_code is not None:
+                lst_edges.append(edge_code)
+            entry = parent[entry]
+        lst_edges.reverse()
+        return lst_edges
+
+    def path(self, anchor: int, entry: int, lazy: bool = False):
+        """ edge path anchor -> entry, as list or as lazy `EdgePath` handle
+        """
+        if lazy:
+            return EdgePath(self, anchor, entry)
+        return self.edges_between(anchor, entry)
+
+
+class EdgePath(Sequence):
+    """ Lazy handle of an edge code path in a `SearchTree`
+
+    Behaves like a read-only list of edge codes; the codes are collected from
+    the tree on first access and cached afterwards. Use `to_list()` to obtain a
+    plain list (e.g. before pickling / persisting results).
+    """
+    __slots__ = ('_tree', '_anchor', '_entry', '_edges')
+
+    def __init__(self, tree: SearchTree, anchor: int, entry: int):
+        self._tree = tree
+        self._anchor = anchor
+        self._entry = entry
+        self._edges = None
+
+    def _materialize(self) -> list:
+        if self._edges is None:
+            self._edges = self._tree.edges_between(self._anchor, self._entry)
+            self._tree = None   # release the tree once materialized
+        return self._edges
+
+    def to_list(self) -> list:
+        return list(self._materialize())
+
+    def __getitem__(self, idx):
+        return self._materialize()[idx]
+
+    def __len__(self) -> int:
+        return len(self._materialize())
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, EdgePath):
+            other = other._materialize()
+        if isinstance(other, list):
+            return self._materialize() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self._materialize()))
+
+    def __repr__(self) -> str:
+        return repr(self._materialize())
+
+    def __reduce__(self):
+        return (list, (self._materialize(),))
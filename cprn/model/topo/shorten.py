@@ -0,0 +1,281 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : degree-2 chain contraction (graph shortening) of a cprn DiGraph
+description : transfer vertices (one way 1 -> v -> 1, or two way a <-> v <-> b,
+    same road attributes on both sides, no facility) are found from degree
+    arrays, their chains are walked once and replaced by single edges whose
+    attributes are merged with built-in strategies; the shortened graph is
+    built in one pass with `edge_code` assigned
+"""
+
+
+import functools
+
+import numpy as np
+import networkx as nx
+
+from loguru import logger as log
+
+from cprn.model.topo.dc_nodes import DcNodes
+
+
+class CprnShortener:
+    """ Chain contraction of a cprn DiGraph
+
+    Merge strategies (per edge attribute, applied to the values along a chain):
+        - 'sum': sum, None ignored (0 if all None), e.g. `weight`
+        - 'concat': concatenated lists (scalars as one item), e.g. `edge_id`
+        - 'same-or-MIXED': the common value, 'MIXED' if values differ
+        - 'min': minimum, None ignored
+        - 'first': value of the first edge
+        - a callable (x, y) -> z folded over the values, as the merge
+          callbacks of the A4 notebook
+    Attributes without strategy keep the value of the first edge of the chain.
+
+    Example:
+        >>> dg_cprn_short = CprnShortener.shorten(dg_cprn,
+        ...     drop_edge_attrs=['vertices', 'osm_id', 'rrl_id'], verbose=True)
+        >>> dg_cprn_short.edges[u, v]['edge_id']    # original edge ids of the chain
+        ['WTSW3V...', 'WTSW3V...']
+
+    Notes:
+        A chain is left partly uncontracted (a vertex of it kept) when the
+        contracted edge would be a self loop, or would duplicate an existing
+        edge and no `dct_edge_override` is given. With `dct_edge_override`
+        duplicates are merged (existing edge first) as `shorten_dg_v4` does.
+    """
+    MIXED = 'MIXED'
+    ATTRS_TRANSFER = ('rcode', 'knd', 'cls', 'rtype', 'mdir', 'lane')
+    STRATEGIES = ('sum', 'concat', 'same-or-MIXED', 'min', 'first')
+
+    # A4 合并规则 (dct_edge_merge) 对应的内置策略
+    DEFAULT_MERGE = {'edge_id': 'concat', 'weight': 'sum',
+                     **{attr: 'same-or-MIXED' for attr in ATTRS_TRANSFER}}
+
+    # A4 重复边覆盖规则 (dct_edge_override) 对应的内置策略
+    NOTEBOOK_OVERRIDE = {'edge_id': 'concat', 'weight': 'min',
+                         'rcode': 'first', 'knd': 'first', 'cls': 'first',
+                         'rtype': 'first', 'mdir': 'first', 'lane': 'min'}
+
+    @staticmethod
+    def merge_values(strategy, values: list):
+        """ merge attribute values of consecutive edges with a strategy
+        """
+        if strategy == 'sum':
+            lst = [x for x in values if x is not None]
+            return sum(lst) if lst else 0
+        if strategy == 'concat':
+            merged = []
+            for x in values:
+                if isinstance(x, list):
+                    merged.extend(x)
+                elif x is not None:
+                    merged.append(x)
+            return merged
+        if strategy == 'same-or-MIXED':
+            first = values[0]
+            return first if all(x == first for x in values[1:]) else CprnShortener.MIXED
+        if strategy == 'min':
+            lst = [x for x in values if x is not None]
+            return min(lst) if lst else None
+        if strategy == 'first':
+            return values[0]
+        if callable(strategy):
+            return functools.reduce(strategy, values)
+        raise ValueError(f"Merge strategy '{strategy}' not supported. "
+                         f"Available strategies: {list(CprnShortener.STRATEGIES)} or a callable")
+
+    @staticmethod
+    def _merge_dicts(lst_attr: list[dict], dct_strategy: dict) -> dict:
+        # 属性字典按 `merge_values` 逐属性合并, 其余属性取首条边
+        merged = dict(lst_attr[0])
+        for attr, strategy in dct_strategy.items():
+            values = [dct.get(attr) for dct in lst_attr]
+            if attr not in merged and all(x is None for x in values):
+                continue    # attribute absent on the whole chain
+            merged[attr] = CprnShortener.merge_values(strategy, values)
+        return merged
+
+    @staticmethod
+    def transfer_vertices(DG: nx.DiGraph,
+                          lst_attr: list = ATTRS_TRANSFER,
+                          vertices: list = None) -> set:
+        """ removable transfer vertices of DG
+
+        A vertex is removable if it carries no facility and either
+            - has one predecessor p and one successor s (p != s), or
+            - has the same two neighbours a, b as predecessors and successors,
+        and the edges passing through it (p -> v -> s; a -> v -> b, b -> v -> a)
+        agree on all `lst_attr`.
+
+        Args:
+            lst_attr: edge attributes that must not change across the vertex
+            vertices: candidate vertices (all vertices if None)
+        """
+        vtx_codes, in_degree, out_degree = DcNodes.degree_arrays(DG)
+        mask = ((in_degree == 1) & (out_degree == 1)) | ((in_degree == 2) & (out_degree == 2))
+        set_candidate = set(vertices) if vertices is not None else None
+
+        def same(dct_in: dict, dct_out: dict) -> bool:
+            return all(dct_in.get(attr) == dct_out.get(attr) for attr in lst_attr)
+
+        adj_pred, adj_succ = DG._pred, DG._succ     # 原始邻接字典, 免去视图开销
+        set_transfer = set()
+        for v in vtx_codes[np.flatnonzero(mask)].tolist():
+            if set_candidate is not None and v not in set_candidate:
+                continue
+            attr = DG._node[v]
+            if attr.get('is_fac') or attr.get('lst_fac_attr') or attr.get('fac_types'):
+                continue
+            pred, succ = adj_pred[v], adj_succ[v]
+            if v in pred:
+                continue    # self loop
+            if len(pred) == 1:
+                (p, dct_in), = pred.items()
+                (s, dct_out), = succ.items()
+                if p != s and same(dct_in, dct_out):
+                    set_transfer.add(v)
+            elif pred.keys() == succ.keys():
+                a, b = pred
+                if same(pred[a], succ[b]) and same(pred[b], succ[a]):
+                    set_transfer.add(v)
+        return set_transfer
+
+    @staticmethod
+    def shorten(DG: nx.DiGraph,
+                vertices: list = None,
+                lst_attr: list = ATTRS_TRANSFER,
+                dct_edge_merge: dict = None,
+                dct_edge_override: dict = None,
+                edge_code_attr: str = 'edge_code',
+                edge_id_attr: str = 'edge_id',
+                drop_edge_attrs: list = None,
+                verbose: bool = False) -> nx.DiGraph:
+        """ shortened copy of DG with transfer vertex chains contracted
+
+        Args:
+            DG: cprn DiGraph (not modified)
+            vertices: candidate vertices to remove (e.g. `lst_nodes_remove` of the
+                A4 notebook), all transfer vertices if None
+            lst_attr: edge attributes defining transfer vertices
+            dct_edge_merge: attribute -> strategy along a chain (`DEFAULT_MERGE` if None)
+            dct_edge_override: attribute -> strategy merging a contracted edge into
+                an existing edge (e.g. `NOTEBOOK_OVERRIDE`), None keeps such chains apart
+            edge_code_attr: edge attribute set to "{u}_{v}" on every edge
+            edge_id_attr: list attribute of original edge ids ("{u}_{v}" if missing,
+                scalars wrapped in a list), None to skip
+            drop_edge_attrs: edge attributes removed from the output
+        Returns:
+            networkx.DiGraph, node and edge order of DG kept
+        """
+        dct_edge_merge = CprnShortener.DEFAULT_MERGE if dct_edge_merge is None else dct_edge_merge
+        for strategy in list(dct_edge_merge.values()) + list((dct_edge_override or {}).values()):
+            if strategy not in CprnShortener.STRATEGIES and not callable(strategy):
+                raise ValueError(f"Merge strategy '{strategy}' not supported. "
+                                 f"Available strategies: {list(CprnShortener.STRATEGIES)} or a callable")
+
+        set_removed = CprnShortener.transfer_vertices(DG, lst_attr, vertices)
+        n_transfer = len(set_removed)
+        set_resolved = set()
+        set_created = set()     # contracted edges (x, y)
+        adj_pred, adj_succ = DG._pred, DG._succ
+
+        def next_vtx(prev, v):
+            # 单向: 唯一后继; 双向: 非来向的另一邻点
+            for s in adj_succ[v]:
+                if s != prev:
+                    return s
+
+        def walk(x, v1) -> list:
+            path, prev, v = [x], x, v1
+            while v in set_removed:
+                path.append(v)
+                prev, v = v, next_vtx(prev, v)
+            path.append(v)
+            return path
+
+        def has_edge(x, y) -> bool:
+            return (x, y) in set_created or DG.has_edge(x, y)
+
+        def resolve(path: list, two_way: bool):
+            # 自环或 (无覆盖规则时) 重复边 : 保留链中间顶点, 两段分别处理
+            if len(path) <= 2:
+                return
+            x, y = path[0], path[-1]
+            if not (x == y or (dct_edge_override is None
+                               and (has_edge(x, y) or (two_way and has_edge(y, x))))):
+                set_created.add((x, y))
+                set_created.add((y, x)) if two_way else None
+                return
+            m = len(path) // 2
+            set_removed.discard(path[m])
+            resolve(path[:m + 1], two_way)
+            resolve(path[m:], two_way)
+
+        def resolve_from(x):
+            for v1 in adj_succ[x]:
+                if v1 in set_removed and v1 not in set_resolved:
+                    path = walk(x, v1)
+                    set_resolved.update(path[1:-1])
+                    resolve(path, two_way=len(adj_pred[v1]) == 2)
+
+        # 1. chains hanging on kept vertices, each walked once
+        for x in DG.nodes:
+            if x not in set_removed:
+                resolve_from(x)
+        # 2. closed chains of transfer vertices only (e.g. ring roads) : keep one vertex
+        for v in [v for v in DG.nodes if v in set_removed and v not in set_resolved]:
+            if v in set_resolved:
+                continue
+            set_removed.discard(v)
+            set_resolved.add(v)
+            resolve_from(v)
+
+        set_drop = set(drop_edge_attrs) if drop_edge_attrs else set()
+
+        def edge_attr(u, v, data: dict) -> dict:
+            dct = {k: val for k, val in data.items() if k not in set_drop} if set_drop else dict(data)
+            if edge_id_attr is not None:
+                edge_id = dct.get(edge_id_attr)
+                if edge_id is None:
+                    dct[edge_id_attr] = [f"{u}_{v}"]
+                else:
+                    dct[edge_id_attr] = list(edge_id) if isinstance(edge_id, list) else [edge_id]
+            return dct
+
+        # 3. build the shortened graph in one pass over kept vertices
+        DG_short = nx.DiGraph()
+        DG_short.graph.update(DG.graph)
+        DG_short.add_nodes_from((v, dict(attr)) for v, attr in DG.nodes(data=True) if v not in set_removed)
+        dct_edges = {}
+        n_chain = 0
+        for u in DG_short.nodes:
+            for v, data in adj_succ[u].items():
+                if v not in set_removed:
+                    key, dct = (u, v), edge_attr(u, v, data)
+                else:
+                    lst_attr_chain = [edge_attr(u, v, data)]
+                    prev, cur = u, v
+                    while cur in set_removed:
+                        nxt = next_vtx(prev, cur)
+                        lst_attr_chain.append(edge_attr(cur, nxt, adj_succ[cur][nxt]))
+                        prev, cur = cur, nxt
+                    key, dct = (u, cur), CprnShortener._merge_dicts(lst_attr_chain, dct_edge_merge)
+                    n_chain += 1
+                if key in dct_edges:
+                    dct_edges[key] = CprnShortener._merge_dicts([dct_edges[key], dct], dct_edge_override or {})
+                else:
+                    dct_edges[key] = dct
+
+        for (u, v), dct in dct_edges.items():
+            if edge_code_attr is not None:
+                dct[edge_code_attr] = f"{u}_{v}"
+        DG_short.add_edges_from((u, v, dct) for (u, v), dct in dct_edges.items())
+
+        log.info(f"Shortened : {DG} -> {DG_short}, {len(set_removed)} of {n_transfer} transfer "
+                 f"vertices removed, {n_chain} chains contracted") if verbose else None
+        return DG_short
@@ -0,0 +1,213 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : point-to-point shortest path on a cprn DiGraph
+description : network distance and edge path between two vertices (or
+    facilities), by A* with a great-circle heuristic decoded from the geohashZ
+    vertex ids, or by bidirectional Dijkstra over successors / predecessors
+"""
+
+
+import heapq
+import math
+
+import networkx as nx
+
+from loguru import logger as log
+
+from cprn.model.dict_query import DictQuery as dq
+from cprn.model.geohash import Geohash
+
+
+class PointToPointSearch:
+    """ Point-to-point shortest path search
+
+    Example:
+        >>> PointToPointSearch.astar(dg_cprn, vtx_a, vtx_b,
+        ...     query_avoid_edge="rtype in ['SA']")
+        {'vtx_src': ..., 'vtx_tgt': ..., 'distance': 12873.4,
+         'edges': [...], 'vertices': [...], 'n_expanded': 412}
+
+    Notes:
+        The A* heuristic is the great-circle distance (metres) between vertex
+        coordinates times `heuristic_scale`; it is admissible as long as edge
+        weights are metric lengths not shorter than the straight line between
+        their ends. Use `bidirectional` for graphs with other weights.
+    """
+    R_EARTH = 6371008.8     # mean earth radius (m)
+
+    @staticmethod
+    def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+        """ great-circle distance (m) between two (lon, lat) points """
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        d_phi, d_lambda = phi2 - phi1, math.radians(lon2 - lon1)
+        a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+        return 2 * PointToPointSearch.R_EARTH * math.asin(min(1.0, math.sqrt(a)))
+
+    @staticmethod
+    def _func_avoid(query_avoid_edge: str, set_avoid_edge: set):
+        """ predicate (u, v, dict_edge) -> bool of blocked edges (graph orientation) """
+        if set_avoid_edge is not None:
+            return lambda u, v, dict_edge: (u, v) in set_avoid_edge
+        if query_avoid_edge:
+            func_query = dq.compile(query_avoid_edge)
+            return lambda u, v, dict_edge: func_query(dict_edge)
+        return None
+
+    @staticmethod
+    def _result(vtx_src: str, vtx_tgt: str, distance, lst_vtx: list, lst_edges: list, n_expanded: int) -> dict:
+        return {'vtx_src': vtx_src, 'vtx_tgt': vtx_tgt, 'distance': distance,
+                'edges': lst_edges, 'vertices': lst_vtx, 'n_expanded': n_expanded}
+
+    @staticmethod
+    def astar(DG: nx.DiGraph, source: str, target: str,
+              query_avoid_edge: str = None,
+              set_avoid_edge: set = None,
+              max_dist: float = None,
+              edge_code_attr: str = 'edge_code',
+              heuristic_scale: float = 0.99,
+              verbose: bool = False) -> dict:
+        """ A* from source to target vertex with a great-circle heuristic
+
+        Args:
+            DG: cprn DiGraph (vertex ids are geohashZ)
+            source, target: vertex ids
+            query_avoid_edge: edge avoidance expression, see `fac_bfs_depth`
+            set_avoid_edge: precomputed blocked edges (u, v), replaces the expression
+            max_dist: give up beyond this network distance
+            heuristic_scale: factor (<= 1) on the straight-line distance, keeps the
+                heuristic below the road length despite geohash / projection error
+        Returns:
+            dict of `distance`, `edges` (edge codes), `vertices`, `n_expanded`,
+            None if target is unreachable (within `max_dist`)
+        """
+        func_avoid = PointToPointSearch._func_avoid(query_avoid_edge, set_avoid_edge)
+        max_dist = math.inf if max_dist is None else max_dist
+        lon_t, lat_t, _ = Geohash.ghz_decode(target)
+        dct_h = {}
+
+        def h(vtx: str) -> float:
+            if vtx not in dct_h:
+                lon, lat, _ = Geohash.ghz_decode(vtx)
+                dct_h[vtx] = heuristic_scale * PointToPointSearch.haversine(lon, lat, lon_t, lat_t)
+            return dct_h[vtx]
+
+        # heap : f = g + h, seq, g, vertex
+        heap = [(h(source), 0, 0, source)]
+        seq = 1
+        dist_best = {source: 0}
+        parent = {source: (None, None)}
+        settled = set()
+
+        while heap:
+            _, _, g, vtx = heapq.heappop(heap)
+            if vtx in settled:
+                continue
+            settled.add(vtx)
+            if vtx == target:
+                break
+            for nbr, dict_edge in DG.succ[vtx].items():
+                if nbr in settled:
+                    continue
+                g_nbr = g + dict_edge.get('weight', 1)
+                if g_nbr > max_dist or g_nbr >= dist_best.get(nbr, math.inf):
+                    continue
+                if func_avoid is not None and func_avoid(vtx, nbr, dict_edge):
+                    continue
+                dist_best[nbr] = g_nbr
+                parent[nbr] = (vtx, dict_edge.get(edge_code_attr, None))
+                heapq.heappush(heap, (g_nbr + h(nbr), seq, g_nbr, nbr))
+                seq += 1
+
+        log.info(f"A* {source} -> {target}: {len(settled)} vertices expanded") if verbose else None
+        if target not in settled:
+            return None
+
+        lst_vtx, lst_edges = [target], []
+        vtx = target
+        while parent[vtx][0] is not None:
+            vtx, edge_code = parent[vtx]
+            lst_vtx.append(vtx)
+            lst_edges.append(edge_code)
+        return PointToPointSearch._result(source, target, dist_best[target],
+                                          lst_vtx[::-1], [e for e in lst_edges[::-1] if e is not None], len(settled))
+
+    @staticmethod
+    def bidirectional(DG: nx.DiGraph, source: str, target: str,
+                      query_avoid_edge: str = None,
+                      set_avoid_edge: set = None,
+                      max_dist: float = None,
+                      edge_code_attr: str = 'edge_code',
+                      verbose: bool = False) -> dict:
+        """ bidirectional Dijkstra from source (successors) and target (predecessors)
+
+        Same arguments and output as `astar`, no coordinates needed.
+        """
+        func_avoid = PointToPointSearch._func_avoid(query_avoid_edge, set_avoid_edge)
+        max_dist = math.inf if max_dist is None else max_dist
+        if source == target:
+            return PointToPointSearch._result(source, target, 0, [source], [], 1)
+
+        # 0: forward from source over successors, 1: backward from target over predecessors
+        lst_adj = [DG.succ, DG.pred]
+        lst_dist = [{source: 0}, {target: 0}]
+        lst_parent = [{source: (None, None)}, {target: (None, None)}]
+        lst_settled = [set(), set()]
+        lst_heap = [[(0, 0, source)], [(0, 0, target)]]
+        seq = 1
+        best, vtx_meet = math.inf, None
+
+        while lst_heap[0] and lst_heap[1]:
+            # stop once no shorter path can pass through unsettled vertices
+            if lst_heap[0][0][0] + lst_heap[1][0][0] >= best:
+                break
+            side = 0 if lst_heap[0][0][0] <= lst_heap[1][0][0] else 1
+            d, _, vtx = heapq.heappop(lst_heap[side])
+            if vtx in lst_settled[side]:
+                continue
+            lst_settled[side].add(vtx)
+            dist, dist_other = lst_dist[side], lst_dist[1 - side]
+
+            for nbr, dict_edge in lst_adj[side][vtx].items():
+                if nbr in lst_settled[side]:
+                    continue
+                d_nbr = d + dict_edge.get('weight', 1)
+                if d_nbr > max_dist:
+                    continue
+                u, v = (vtx, nbr) if side == 0 else (nbr, vtx)
+                if func_avoid is not None and func_avoid(u, v, dict_edge):
+                    continue
+                if d_nbr >= dist.get(nbr, math.inf):
+                    continue
+                dist[nbr] = d_nbr
+                lst_parent[side][nbr] = (vtx, dict_edge.get(edge_code_attr, None))
+                heapq.heappush(lst_heap[side], (d_nbr, seq, nbr))
+                seq += 1
+                if nbr in dist_other and d_nbr + dist_other[nbr] < best:
+                    best, vtx_meet = d_nbr + dist_other[nbr], nbr
+
+        n_expanded = len(lst_settled[0]) + len(lst_settled[1])
+        log.info(f"Bidirectional {source} -> {target}: {n_expanded} vertices expanded") if verbose else None
+        if vtx_meet is None or best > max_dist:
+            return None
+
+        # source ... meet
+        lst_vtx, lst_edges = [vtx_meet], []
+        vtx = vtx_meet
+        while lst_parent[0][vtx][0] is not None:
+            vtx, edge_code = lst_parent[0][vtx]
+            lst_vtx.append(vtx)
+            lst_edges.append(edge_code)
+        lst_vtx.reverse()
+        lst_edges.reverse()
+        # meet ... target
+        vtx = vtx_meet
+        while lst_parent[1][vtx][0] is not None:
+            vtx, edge_code = lst_parent[1][vtx]
+            lst_vtx.append(vtx)
+            lst_edges.append(edge_code)
+        return PointToPointSearch._result(source, target, best, lst_vtx,
+                                          [e for e in lst_edges if e is not None], n_expanded)
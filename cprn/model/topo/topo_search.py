@@ -10,7 +10,13 @@ moved from `taisl_sop`
 """
 
 
-import itertools
+import heapq
+import inspect
+from array import array
+from collections import deque
+from functools import lru_cache
+from typing import Iterator
+
 import pandas as pd
 import networkx as nx
 
@@ -20,18 +26,112 @@ from loguru import logger as log
 
 from cprn.data.pickle import PickleIO
 from cprn.model.dict_query import DictQuery as dq
+from cprn.model.topo.columnar import FacSearchColumns
+from cprn.model.topo.csr_graph import CprnCsrGraph
+from cprn.model.topo.compact import CompactCprnGraph
+from cprn.model.topo.dc_nodes import DcNodes
+from cprn.model.topo.edge_mask import EdgeMask
+from cprn.model.topo.fac_index import FacilityIndex
+from cprn.model.topo.fac_layer import FacilityLayer
+from cprn.model.topo.fingerprint import GraphFingerprint
+from cprn.model.topo.model_file import CprnModelFile
+from cprn.model.topo.nearest_fac import NearestFacilityLabels
+from cprn.model.topo.result_cache import SearchResultCache
+from cprn.model.topo.search_tree import SearchTree
+from cprn.model.topo.shortest_path import PointToPointSearch
 
 
 class CprnTopoSearch:
         """  Roadrefline Network Analyzer
         """
+        # 可选的检索结果缓存, 见 `enable_result_cache`
+        result_cache: SearchResultCache = None
+
         @staticmethod
-        def load_cprn(filepath: str) -> nx.DiGraph:
+        def load_cprn(filepath: str, compact: bool = False) -> nx.DiGraph:
             """ load preprocessed road refline network (facility may embedded, 
-            network is shortened)
+            network is shortened), any `PickleIO` codec (.pkl, .tar.gz, .pkl.gz ...)
+            or a columnar model file (.cprn.npz, see `CprnModelFile`)
+
+            Args:
+                compact: return a searchable `CompactCprnGraph` instead of a
+                    DiGraph (a .cprn.npz file loads without building networkx dicts)
+            """
+            if filepath.endswith(CprnModelFile.EXTENSION):
+                DG = CprnModelFile.load(filepath)
+                DG = DG if compact else DG.to_digraph()
+                file_hash = CprnModelFile._extract_hash(filepath)
+            else:
+                DG = PickleIO.load_from_pickle(filepath)
+                DG = CompactCprnGraph.from_digraph(DG) if compact and isinstance(DG, nx.DiGraph) else DG
+                file_hash = PickleIO._extract_hash_from_filename(filepath)
+            # 模型文件名中的 sha-256 即为模型内容指纹 (供派生数据缓存使用)
+            GraphFingerprint.register(DG, file_hash)
+            return DG
+
+        @staticmethod
+        def compile_cprn(DG: nx.DiGraph, edge_code_attr: str = 'edge_code',
+                         compact: bool = False) -> CprnCsrGraph:
+            """ compile a loaded cprn into a frozen CSR snapshot for fast searching,
+            or (`compact`) into a `CompactCprnGraph` (interned ids, categorical
+            attributes, array-backed facility records) to save memory
             """
-            return PickleIO.load_from_pickle(filepath)
+            if compact:
+                return CompactCprnGraph.from_digraph(DG, edge_code_attr=edge_code_attr)
+            return CprnCsrGraph.from_digraph(DG, edge_code_attr=edge_code_attr)
         
+        @staticmethod
+        def with_facilities(DG: nx.DiGraph, *layers: FacilityLayer, keep_base: bool = True,
+                            verbose: bool = False) -> nx.DiGraph:
+            """ read-only view of a base cprn with facility layers overlaid (no graph
+            copy, O(facilities)), see `FacilityLayer`
+
+            Example:
+                >>> dg_fac = CprnTopoSearch.with_facilities(dg_cprn, lyr_gtr, lyr_dcp)
+                >>> CprnTopoSearch.fac_bfs_depth(dg_fac, vtx, ['G1', 'DC2'], 'downstream')
+            """
+            layer = layers[0] if len(layers) == 1 else FacilityLayer.merge(*layers)
+            return layer.view(DG, keep_base=keep_base, verbose=verbose)
+
+        @staticmethod
+        def enable_result_cache(maxsize: int = 1024, disk_dir: str = None,
+                                graphs: list = ()) -> SearchResultCache:
+            """ cache `fac_bfs_depth` results on tracked nx.DiGraph inputs (LRU,
+            keyed by the normalized search spec and the graph fingerprint)
+
+            The cache is opt-in per graph: only graphs tracked by
+            `GraphFingerprint.track` (or passed as `graphs`) are served from it.
+            In-place edits of a tracked graph (edge weights / attributes,
+            facility records) must be followed by `GraphFingerprint.bump(DG)`;
+            `FacilityLayer.embed` bumps by itself.
+
+            Args:
+                maxsize: number of results kept in memory
+                disk_dir: optional directory of an on-disk tier for warm restarts
+                graphs: graphs to track
+            """
+            for DG in graphs:
+                GraphFingerprint.track(DG)
+            CprnTopoSearch.result_cache = SearchResultCache(maxsize=maxsize, disk_dir=disk_dir)
+            return CprnTopoSearch.result_cache
+
+        @staticmethod
+        def disable_result_cache():
+            CprnTopoSearch.result_cache = None
+
+        @staticmethod
+        def compile_avoid_edge(DG, query_avoid_edge: str):
+            """ evaluate an edge avoidance expression once over the whole graph
+
+            Returns:
+            - for nx.DiGraph: frozenset of blocked edges (u, v), for `set_avoid_edge`
+                (cached by graph fingerprint and expression, see `EdgeMask`)
+            - for CprnCsrGraph: boolean mask by edge id (cached in the snapshot)
+            """
+            if isinstance(DG, CprnCsrGraph):
+                return DG.edge_mask(query_avoid_edge)
+            return EdgeMask.blocked_edges(DG, query_avoid_edge)
+
         @staticmethod
         def list_vtx_fac_df (DG: nx.DiGraph) -> pd.DataFrame:
             """ list vertices of facility in dg as dataframe (deprecated)
@@ -50,32 +150,35 @@ class CprnTopoSearch:
         @staticmethod
         def list_fac_df(DG: nx.DiGraph) -> pd.DataFrame:
             """ list embeded facility in cprn(dg) as dataframe
+            (copy of the cached catalog of `FacilityIndex`)
             """
-            # 过滤设施节点并提取lst_fac_attr
-            dct_nodes_fac = {k: v for k, v in DG.nodes(data=True) if v.get('is_fac', False)}
-            # 使用列表推导式提取所有lst_fac_attr，然后用chain展平
-            all_fac_records = list(itertools.chain.from_iterable(
-                attr.get('lst_fac_attr', []) for attr in dct_nodes_fac.values()))
-
-            return pd.DataFrame(all_fac_records)
+            return FacilityIndex.of(DG).catalog_df().copy()
 
         @staticmethod
         def list_fac_interval_df(lst_fac_traveled: list[dict]) -> pd.DataFrame:
             """ list facility interval (list of dict, searched by bfs) as dataframe
             """
-            df_fac_interval = pd.DataFrame()
-            for fac_traveled in lst_fac_traveled:
-                df_fac_interval = pd.concat(
-                    [df_fac_interval, fac_traveled['df_fac_attr']], 
-                    axis = 0, ignore_index=True)
-            return df_fac_interval
+            lst_df = [fac_traveled['df_fac_attr'] for fac_traveled in lst_fac_traveled]
+            if not lst_df:
+                return pd.DataFrame()
+            return pd.concat(lst_df, axis = 0, ignore_index=True)   # 一次拼接
         
+        @staticmethod
+        def build_interval_df(res, DG: nx.DiGraph, fac_types_src: list = None,
+                              cols_fac_attr: list[str] = ('fac_code', 'fac_type', 'fac_name', 'fac_ghz', 'vtx_fac')
+                              ) -> pd.DataFrame:
+            """ src / tgt enriched interval table (`{attr}_src`, `{attr}_tgt`) of search
+            results (FacSearchColumns or list of dict) in one vectorized pass,
+            see `FacSearchColumns.interval_df`
+            """
+            return FacSearchColumns.interval_df(res, DG, fac_types_src=fac_types_src,
+                                                cols_fac_attr=cols_fac_attr)
+
         @staticmethod
         def query_facility (DG: nx.DiGraph, fac_code: str) -> pd.DataFrame:
             """ query facility by facility code
             """
-            df_fac = CprnTopoSearch.list_fac_df(DG)
-            return df_fac.query(f'fac_code == "{fac_code}"')
+            return FacilityIndex.of(DG).query_df(fac_code).copy()
 
         @staticmethod
         def parse_fac_interval_df(lst_fac_topo : list[dict], start_node: str, 
@@ -177,15 +280,57 @@ class CprnTopoSearch:
                       query_avoid_edge: str = None, 
                       edge_code_attr: str = 'edge_code',
                       version: str = 'v2',
+                      vectorize_avoid_edge: bool = False,
+                      as_columns: bool = False,
+                      limit: int = None,
+                      fac_layer: FacilityLayer = None,
                       verbose: bool = False,
                       **kwargs) -> list[dict]:
-            """ Universal Facility BFS with intelligent parameter adaptation """
+            """ Universal Facility BFS with intelligent parameter adaptation 
+
+            `DG` may also be a `CprnCsrGraph` snapshot, which is always searched by
+            the `csr` engine (same semantics as `v2`).
+
+            With `vectorize_avoid_edge=True`, `query_avoid_edge` is evaluated once
+            over all edges (columnar, cached per graph fingerprint and expression
+            for tracked graphs) and the search only looks up the blocked-edge set.
+
+            With a result cache enabled (`enable_result_cache`), repeated searches
+            on a tracked graph (`GraphFingerprint.track`) return cached copies
+            until the graph is bumped; searches with extra engine arguments
+            (`**kwargs`) and untracked graphs bypass the cache.
+
+            With `as_columns=True` the result is a `FacSearchColumns` (one array per
+            search column, facility attributes referenced by index).
+
+            With `limit=k` the traversal stops as soon as k facility records are
+            found (`reach_max_dist` marks met on the way are kept but not counted),
+            e.g. `limit=1` for first-hit probes; the records equal the first ones
+            of the unlimited search. See `fac_bfs_iter` for streaming results.
+
+            With `fac_layer`, facilities of the layer are overlaid on `DG` (a
+            nx.DiGraph) without copying it, see `with_facilities`.
+            """
+            if fac_layer is not None:
+                DG = fac_layer.view(DG)
             
             # 版本函数映射
             version_functions = {
                 'v1': CprnTopoSearch.fac_bfs_depth_v1,
                 'v2': CprnTopoSearch.fac_bfs_depth_v2,
+                'v3': CprnTopoSearch.fac_bfs_depth_v3,
+                'csr': CprnTopoSearch.fac_bfs_depth_csr,
             }
+            # 限量检索使用生成器版本, 找够即停 (v1 无生成器版本, 检索后截断)
+            if limit is not None:
+                version_functions.update({
+                    'v2': CprnTopoSearch.fac_bfs_iter_v2,
+                    'v3': CprnTopoSearch.fac_bfs_iter_v3,
+                    'csr': CprnTopoSearch.fac_bfs_iter_csr,})
+
+            # CSR snapshot 只能由 csr 引擎检索
+            if isinstance(DG, CprnCsrGraph):
+                version = 'csr'
 
             if version not in version_functions:
                 available_versions = list(version_functions.keys())
@@ -194,11 +339,26 @@ class CprnTopoSearch:
             log.info(f"Using version {version} of `fac_bfs_depth`") if verbose else None
             func = version_functions[version]
 
-            # 获取函数的参数签名
-            import inspect
-            sig = inspect.signature(func)
-            func_params = set(sig.parameters.keys())
+            # 结果缓存 (仅 nx.DiGraph 且无额外引擎参数)
+            cache, cache_key = CprnTopoSearch.result_cache, None
+            if (cache is not None and isinstance(DG, nx.DiGraph) and not kwargs and limit is None
+                    and GraphFingerprint.is_tracked(DG)):
+                cache_key = SearchResultCache.make_key(GraphFingerprint.of(DG),
+                    start_node, fac_types, direction, max_depth, max_dist, mark_max_dist,
+                    query_avoid_fac, query_avoid_edge, edge_code_attr, version)
+                lst_cached = cache.get(cache_key)
+                if lst_cached is not None:
+                    log.info(f"Search result cache hit: {start_node}") if verbose else None
+                    return FacSearchColumns.from_records(lst_cached) if as_columns else lst_cached
+
+            # 获取函数的参数签名 (按引擎函数缓存)
+            func_params, required_params = CprnTopoSearch._engine_signature(func)
             
+            # 整图向量化计算规避边集合 (按指纹+表达式缓存)
+            if (vectorize_avoid_edge and query_avoid_edge and isinstance(DG, nx.DiGraph)
+                    and 'set_avoid_edge' not in kwargs):
+                kwargs['set_avoid_edge'] = EdgeMask.blocked_edges(DG, query_avoid_edge)
+
             # 准备所有可能的参数
             all_params = {
                 'DG': DG,
@@ -219,14 +379,180 @@ class CprnTopoSearch:
                               if k in func_params}
             
             # 检查必需参数
-            required_params = {name for name, param in sig.parameters.items() 
-                              if param.default == inspect.Parameter.empty}
             missing_params = required_params - set(filtered_params.keys())
             
             if missing_params:
                 raise TypeError(f"Missing required parameters for {version}: {missing_params}")
             
-            return func(**filtered_params)
+            lst_found = func(**filtered_params)
+            if limit is not None:
+                lst_found = CprnTopoSearch._take(lst_found, limit)
+            if cache_key is not None:
+                cache.put(cache_key, lst_found)
+            if as_columns:
+                if isinstance(DG, CprnCsrGraph):
+                    return FacSearchColumns.from_records(lst_found, fac_table=DG.fac_records,
+                                                         fac_vertices=DG.fac_vertices())
+                return FacSearchColumns.from_records(lst_found)
+            return lst_found
+
+
+        @staticmethod
+        def find_dc_nodes(DG, dc_types: list = ('CONV', 'DIV', 'MULTI'),
+                          with_degree: bool = False,
+                          verbose: bool = False) -> pd.DataFrame:
+            """ divergent / convergent vertices as a facility table (DC1 / DC2 / DC3),
+            ready to be embedded, see `DcNodes`
+
+            Example:
+                >>> df_fac_dcp_bind = CprnTopoSearch.find_dc_nodes(dg_cprn)
+                >>> df_fac_dcp_bind.columns.tolist()
+                ['vtx_fac', 'fac_code', 'fac_type', 'fac_name']
+            """
+            return DcNodes.find(DG, dc_types=dc_types, with_degree=with_degree, verbose=verbose)
+
+        @staticmethod
+        def label_nearest_fac(DG, fac_types: list, direction: str,
+                              max_dist: float = 1000000,
+                              query_avoid_fac: list = None,
+                              query_avoid_edge: str = None,
+                              edge_code_attr: str = 'edge_code',
+                              verbose: bool = False) -> NearestFacilityLabels:
+            """ nearest facility (of `fac_types`, in `direction`) of every vertex by one
+            multi-source bounded search, see `NearestFacilityLabels`
+
+            Example:
+                >>> lbl_dc2 = CprnTopoSearch.label_nearest_fac(dg_cprn, ['DC2'], 'upstream', max_dist=1000)
+                >>> lbl_dc2.lookup(vtx_st)          # instead of one upstream search per vertex
+                >>> lbl_dc2.to_df(lst_vtx_st)
+            """
+            return NearestFacilityLabels.build(DG, fac_types, direction, max_dist=max_dist,
+                query_avoid_fac=query_avoid_fac, query_avoid_edge=query_avoid_edge,
+                edge_code_attr=edge_code_attr, verbose=verbose)
+
+        @staticmethod
+        def fac_shortest_path(DG: nx.DiGraph, source: str, target: str,
+                              method: str = 'astar',
+                              max_dist: float = None,
+                              query_avoid_edge: str = None,
+                              edge_code_attr: str = 'edge_code',
+                              vectorize_avoid_edge: bool = False,
+                              verbose: bool = False, **kwargs) -> dict:
+            """ network distance and edge path from source to target
+
+            Args:
+                - DG: networkx.DiGraph, cprn (facility embedded for facility codes)
+                - source, target: vertex id or facility code (resolved by `FacilityIndex`)
+                - method: 'astar' (great-circle heuristic from geohashZ ids) or
+                    'bidirectional' (Dijkstra from both ends, any weights)
+                - max_dist: give up beyond this network distance
+                - query_avoid_edge: str, the query string to avoid traversing edge
+                - vectorize_avoid_edge: evaluate `query_avoid_edge` once over all edges
+                - kwargs: passed to the method (e.g. `heuristic_scale` of A*)
+            Returns:
+                - dict of `vtx_src`, `vtx_tgt`, `distance`, `edges` (edge codes),
+                    `vertices`, `n_expanded`; None if target is unreachable
+            Example:
+                >>> CprnTopoSearch.fac_shortest_path(dg_cprn, 'G001532001000810010', 'G001532001000820010',
+                ...     query_avoid_edge="rtype in ['SA']")
+            """
+            version_functions = {
+                'astar': PointToPointSearch.astar,
+                'bidirectional': PointToPointSearch.bidirectional,
+            }
+            if method not in version_functions:
+                raise ValueError(f"Method '{method}' not supported. Available methods: {list(version_functions.keys())}")
+
+            lst_vtx = []
+            for point in (source, target):
+                if point not in DG:
+                    vtx = FacilityIndex.of(DG).vertex_of(point)
+                    if vtx is None:
+                        raise KeyError(f"{point} is neither a vertex nor a facility code of the graph")
+                    point = vtx
+                lst_vtx.append(point)
+
+            if vectorize_avoid_edge and query_avoid_edge and 'set_avoid_edge' not in kwargs:
+                kwargs['set_avoid_edge'] = EdgeMask.blocked_edges(DG, query_avoid_edge)
+
+            return version_functions[method](DG, lst_vtx[0], lst_vtx[1],
+                query_avoid_edge=query_avoid_edge, max_dist=max_dist,
+                edge_code_attr=edge_code_attr, verbose=verbose, **kwargs)
+
+
+        @staticmethod
+        def fac_bfs_iter(DG: nx.DiGraph, start_node: str, 
+                      fac_types: list, direction: str, 
+                      max_depth: int = 3, max_dist: int = 1000000,
+                      mark_max_dist: bool = False,
+                      query_avoid_fac: list = None,
+                      query_avoid_edge: str = None, 
+                      edge_code_attr: str = 'edge_code',
+                      version: str = 'v2',
+                      vectorize_avoid_edge: bool = False,
+                      fac_layer: FacilityLayer = None,
+                      verbose: bool = False,
+                      **kwargs) -> Iterator[dict]:
+            """ Streaming facility search: yields the records of `fac_bfs_depth` one by
+            one as facilities are found; the traversal advances only as far as the
+            consumer iterates (stop iterating to stop the search)
+
+            Engines: 'v2', 'v3' (nearest first) and 'csr' (any `CprnCsrGraph` input).
+
+            Example:
+                >>> it = CprnTopoSearch.fac_bfs_iter(dg_cprn, vtx, ['DC2'], 'upstream',
+                ...     max_depth=1, max_dist=1000)
+                >>> dct_first = next(it, None)
+            """
+            if fac_layer is not None:
+                DG = fac_layer.view(DG)
+            version_functions = {
+                'v2': CprnTopoSearch.fac_bfs_iter_v2,
+                'v3': CprnTopoSearch.fac_bfs_iter_v3,
+                'csr': CprnTopoSearch.fac_bfs_iter_csr,
+            }
+            if isinstance(DG, CprnCsrGraph):
+                version = 'csr'
+            if version not in version_functions:
+                raise ValueError(f"Version '{version}' not supported. Available versions: {list(version_functions.keys())}")
+            if direction not in ('downstream', 'upstream'):
+                raise ValueError("Direction must be 'downstream' or 'upstream'.")
+
+            if (vectorize_avoid_edge and query_avoid_edge and isinstance(DG, nx.DiGraph)
+                    and 'set_avoid_edge' not in kwargs):
+                kwargs['set_avoid_edge'] = EdgeMask.blocked_edges(DG, query_avoid_edge)
+            return version_functions[version](DG, start_node, fac_types, direction,
+                max_depth=max_depth, max_dist=max_dist, mark_max_dist=mark_max_dist,
+                query_avoid_fac=query_avoid_fac, query_avoid_edge=query_avoid_edge,
+                edge_code_attr=edge_code_attr, verbose=verbose, **kwargs)
+
+        @staticmethod
+        @lru_cache(maxsize=None)
+        def _engine_signature(func) -> tuple[frozenset, frozenset]:
+            """ (parameter names, required parameter names) of an engine function,
+            inspected once per function
+            """
+            sig = inspect.signature(func)
+            return (frozenset(sig.parameters.keys()),
+                    frozenset(name for name, param in sig.parameters.items()
+                              if param.default == inspect.Parameter.empty))
+
+        @staticmethod
+        def _take(iter_found, limit: int) -> list[dict]:
+            """ first `limit` facility records of a search (marks kept, not counted),
+            the generator is closed right after so the traversal stops
+            """
+            lst_found, n_fac = [], 0
+            if limit > 0:
+                for dct in iter_found:
+                    lst_found.append(dct)
+                    if not dct.get('reach_max_dist', False):
+                        n_fac += 1
+                        if n_fac >= limit:
+                            break
+            if hasattr(iter_found, 'close'):
+                iter_found.close()
+            return lst_found
 
 
         @staticmethod
@@ -266,6 +592,7 @@ class CprnTopoSearch:
         
             # Initialize search
             set_fac_types = set(fac_types)  # set of fac types to search for
+            func_avoid_edge = dq.compile(query_avoid_edge) if query_avoid_edge else None
             vtx_visited = set()
             fac_visited = set()
             # set heap of queue : 
@@ -364,12 +691,10 @@ class CprnTopoSearch:
                             dict_edge = DG[neighbor][current_node]
                             edge_weight = DG[neighbor][current_node].get('weight', 1)  # Default weight is 1 if not specified
 
-                        if query_avoid_edge:
-                            dq_edge = dq(dict_edge)
-                            if dq_edge.query(query_avoid_edge):
-                                if verbose:
-                                    log.info(f"Avoid Edge {current_node} -> {neighbor}, {dict_edge}")
-                                continue
+                        if func_avoid_edge and func_avoid_edge(dict_edge):
+                            if verbose:
+                                log.info(f"Avoid Edge {current_node} -> {neighbor}, {dict_edge}")
+                            continue
 
                         edge_weight = dict_edge.get('weight', 1)
                         queue.append((neighbor, current_fac, depth, 
@@ -387,10 +712,30 @@ class CprnTopoSearch:
                           query_avoid_fac: list = None,
                           query_avoid_edge: str = None, 
                           edge_code_attr: str = 'edge_code', # 边编号列名
+                          lazy_edges: bool = False,
+                          set_avoid_edge: set = None,
                           verbose: bool = False) -> list[dict]:
-            """ Facility BFS with given depth limit
+            """ all records of `fac_bfs_iter_v2` (Facility BFS with given depth limit) as a list
+            """
+            return list(CprnTopoSearch.fac_bfs_iter_v2(DG, start_node, fac_types, direction,
+                max_depth, max_dist, mark_max_dist, query_avoid_fac, query_avoid_edge,
+                edge_code_attr, lazy_edges, set_avoid_edge, verbose))
+
+        @staticmethod
+        def fac_bfs_iter_v2(DG : nx.DiGraph, start_node: str, 
+                          fac_types: list , direction: str, 
+                          max_depth: int = 3, max_dist: int = 1000000,
+                          mark_max_dist: bool = False,
+                          query_avoid_fac: list = None,
+                          query_avoid_edge: str = None, 
+                          edge_code_attr: str = 'edge_code', # 边编号列名
+                          lazy_edges: bool = False,
+                          set_avoid_edge: set = None,
+                          verbose: bool = False) -> Iterator[dict]:
+            """ Facility BFS with given depth limit (generator)
             Find all facility nodes of a specified type within a given depth from a start node.
-            Return as list of dicts, that contains attributes of the found facility node    
+            Yield dicts as facilities are found, that contain attributes of the found facility node;
+            the traversal advances only as far as the consumer iterates.
             Parameters:
                 - DG: networkx.DiGraph, the directed graph representing the highway network.
                 - start_node: node code (12 digits geohash), the starting facility node.
@@ -400,10 +745,17 @@ class CprnTopoSearch:
                 - max_dist: int, the maximum distance to search.
                 - mark_max_dist: bool, whether to mark the maximum distance in result.
                 - query_avoid_edge: str, the query string to avoid traversing edge.
+                - lazy_edges: bool, return `interval_edges` / `cumulative_edges` as lazy
+                    `EdgePath` handles, edge codes are collected only when read.
+                - set_avoid_edge: set of (u, v), precomputed blocked edges (see
+                    `compile_avoid_edge`), checked instead of evaluating `query_avoid_edge`.
                 - verbose: bool, whether to print the search process.
-                Returns:
-                - List of dictionaries containing attributes of the found facility 
+                Yields:
+                - Dictionaries containing attributes of the found facility 
                     nodes, including depth and cumulative weight.
+            Notes:
+                Paths are tracked by a parent-pointer `SearchTree` (one entry per enqueued
+                vertex) instead of copying edge lists on every enqueue.
             """
 
             # Choose the appropriate traversal method based on direction
@@ -417,13 +769,18 @@ class CprnTopoSearch:
             # Initialize search
             set_fac_types = set(fac_types)  # set of fac types to search for
             set_fac_avoid = set(query_avoid_fac) if query_avoid_fac else set()
+            func_avoid_edge = dq.compile(query_avoid_edge) if query_avoid_edge else None   # 只解析一次
             vtx_visited = set()
             fac_visited = set()
 
+            # Setup parent-pointer tree, edges of an entry are rebuilt from (anchor, entry)
+            #   anchor: entry of the last passed facility (interval start), root: start node
+            tree = SearchTree()
+            root = SearchTree.ROOT
+
             # Setup heap of queue : 
-            # current_node, current_fac, depth, interval_weight, cumulative_weight, interval_edges, cumulative_edges
-            queue = [(start_node, start_node, 0, 0, 0, [], [])]
-            lst_fac_found = []
+            # current_node, current_fac, depth, interval_weight, cumulative_weight, entry, anchor
+            queue = deque([(start_node, start_node, 0, 0, 0, root, root)])
 
             # If start node is a suitable facility
             if (set_fac_types.intersection(DG.nodes[start_node].get('fac_types', set()))):
@@ -440,15 +797,16 @@ class CprnTopoSearch:
                     dct_fac_traveled = {'depth': 0,  # Start depth is 0
                         'vtx_intvl_src': start_node, 'vtx_intvl_tgt': start_node,
                         'interval_weight': 0, 'cumulative_weight': 0, 
-                        'interval_edges': [], 'cumulative_edges': [], **fac,}
-                    lst_fac_found.append(dct_fac_traveled)
+                        'interval_edges': tree.path(root, root, lazy_edges),
+                        'cumulative_edges': tree.path(root, root, lazy_edges), **fac,}
+                    yield dct_fac_traveled
                     fac_visited.add(fac['fac_code'])
-                queue = [(start_node, start_node, -1, 0, 0, [], [])]    # Update queue 😄
+                queue = deque([(start_node, start_node, -1, 0, 0, root, root)])    # Update queue 😄
                 log.info(f"Start node {start_node} is a suitable facility, add as depth 0 😄") if verbose else None
 
             # 开始遍历
             while queue:
-                current_node, passed_fac_vtx, depth, interval_weight, cumulative_weight, interval_edges, cumulative_edges = queue.pop(0)
+                current_node, passed_fac_vtx, depth, interval_weight, cumulative_weight, entry, anchor = queue.popleft()
                 # Stop Criteria Check
                 if depth > max_depth:
                     log.info(f"📛 Stop Criteria Activated: Max depth exceeds {max_depth}, stop searching at {current_node}") if verbose else None
@@ -458,9 +816,10 @@ class CprnTopoSearch:
                     if mark_max_dist:
                         dct_final_vtx = {'depth': depth, 'vtx_intvl_src': passed_fac_vtx, 'vtx_intvl_tgt': current_node,
                             'interval_weight': interval_weight, 'cumulative_weight': cumulative_weight,
-                            'interval_edges': interval_edges, 'cumulative_edges': cumulative_edges,
+                            'interval_edges': tree.path(anchor, entry, lazy_edges),
+                            'cumulative_edges': tree.path(root, entry, lazy_edges),
                             'reach_max_dist': True,}
-                        lst_fac_found.append(dct_final_vtx)
+                        yield dct_final_vtx
                     continue
 
                 # Check if the current node is a target facility
@@ -491,16 +850,17 @@ class CprnTopoSearch:
                             dct_fac_traveled = {
                                 'depth': depth, 'vtx_intvl_src': passed_fac_vtx, 'vtx_intvl_tgt': current_node,
                                 'interval_weight': interval_weight, 'cumulative_weight': cumulative_weight,
-                                'interval_edges': interval_edges, 'cumulative_edges': cumulative_edges,
+                                'interval_edges': tree.path(anchor, entry, lazy_edges),
+                                'cumulative_edges': tree.path(root, entry, lazy_edges),
                                 'reach_max_depth': depth >= max_depth,
                                 **fac}
                             # append fac data to putput
-                            lst_fac_found.append(dct_fac_traveled)
+                            yield dct_fac_traveled
                             # update fac visited
                             fac_visited.add(fac['fac_code'])
                             passed_fac_vtx = current_node
                             interval_weight = 0
-                            interval_edges = []
+                            anchor = entry  # interval restarts at this facility
 
                         else:   # already visited
                             log.info(f"🏰 Facility {fac['fac_code']} at vtx {current_node} found but already visited") if verbose else ''
@@ -512,34 +872,394 @@ class CprnTopoSearch:
                 for neighbor in func_neighb_search(current_node):
                     if neighbor not in vtx_visited:
                         vtx_visited.add(neighbor)
-                        # Get the weight of the edge from current_node to neighbor
+                        # Get the edge from current_node to neighbor
                         if direction == 'downstream':
                             dict_edge = DG[current_node][neighbor]
-                            edge_weight = DG[current_node][neighbor].get('weight', 1)  # Default weight is 1 if not specified
                         elif direction == 'upstream':
                             dict_edge = DG[neighbor][current_node]
-                            edge_weight = DG[neighbor][current_node].get('weight', 1)  # Default weight is 1 if not specified
 
-                        if query_avoid_edge:
-                            dq_edge = dq(dict_edge)
-                            if dq_edge.query(query_avoid_edge):
-                                if verbose:
-                                    log.info(f"🚫 Avoid Edge {current_node} -> {neighbor}, {dict_edge}")
-                                continue
+                        if set_avoid_edge is not None:
+                            is_avoid = ((current_node, neighbor) if direction == 'downstream'
+                                        else (neighbor, current_node)) in set_avoid_edge
+                        else:
+                            is_avoid = func_avoid_edge is not None and func_avoid_edge(dict_edge)
+                        if is_avoid:
+                            if verbose:
+                                log.info(f"🚫 Avoid Edge {current_node} -> {neighbor}, {dict_edge}")
+                            continue
 
-                        edge_weight = dict_edge.get('weight', 1)
-                        current_edge_code = dict_edge.get(edge_code_attr, None) # 获取当前边编号
-                        
-                         # 创建新的边列表
-                        new_interval_edges = interval_edges.copy()
-                        new_cumulative_edges = cumulative_edges.copy()
-                        if current_edge_code is not None:
-                            new_interval_edges.append(current_edge_code)
-                            new_cumulative_edges.append(current_edge_code)
+                        edge_weight = dict_edge.get('weight', 1)  # Default weight is 1 if not specified
+                        # 记录父指针及当前边编号 (不再复制边列表)
+                        entry_neighbor = tree.add(entry, dict_edge.get(edge_code_attr, None))
 
                         queue.append((neighbor, passed_fac_vtx, depth, 
                                      interval_weight + edge_weight, 
                                      cumulative_weight + edge_weight,
-                                     new_interval_edges,
-                                     new_cumulative_edges))  # Update cumulative weight
-            return lst_fac_found
+                                     entry_neighbor, anchor))  # Update cumulative weight
+
+
+        @staticmethod
+        def fac_bfs_depth_v3(DG : nx.DiGraph, start_node: str, 
+                          fac_types: list , direction: str, 
+                          max_depth: int = 3, max_dist: int = 1000000,
+                          mark_max_dist: bool = False,
+                          query_avoid_fac: list = None,
+                          query_avoid_edge: str = None, 
+                          edge_code_attr: str = 'edge_code', # 边编号列名
+                          lazy_edges: bool = False,
+                          set_avoid_edge: set = None,
+                          verbose: bool = False) -> list[dict]:
+            """ all records of `fac_bfs_iter_v3` (facility search in network distance order) as a list
+            """
+            return list(CprnTopoSearch.fac_bfs_iter_v3(DG, start_node, fac_types, direction,
+                max_depth, max_dist, mark_max_dist, query_avoid_fac, query_avoid_edge,
+                edge_code_attr, lazy_edges, set_avoid_edge, verbose))
+
+        @staticmethod
+        def fac_bfs_iter_v3(DG : nx.DiGraph, start_node: str, 
+                          fac_types: list , direction: str, 
+                          max_depth: int = 3, max_dist: int = 1000000,
+                          mark_max_dist: bool = False,
+                          query_avoid_fac: list = None,
+                          query_avoid_edge: str = None, 
+                          edge_code_attr: str = 'edge_code', # 边编号列名
+                          lazy_edges: bool = False,
+                          set_avoid_edge: set = None,
+                          verbose: bool = False) -> Iterator[dict]:
+            """ Facility search in network distance order (Dijkstra, generator)
+            Same parameters and record layout as `fac_bfs_iter_v2`, but vertices are
+            settled from a binary heap by cumulative weight, so every facility is
+            reported at its shortest network distance from the start node (and
+            `interval_*` / `depth` follow that shortest path).
+            Notes:
+                - edges leading beyond `max_dist` are not expanded; with `mark_max_dist`
+                    the first vertex beyond `max_dist` of each such branch is reported
+                    with `reach_max_dist` (at its shortest distance).
+                - a facility ends the branch at `max_depth`, as in v2.
+                - records are ordered by `cumulative_weight` (ties in discovery order).
+            """
+            # Choose the appropriate traversal method based on direction
+            if direction == 'downstream':
+                adj = DG.succ
+            elif direction == 'upstream':
+                adj = DG.pred
+            else:
+                raise ValueError("Direction must be 'downstream' or 'upstream'.")
+
+            set_fac_types = set(fac_types)
+            set_fac_avoid = set(query_avoid_fac) if query_avoid_fac else set()
+            func_avoid_edge = dq.compile(query_avoid_edge) if query_avoid_edge else None   # 只解析一次
+            is_downstream = direction == 'downstream'
+
+            def fac_fit(vtx: str) -> list:
+                """ facilities at vtx of the searched types, not avoided """
+                dct_node = DG.nodes[vtx]
+                if not set_fac_types.intersection(dct_node.get('fac_types', set())):
+                    return []
+                lst_fit = [fac for fac in dct_node.get('lst_fac_attr', []) if fac['fac_type'] in set_fac_types]
+                if set_fac_avoid:
+                    if verbose:
+                        lst_fac_avoid = [fac for fac in lst_fit if fac['fac_code'] in set_fac_avoid]
+                        log.info(f"⛔️ Avoided Facilities: {lst_fac_avoid}") if len(lst_fac_avoid) > 0 else None
+                    lst_fit = [fac for fac in lst_fit if fac['fac_code'] not in set_fac_avoid]
+                return lst_fit
+
+            tree = SearchTree()
+            root = SearchTree.ROOT
+            fac_visited = set()
+
+            # start facilities are reported at depth 0
+            for fac in fac_fit(start_node):
+                yield {'depth': 0,
+                    'vtx_intvl_src': start_node, 'vtx_intvl_tgt': start_node,
+                    'interval_weight': 0, 'cumulative_weight': 0,
+                    'interval_edges': tree.path(root, root, lazy_edges),
+                    'cumulative_edges': tree.path(root, root, lazy_edges), **fac}
+                fac_visited.add(fac['fac_code'])
+
+            # heap : cumulative_weight, seq, node, passed_fac_vtx, depth, interval_weight, entry, anchor
+            #   seq 保证同距离时按发现顺序出堆 (结果确定)
+            heap = [(0, 0, start_node, start_node, 0, 0, root, root)]
+            seq = 1
+            dist_best = {start_node: 0}
+            vtx_settled = set()
+            inf = float('inf')
+
+            while heap:
+                cumulative_weight, _, current_node, passed_fac_vtx, depth, interval_weight, entry, anchor = heapq.heappop(heap)
+                if current_node in vtx_settled:
+                    continue    # stale heap entry
+                vtx_settled.add(current_node)
+
+                if cumulative_weight > max_dist:
+                    # only pushed with mark_max_dist: frontier vertex beyond max_dist
+                    yield {'depth': depth, 'vtx_intvl_src': passed_fac_vtx, 'vtx_intvl_tgt': current_node,
+                        'interval_weight': interval_weight, 'cumulative_weight': cumulative_weight,
+                        'interval_edges': tree.path(anchor, entry, lazy_edges),
+                        'cumulative_edges': tree.path(root, entry, lazy_edges),
+                        'reach_max_dist': True,}
+                    continue
+
+                if current_node != start_node:
+                    lst_fac_fit = fac_fit(current_node)
+                    if lst_fac_fit:
+                        depth += 1
+                        if depth > max_depth:
+                            log.info(f"📛 Stop Criteria Activated: Max depth exceeds {max_depth}, stop searching at {current_node}") if verbose else None
+                            continue
+                    for fac in lst_fac_fit:
+                        if fac['fac_code'] in fac_visited:
+                            continue
+                        log.info(f"🏰 Facility {fac['fac_code']} at vtx {current_node} found") if verbose else None
+                        yield {
+                            'depth': depth, 'vtx_intvl_src': passed_fac_vtx, 'vtx_intvl_tgt': current_node,
+                            'interval_weight': interval_weight, 'cumulative_weight': cumulative_weight,
+                            'interval_edges': tree.path(anchor, entry, lazy_edges),
+                            'cumulative_edges': tree.path(root, entry, lazy_edges),
+                            'reach_max_depth': depth >= max_depth,
+                            **fac}
+                        fac_visited.add(fac['fac_code'])
+                        passed_fac_vtx = current_node
+                        interval_weight = 0
+                        anchor = entry
+
+                # relax edges
+                for neighbor, dict_edge in adj[current_node].items():
+                    if neighbor in vtx_settled:
+                        continue
+                    edge_weight = dict_edge.get('weight', 1)
+                    dist_neighbor = cumulative_weight + edge_weight
+                    if dist_neighbor > max_dist and not mark_max_dist:
+                        continue    # 超出距离的分支不再扩展
+                    if dist_neighbor >= dist_best.get(neighbor, inf):
+                        continue
+                    # 规避判断放在距离判断之后, 减少表达式求值次数
+                    if set_avoid_edge is not None:
+                        is_avoid = ((current_node, neighbor) if is_downstream
+                                    else (neighbor, current_node)) in set_avoid_edge
+                    else:
+                        is_avoid = func_avoid_edge is not None and func_avoid_edge(dict_edge)
+                    if is_avoid:
+                        log.info(f"🚫 Avoid Edge {current_node} -> {neighbor}, {dict_edge}") if verbose else None
+                        continue
+                    dist_best[neighbor] = dist_neighbor
+                    entry_neighbor = tree.add(entry, dict_edge.get(edge_code_attr, None))
+                    heapq.heappush(heap, (dist_neighbor, seq, neighbor, passed_fac_vtx, depth,
+                                          interval_weight + edge_weight, entry_neighbor, anchor))
+                    seq += 1
+
+
+        @staticmethod
+        def fac_bfs_depth_csr(DG : CprnCsrGraph, start_node: str, 
+                          fac_types: list , direction: str, 
+                          max_depth: int = 3, max_dist: int = 1000000,
+                          mark_max_dist: bool = False,
+                          query_avoid_fac: list = None,
+                          query_avoid_edge: str = None, 
+                          edge_code_attr: str = 'edge_code', # 边编号列名
+                          lazy_edges: bool = False,
+                          verbose: bool = False) -> list[dict]:
+            """ all records of `fac_bfs_iter_csr` (Facility BFS on a CSR snapshot) as a list
+            """
+            return list(CprnTopoSearch.fac_bfs_iter_csr(DG, start_node, fac_types, direction,
+                max_depth, max_dist, mark_max_dist, query_avoid_fac, query_avoid_edge,
+                edge_code_attr, lazy_edges, verbose))
+
+        @staticmethod
+        def fac_bfs_iter_csr(DG : CprnCsrGraph, start_node: str, 
+                          fac_types: list , direction: str, 
+                          max_depth: int = 3, max_dist: int = 1000000,
+                          mark_max_dist: bool = False,
+                          query_avoid_fac: list = None,
+                          query_avoid_edge: str = None, 
+                          edge_code_attr: str = 'edge_code', # 边编号列名
+                          lazy_edges: bool = False,
+                          verbose: bool = False) -> Iterator[dict]:
+            """ Facility BFS on a frozen CSR snapshot (`CprnCsrGraph`, generator)
+            Same parameters, traversal order and output as `fac_bfs_iter_v2`, but
+            neighbors, weights, edge codes and facilities are read from the snapshot
+            arrays instead of networkx dicts.
+            Parameters:
+                - DG: CprnCsrGraph, snapshot compiled by `CprnCsrGraph.from_digraph`.
+                - (others): see `fac_bfs_depth_v2`.
+            Yields:
+                - Dictionaries containing attributes of the found facility 
+                    nodes, including depth and cumulative weight.
+            """
+            if direction not in ('downstream', 'upstream'):
+                raise ValueError("Direction must be 'downstream' or 'upstream'.")
+            return CprnTopoSearch._fac_bfs_csr_core(DG, DG.vtx_index[start_node], 
+                fac_types, direction, max_depth, max_dist, mark_max_dist,
+                set(query_avoid_fac) if query_avoid_fac else set(),
+                query_avoid_edge, edge_code_attr, lazy_edges, verbose,
+                vtx_visited = bytearray(DG.number_of_nodes()), stamp = 1,
+                tree = SearchTree())
+
+        @staticmethod
+        def fac_bfs_depth_batch(DG, start_nodes: list[str], 
+                          fac_types: list , direction: str, 
+                          max_depth: int = 3, max_dist: int = 1000000,
+                          mark_max_dist: bool = False,
+                          query_avoid_fac: list = None,
+                          query_avoid_edge: str = None, 
+                          edge_code_attr: str = 'edge_code',
+                          as_df: bool = True,
+                          as_columns: bool = False,
+                          fac_layer: FacilityLayer = None,
+                          verbose: bool = False):
+            """ Multi-source facility BFS (one shared search spec, many start vertices)
+            Runs the `csr` engine for every start vertex in one invocation: arguments
+            are validated once, the snapshot is compiled once (if `DG` is a DiGraph),
+            and the visited marks / search tree are shared arrays reused across starts
+            (generation stamps instead of a new visited set per start).
+            Parameters:
+                - DG: networkx.DiGraph or CprnCsrGraph, pass a compiled snapshot to
+                    avoid compiling it on every call.
+                - start_nodes: list of str, starting vertices (searched in given order).
+                - (others): see `fac_bfs_depth_v2`.
+                - as_df: bool, return one combined interval table (DataFrame), or
+                    the list of dicts when False.
+                - as_columns: bool, return a `FacSearchColumns` (facility attributes
+                    referenced by index into the snapshot's `fac_records`), overrides `as_df`.
+                - fac_layer: FacilityLayer overlaid on `DG` (a DiGraph) before compiling.
+            Returns:
+                - pd.DataFrame (or list of dict), per-start results of `fac_bfs_depth_v2`
+                    concatenated in `start_nodes` order, with column `vtx_start`.
+            """
+            if direction not in ('downstream', 'upstream'):
+                raise ValueError("Direction must be 'downstream' or 'upstream'.")
+            if fac_layer is not None:
+                DG = fac_layer.view(DG)
+            G = DG if isinstance(DG, CprnCsrGraph) else CprnCsrGraph.from_digraph(DG, edge_code_attr)
+            missing = [vtx for vtx in start_nodes if vtx not in G.vtx_index]
+            if missing:
+                raise KeyError(f"Start nodes not in graph: {missing[:8]}{' ...' if len(missing) > 8 else ''}")
+
+            set_fac_avoid = set(query_avoid_fac) if query_avoid_fac else set()
+            vtx_visited = array('q', [0]) * G.number_of_nodes()   # shared generation stamps
+            tree = SearchTree()
+            lst_interval = []
+            for stamp, start_node in enumerate(start_nodes, start=1):
+                tree.reset()
+                lst_fac_found = CprnTopoSearch._fac_bfs_csr_core(G, G.vtx_index[start_node], 
+                    fac_types, direction, max_depth, max_dist, mark_max_dist,
+                    set_fac_avoid, query_avoid_edge, edge_code_attr, False, verbose,
+                    vtx_visited = vtx_visited, stamp = stamp, tree = tree)
+                lst_interval.extend({'vtx_start': start_node, **dct} for dct in lst_fac_found)
+            log.info(f"Batch search of {len(start_nodes)} start nodes: {len(lst_interval)} records") if verbose else None
+
+            if as_columns:
+                return FacSearchColumns.from_records(lst_interval, fac_table=G.fac_records,
+                                                     fac_vertices=G.fac_vertices())
+            if not as_df:
+                return lst_interval
+            return pd.DataFrame(lst_interval)
+
+        @staticmethod
+        def _fac_bfs_csr_core(G: CprnCsrGraph, v_start: int, 
+                          fac_types, direction: str, max_depth: int, max_dist,
+                          mark_max_dist: bool, set_fac_avoid: set,
+                          query_avoid_edge: str, edge_code_attr: str,
+                          lazy_edges: bool, verbose: bool,
+                          vtx_visited, stamp: int, tree: SearchTree) -> Iterator[dict]:
+            """ csr engine core (generator), shared by single and batch searches
+
+            `vtx_visited[v] == stamp` marks v as visited by the current search, so one
+            stamp array can serve many consecutive searches without re-allocation.
+            """
+            indptr, nbrs, eids = G.hot_views(direction)
+            weights, edge_codes = G.hot_edges()
+            vtx_fac_mask, fac_indptr, fac_rec_mask = G.hot_facilities()
+            fac_records, vtx_codes, edge_attrs = G.fac_records, G.vtx_codes, G.edge_attrs
+            if edge_code_attr != G.edge_code_attr:     # 快照未编译该边编号属性
+                edge_codes = [attr.get(edge_code_attr, None) for attr in edge_attrs]
+            # 边规避: 整图边掩码, 每个规避表达式只计算一次 (缓存于快照)
+            blocked = G.hot_edge_mask(query_avoid_edge) if query_avoid_edge else None
+
+            # Initialize search
+            mask_fac_types = G.fac_mask(fac_types)
+            fac_visited = set()
+            root = SearchTree.ROOT
+            start_node = vtx_codes[v_start]
+
+            def fac_fit(v: int) -> list:
+                """ facility records of vertex v of the searched types (not avoided) """
+                lst_fit = [fac_records[i] for i in range(fac_indptr[v], fac_indptr[v + 1])
+                           if fac_rec_mask[i] & mask_fac_types]
+                if set_fac_avoid:
+                    if verbose:
+                        lst_fac_avoid = [fac for fac in lst_fit if fac['fac_code'] in set_fac_avoid]
+                        log.info(f"⛔️ Avoided Facilities: {lst_fac_avoid}") if len(lst_fac_avoid) > 0 else None
+                    lst_fit = [fac for fac in lst_fit if fac['fac_code'] not in set_fac_avoid]
+                return lst_fit
+
+            # queue : vertex, passed fac vertex, depth, interval_weight, cumulative_weight, entry, anchor
+            queue = deque([(v_start, v_start, 0, 0, 0, root, root)])
+
+            # If start node is a suitable facility
+            if vtx_fac_mask[v_start] & mask_fac_types:
+                for fac in fac_fit(v_start):
+                    dct_fac_traveled = {'depth': 0,  # Start depth is 0
+                        'vtx_intvl_src': start_node, 'vtx_intvl_tgt': start_node,
+                        'interval_weight': 0, 'cumulative_weight': 0, 
+                        'interval_edges': tree.path(root, root, lazy_edges),
+                        'cumulative_edges': tree.path(root, root, lazy_edges), **fac,}
+                    yield dct_fac_traveled
+                    fac_visited.add(fac['fac_code'])
+                queue = deque([(v_start, v_start, -1, 0, 0, root, root)])
+                log.info(f"Start node {start_node} is a suitable facility, add as depth 0 😄") if verbose else None
+
+            while queue:
+                v, v_passed, depth, interval_weight, cumulative_weight, entry, anchor = queue.popleft()
+                # Stop Criteria Check
+                if depth > max_depth:
+                    continue
+                if cumulative_weight > max_dist:
+                    log.info(f"📛 Stop Criteria Activated: Traverse distance exceeds {max_dist}, stop searching at {vtx_codes[v]}") if verbose else None
+                    if mark_max_dist:
+                        yield {'depth': depth, 
+                            'vtx_intvl_src': vtx_codes[v_passed], 'vtx_intvl_tgt': vtx_codes[v],
+                            'interval_weight': interval_weight, 'cumulative_weight': cumulative_weight,
+                            'interval_edges': tree.path(anchor, entry, lazy_edges),
+                            'cumulative_edges': tree.path(root, entry, lazy_edges),
+                            'reach_max_dist': True,}
+                    continue
+
+                # Check if the current vertex is a target facility
+                if vtx_fac_mask[v] & mask_fac_types:
+                    lst_fac_attr_type_fit = fac_fit(v)
+                    if lst_fac_attr_type_fit:
+                        depth += 1
+                        if depth > max_depth:
+                            continue
+                    for fac in lst_fac_attr_type_fit:
+                        if fac['fac_code'] not in fac_visited:
+                            log.info(f"🏰 Facility {fac['fac_code']} at vtx {vtx_codes[v]} found") if verbose else ''
+                            yield {
+                                'depth': depth, 'vtx_intvl_src': vtx_codes[v_passed], 'vtx_intvl_tgt': vtx_codes[v],
+                                'interval_weight': interval_weight, 'cumulative_weight': cumulative_weight,
+                                'interval_edges': tree.path(anchor, entry, lazy_edges),
+                                'cumulative_edges': tree.path(root, entry, lazy_edges),
+                                'reach_max_depth': depth >= max_depth,
+                                **fac}
+                            fac_visited.add(fac['fac_code'])
+                            v_passed = v
+                            interval_weight = 0
+                            anchor = entry
+
+                # Add neighbors to the queue for iterative search
+                for k in range(indptr[v], indptr[v + 1]):
+                    nbr = nbrs[k]
+                    if vtx_visited[nbr] == stamp:
+                        continue
+                    vtx_visited[nbr] = stamp
+                    eid = eids[k]
+                    if blocked is not None and blocked[eid]:
+                        if verbose:
+                            log.info(f"🚫 Avoid Edge {vtx_codes[v]} -> {vtx_codes[nbr]}, {edge_attrs[eid]}")
+                        continue
+                    edge_weight = weights[eid]
+                    queue.append((nbr, v_passed, depth,
+                                  interval_weight + edge_weight,
+                                  cumulative_weight + edge_weight,
+                                  tree.add(entry, edge_codes[eid]), anchor))
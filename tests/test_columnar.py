@@ -0,0 +1,76 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of columnar facility search results (cprn)
+description : records referencing a facility table keep their own facility
+    when codes are shared by several vertices / types
+"""
+
+
+import numpy as np
+import networkx as nx
+
+from cprn.model.topo.columnar import FacSearchColumns
+from cprn.model.topo.csr_graph import CprnCsrGraph
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _make_shared_code_graph() -> nx.DiGraph:
+    """ A1 -> B and A2 -> C, facility code 'F1' shared by B (DC1) and C (DC2)
+    """
+    DG = nx.DiGraph()
+    DG.add_edge('A1', 'B', weight=1, edge_code='A1_B')
+    DG.add_edge('A2', 'C', weight=2, edge_code='A2_C')
+    for vtx, fac_type in [('B', 'DC1'), ('C', 'DC2')]:
+        DG.nodes[vtx]['is_fac'] = True
+        DG.nodes[vtx]['fac_types'] = {fac_type}
+        DG.nodes[vtx]['lst_fac_attr'] = [{'vtx_fac': vtx, 'fac_code': 'F1', 'fac_type': fac_type,
+                                          'fac_name': f'{vtx} {fac_type}', 'fac_ghz': vtx}]
+    return DG
+
+
+def test_from_records_shared_fac_code_round_trip():
+    DG = _make_shared_code_graph()
+    lst_found = CprnTopoSearch.fac_bfs_depth_batch(DG, ['A1', 'A2'], ['DC1', 'DC2'], 'downstream',
+                                                   max_depth=1, as_df=False)
+    assert [rec['vtx_fac'] for rec in lst_found] == ['B', 'C']
+
+    G = CprnCsrGraph.from_digraph(DG)
+    for fac_table in (None, G.fac_records):
+        res = FacSearchColumns.from_records(lst_found, fac_table=fac_table)
+        assert res.to_records() == lst_found
+        assert res.fac_column('fac_name').tolist() == ['B DC1', 'C DC2']
+
+
+def test_empty_result_has_all_columns():
+    DG = _make_shared_code_graph()
+    res = CprnTopoSearch.fac_bfs_depth(DG, 'A1', ['NONE'], 'downstream', as_columns=True)
+    assert len(res) == 0
+    assert set(res.columns) == set(FacSearchColumns.SEARCH_COLS)
+    assert all(len(arr) == 0 for arr in res.columns.values())
+    assert res.columns['depth'].dtype == np.int64 and res.columns['reach_max_dist'].dtype == bool
+    assert res.to_records() == []
+
+    for res in ([], FacSearchColumns.from_records([])):
+        df = CprnTopoSearch.build_interval_df(res, DG)
+        assert len(df) == 0
+        assert {'vtx_intvl_src', 'fac_code_src', 'fac_code_tgt'} <= set(df.columns)
+
+
+def test_records_without_vtx_fac_keep_their_vertex():
+    DG = _make_shared_code_graph()
+    for vtx in ('B', 'C'):
+        DG.nodes[vtx]['fac_types'] = {'DC1'}
+        DG.nodes[vtx]['lst_fac_attr'] = [{'fac_code': 'F1', 'fac_type': 'DC1', 'fac_name': f'{vtx} DC1'}]
+    lst_found = CprnTopoSearch.fac_bfs_depth_batch(DG, ['A1', 'A2'], ['DC1'], 'downstream',
+                                                   max_depth=1, as_df=False)
+    assert [rec['fac_name'] for rec in lst_found] == ['B DC1', 'C DC1']
+
+    res = FacSearchColumns.from_records(lst_found)
+    assert len(res.fac_table) == 2 and res.to_records() == lst_found
+    res = CprnTopoSearch.fac_bfs_depth_batch(DG, ['A1', 'A2'], ['DC1'], 'downstream',
+                                             max_depth=1, as_columns=True)
+    assert res.fac_column('fac_name').tolist() == ['B DC1', 'C DC1']
@@ -0,0 +1,71 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of the compact cprn model (cprn)
+description : compact graphs search like the DiGraph they were compiled from,
+    also after a pickle dump -> load, and corrupted dumps fail the hash check
+"""
+
+
+import networkx as nx
+import pytest
+
+from cprn.data.pickle import PickleIO
+from cprn.model.topo.compact import CompactCprnGraph
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _make_graph() -> nx.DiGraph:
+    """ A -> B -> C (G1, two records) and B -> D -> E (DC2), E -> B
+    """
+    DG = nx.DiGraph()
+    for u, v, weight, rtype in [('A', 'B', 10, 'MR'), ('B', 'C', 20, 'MR'), ('B', 'D', 5, 'RP'),
+                                ('D', 'E', 7, 'MR'), ('E', 'B', 9, 'RP')]:
+        DG.add_edge(u, v, weight=weight, edge_code=f'{u}_{v}', rtype=rtype, lane=2, edge_id=[len(DG.edges)])
+    DG.nodes['C'].update(is_fac=True, fac_types={'G1'}, lst_fac_attr=[
+        {'vtx_fac': 'C', 'fac_code': 'F1', 'fac_type': 'G1', 'fac_name': 'n1', 'fac_ghz': 'C'},
+        {'vtx_fac': 'C', 'fac_code': 'F3', 'fac_type': 'G1', 'fac_name': 'n3', 'fac_ghz': 'C'}])
+    DG.nodes['E'].update(is_fac=True, fac_types={'DC2'}, lst_fac_attr=[
+        {'vtx_fac': 'E', 'fac_code': 'F2', 'fac_type': 'DC2', 'fac_name': 'n2', 'fac_ghz': 'E'}])
+    return DG
+
+
+def _search(DG, start_node: str = 'A', direction: str = 'downstream') -> list:
+    return CprnTopoSearch.fac_bfs_depth(DG, start_node, ['G1', 'DC2'], direction, max_depth=2)
+
+
+def test_compact_search_equal():
+    DG = _make_graph()
+    cg = CompactCprnGraph.from_digraph(DG)
+    for start_node, direction in [('A', 'downstream'), ('C', 'upstream'), ('E', 'downstream')]:
+        assert _search(cg, start_node, direction) == _search(DG, start_node, direction)
+    DG_back = cg.to_digraph()
+    assert dict(DG_back.edges.items()) == dict(DG.edges.items())
+    assert dict(DG_back.nodes.items()) == dict(DG.nodes.items())
+
+
+@pytest.mark.parametrize('codec', ['none', 'tar.gz'])
+def test_compact_pickle_round_trip_search_equal(tmp_path, codec):
+    DG = _make_graph()
+    file_path = PickleIO.dump_as_pickle(CompactCprnGraph.from_digraph(DG), str(tmp_path / 'model.pkl'), codec=codec)
+    cg = CprnTopoSearch.load_cprn(file_path, compact=True)
+    assert isinstance(cg, CompactCprnGraph) and _search(cg) == _search(DG)
+
+    # DiGraph 文件以 compact 方式载入
+    file_path = PickleIO.dump_as_pickle(DG, str(tmp_path / 'dg.pkl'), codec=codec)
+    cg = CprnTopoSearch.load_cprn(file_path, compact=True)
+    assert isinstance(cg, CompactCprnGraph) and _search(cg) == _search(DG)
+
+
+def test_corrupted_compact_pickle_fails_hash_check(tmp_path):
+    file_path = PickleIO.dump_as_pickle(CompactCprnGraph.from_digraph(_make_graph()), str(tmp_path / 'model.pkl'))
+    with open(file_path, 'r+b') as f:
+        f.seek(200)
+        byte = f.read(1)
+        f.seek(200)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match='hash'):
+        CprnTopoSearch.load_cprn(file_path, compact=True)
@@ -0,0 +1,51 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of the packed edge geometry index (cprn)
+description : interval geometries of downstream and upstream searches follow
+    the road flow without zig-zag
+"""
+
+
+import networkx as nx
+from shapely.geometry import LineString
+
+from cprn.model.topo.edge_geom import EdgeGeometryIndex
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _make_line_graph() -> tuple:
+    """ C -> B -> A along the x axis (A at x=0), facility at C and A
+    """
+    DG = nx.DiGraph()
+    DG.add_edge('C', 'B', weight=1, edge_code='C_B')
+    DG.add_edge('B', 'A', weight=1, edge_code='B_A')
+    for vtx in ('A', 'C'):
+        DG.nodes[vtx]['is_fac'] = True
+        DG.nodes[vtx]['fac_types'] = {'DC1'}
+        DG.nodes[vtx]['lst_fac_attr'] = [{'vtx_fac': vtx, 'fac_code': f'F_{vtx}', 'fac_type': 'DC1',
+                                          'fac_name': f'fac {vtx}', 'fac_ghz': vtx}]
+    geoms = {'C_B': LineString([(2, 0), (1, 0)]), 'B_A': LineString([(1, 0), (0, 0)])}
+    return DG, EdgeGeometryIndex.build(DG, geoms)
+
+
+def test_path_geometry_upstream_follows_flow():
+    DG, gidx = _make_line_graph()
+    assert gidx.path_geometry(['B_A', 'C_B'], direction='upstream').equals_exact(
+        LineString([(2, 0), (1, 0), (0, 0)]), 0)
+    assert gidx.path_geometry(['C_B', 'B_A']).equals_exact(LineString([(2, 0), (1, 0), (0, 0)]), 0)
+
+
+def test_interval_geometries_of_upstream_search():
+    DG, gidx = _make_line_graph()
+    lst_found = CprnTopoSearch.fac_bfs_depth(DG, 'A', ['DC1'], 'upstream', max_depth=1)
+    lst_found = [rec for rec in lst_found if rec['interval_edges']]
+    assert [list(rec['interval_edges']) for rec in lst_found] == [['B_A', 'C_B']]
+
+    lst_geom = gidx.interval_geometries(lst_found, direction='upstream')
+    assert lst_geom[0].equals_exact(LineString([(2, 0), (1, 0), (0, 0)]), 0)
+    lst_geom = gidx.interval_geometries([{**rec, 'direction': 'upstream'} for rec in lst_found])
+    assert lst_geom[0].equals_exact(LineString([(2, 0), (1, 0), (0, 0)]), 0)
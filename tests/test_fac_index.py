@@ -0,0 +1,36 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of the cached facility index (cprn)
+description : facility catalog lookups follow facilities embedded in place
+"""
+
+
+import networkx as nx
+
+from cprn.model.topo.fac_index import FacilityIndex
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _fac(vtx: str, fac_code: str, fac_type: str) -> dict:
+    return {'vtx_fac': vtx, 'fac_code': fac_code, 'fac_type': fac_type, 'fac_name': fac_code, 'fac_ghz': vtx}
+
+
+def test_index_follows_in_place_embedding():
+    DG = nx.DiGraph()
+    DG.add_edge('A', 'B', weight=1, edge_code='A_B')
+    DG.nodes['A'].update(is_fac=True, fac_types={'G1'}, lst_fac_attr=[_fac('A', 'F1', 'G1')])
+    fidx = FacilityIndex.of(DG)
+    assert FacilityIndex.of(DG) is fidx
+    assert len(CprnTopoSearch.list_fac_df(DG)) == 1
+
+    # 新设施节点 (不经 FacilityLayer) 及原列表追加记录均须被察觉
+    DG.nodes['B'].update(is_fac=True, fac_types={'G2'}, lst_fac_attr=[_fac('B', 'F2', 'G2')])
+    assert CprnTopoSearch.query_facility(DG, 'F2')['vtx_fac'].tolist() == ['B']
+    DG.nodes['A']['lst_fac_attr'].append(_fac('A', 'F3', 'G1'))
+    assert CprnTopoSearch.query_facility(DG, 'F3')['vtx_fac'].tolist() == ['A']
+    assert len(CprnTopoSearch.list_fac_df(DG)) == 3
+    assert FacilityIndex.of(DG) is not fidx
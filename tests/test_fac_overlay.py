@@ -0,0 +1,53 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of the facility interval overlay (cprn)
+description : level-1 lookups equal road graph searches, `fac_types` of a walk
+    filters the reported records only
+"""
+
+
+import networkx as nx
+
+from cprn.model.topo.fac_overlay import FacIntervalOverlay
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _make_chain_graph() -> nx.DiGraph:
+    """ A(G1) -> x -> B(G2) -> y -> C(G1)
+    """
+    DG = nx.DiGraph()
+    for u, v in [('A', 'x'), ('x', 'B'), ('B', 'y'), ('y', 'C')]:
+        DG.add_edge(u, v, weight=10, edge_code=f'{u}_{v}')
+    for vtx, fac_type in [('A', 'G1'), ('B', 'G2'), ('C', 'G1')]:
+        DG.nodes[vtx].update(is_fac=True, fac_types={fac_type},
+                             lst_fac_attr=[{'vtx_fac': vtx, 'fac_code': f'F_{vtx}', 'fac_type': fac_type}])
+    return DG
+
+
+def _interval(rec: dict) -> tuple:
+    return rec['depth'], rec['vtx_intvl_src'], rec['vtx_intvl_tgt'], rec['cumulative_weight']
+
+
+def test_adjacent_equals_level_1_search():
+    DG = _make_chain_graph()
+    ovl = FacIntervalOverlay.build(DG, ['G1', 'G2'])
+    lst_found = CprnTopoSearch.fac_bfs_depth(DG, 'A', ['G1', 'G2'], 'downstream', max_depth=1)
+    assert [_interval(rec) for rec in ovl.adjacent('A')] == \
+        [_interval(rec) for rec in lst_found if rec['depth'] == 1]
+
+
+def test_walk_fac_types_filters_records_only():
+    DG = _make_chain_graph()
+    ovl = FacIntervalOverlay.build(DG, ['G1', 'G2'])
+    lst_all = ovl.walk('A', max_depth=2)
+    lst_g1 = ovl.walk('A', max_depth=2, fac_types=['G1'])
+    assert lst_g1 == [rec for rec in lst_all if rec['fac_type'] == 'G1']
+    assert [_interval(rec) for rec in lst_g1] == [(2, 'B', 'C', 40)]
+
+    # 道路图检索只在 G1 处分段, 与覆盖图的统计口径不同 (见 Notes)
+    lst_bfs = CprnTopoSearch.fac_bfs_depth(DG, 'A', ['G1'], 'downstream', max_depth=1)
+    assert [_interval(rec) for rec in lst_bfs if rec['depth'] == 1] == [(1, 'A', 'C', 40)]
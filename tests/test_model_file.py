@@ -0,0 +1,71 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of the columnar model file (cprn)
+description : .cprn.npz dump -> load round trips and hash checks
+"""
+
+
+import networkx as nx
+import pytest
+
+from cprn.data.pickle import PickleIO
+from cprn.model.topo.compact import CompactCprnGraph
+from cprn.model.topo.model_file import CprnModelFile
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _make_graph() -> nx.DiGraph:
+    """ A -> B -> C (G1) and B -> D (DC2), graph / edge / node attributes of mixed types
+    """
+    DG = nx.DiGraph(name='cprn', crs=4326)
+    DG.add_edge('A', 'B', weight=10, edge_code='A_B', rtype='MR', lane=2, edge_id=[1, 2])
+    DG.add_edge('B', 'C', weight=20.5, edge_code='B_C', rtype='MR', lane=3, edge_id=[3])
+    DG.add_edge('B', 'D', weight=5, edge_code='B_D', rtype='RP', edge_id=[4])
+    DG.nodes['C'].update(is_fac=True, fac_types={'G1'}, lst_fac_attr=[
+        {'vtx_fac': 'C', 'fac_code': 'F1', 'fac_type': 'G1', 'fac_name': 'n1', 'fac_ghz': 'C'}])
+    DG.nodes['D'].update(is_fac=True, fac_types={'DC2'}, lst_fac_attr=[
+        {'vtx_fac': 'D', 'fac_code': 'F2', 'fac_type': 'DC2', 'fac_name': 'n2', 'fac_ghz': 'D'}])
+    return DG
+
+
+def _search(DG) -> list:
+    return CprnTopoSearch.fac_bfs_depth(DG, 'A', ['G1', 'DC2'], 'downstream')
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_model_file_round_trip_search_equal(tmp_path, compress):
+    DG = _make_graph()
+    file_path = CprnModelFile.dump(DG, str(tmp_path / 'model.cprn.npz'), compress=compress)
+    assert file_path.endswith(CprnModelFile.EXTENSION)
+
+    cg = CprnTopoSearch.load_cprn(file_path, compact=True)
+    assert isinstance(cg, CompactCprnGraph) and _search(cg) == _search(DG)
+    DG_back = CprnTopoSearch.load_cprn(file_path)
+    assert _search(DG_back) == _search(DG)
+    assert DG_back.graph == DG.graph
+    assert dict(DG_back.edges.items()) == dict(DG.edges.items())
+    assert dict(DG_back.nodes.items()) == dict(DG.nodes.items())
+
+
+def test_model_file_pickle_conversion(tmp_path):
+    DG = _make_graph()
+    pkl_path = PickleIO.dump_as_pickle(DG, str(tmp_path / 'model.pkl'), codec='gzip')
+    file_path = CprnModelFile.from_pickle(pkl_path, str(tmp_path / 'model.cprn.npz'))
+    pkl_path = CprnModelFile.to_pickle(file_path, str(tmp_path / 'back.pkl'))
+    assert _search(PickleIO.load_from_pickle(pkl_path)) == _search(DG)
+
+
+@pytest.mark.parametrize('pos', [20, 200, -1])
+def test_corrupted_model_file_fails_hash_check(tmp_path, pos):
+    file_path = CprnModelFile.dump(_make_graph(), str(tmp_path / 'model.cprn.npz'))
+    with open(file_path, 'r+b') as f:
+        f.seek(pos, 0 if pos >= 0 else 2)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match='hash'):
+        CprnTopoSearch.load_cprn(file_path)
@@ -0,0 +1,100 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of pickled model files (cprn)
+description : dump -> load round trips of every format and hash checks
+"""
+
+
+import tarfile
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from cprn.data.codec import PickleCodec
+from cprn.data.pickle import PickleIO
+from cprn.model.topo.compact import CompactCprnGraph
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _make_graph() -> nx.DiGraph:
+    """ A -> B -> C (G1) and B -> D (DC2)
+    """
+    DG = nx.DiGraph()
+    DG.add_edge('A', 'B', weight=10, edge_code='A_B', rtype='MR', edge_id=[1])
+    DG.add_edge('B', 'C', weight=20, edge_code='B_C', rtype='MR', edge_id=[2])
+    DG.add_edge('B', 'D', weight=5, edge_code='B_D', rtype='RP', edge_id=[3])
+    for vtx, fac_code, fac_type in [('C', 'F1', 'G1'), ('D', 'F2', 'DC2')]:
+        DG.nodes[vtx].update(is_fac=True, fac_types={fac_type}, lst_fac_attr=[
+            {'vtx_fac': vtx, 'fac_code': fac_code, 'fac_type': fac_type, 'fac_name': fac_code, 'fac_ghz': vtx}])
+    return DG
+
+
+def _search(DG) -> list:
+    return CprnTopoSearch.fac_bfs_depth(DG, 'A', ['G1', 'DC2'], 'downstream')
+
+
+def _flip_byte(file_path: str, pos: int):
+    """ corrupt one byte of the file in place (negative pos counts from the end)
+    """
+    with open(file_path, 'r+b') as f:
+        f.seek(pos, 0 if pos >= 0 else 2)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def test_tar_gz_round_trip_is_valid_archive(tmp_path):
+    obj = {'arr': np.arange(100000), 'codes': ['A_B', 'B_C'], 'types': {'G1', 'DC2'}}
+    file_path = PickleIO.dump_as_pickle(obj, str(tmp_path / 'model.pkl'), compress=True)
+    assert file_path.endswith('.tar.gz')
+    assert [p.name for p in tmp_path.iterdir()] == [file_path.split('/')[-1]]
+
+    with tarfile.open(file_path, 'r:gz') as tar:
+        members = tar.getmembers()
+        assert [m.name for m in members] == ['model.pkl'] and members[0].size > 800000
+    loaded = PickleIO.load_from_pickle(file_path)
+    assert (loaded['arr'] == obj['arr']).all() and loaded['codes'] == obj['codes'] and loaded['types'] == obj['types']
+
+
+@pytest.mark.parametrize('codec', [c for c in PickleCodec.available() if c != 'pkl5'])
+def test_codec_round_trip_search_equal(tmp_path, codec):
+    DG = _make_graph()
+    file_path = PickleIO.dump_as_pickle(DG, str(tmp_path / 'model.pkl'), codec=codec)
+    assert file_path.endswith(PickleCodec.EXTENSIONS[codec])
+    assert _search(PickleIO.load_from_pickle(file_path)) == _search(DG)
+    assert _search(CprnTopoSearch.load_cprn(file_path)) == _search(DG)
+
+
+@pytest.mark.parametrize('codec', [c for c in PickleCodec.available() if c != 'pkl5'])
+@pytest.mark.parametrize('pos', [20, 200, -1])
+def test_corrupted_codec_file_fails_hash_check(tmp_path, codec, pos):
+    # 头部 / 中部 (解压或反序列化失败) / 尾部 (解压可能成功) 的损坏均报 hash 不符
+    file_path = PickleIO.dump_as_pickle(_make_graph(), str(tmp_path / 'model.pkl'), codec=codec)
+    _flip_byte(file_path, pos)
+    with pytest.raises(ValueError, match='hash'):
+        PickleIO.load_from_pickle(file_path)
+
+
+def test_pkl5_round_trip_search_equal(tmp_path):
+    DG = _make_graph()
+    for obj in (DG, CompactCprnGraph.from_digraph(DG)):
+        file_path = PickleIO.dump_as_pickle(obj, str(tmp_path / 'model.pkl'), codec='pkl5')
+        assert file_path.endswith('.pkl5')
+        assert _search(PickleIO.load_from_pickle(file_path)) == _search(DG)
+        assert _search(CprnTopoSearch.load_cprn(file_path)) == _search(DG)
+    # 数组为内存映射的只读视图 (零拷贝)
+    assert not PickleIO.load_from_pickle(file_path).fwd_indptr.flags.writeable
+
+
+@pytest.mark.parametrize('pos', [20, 200, -1])
+def test_corrupted_pkl5_file_fails_hash_check(tmp_path, pos):
+    file_path = PickleIO.dump_as_pickle(CompactCprnGraph.from_digraph(_make_graph()),
+                                        str(tmp_path / 'model.pkl'), codec='pkl5')
+    _flip_byte(file_path, pos)
+    with pytest.raises(ValueError, match='hash'):
+        PickleIO.load_from_pickle(file_path)
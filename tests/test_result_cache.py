@@ -0,0 +1,68 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of the search result cache (cprn)
+description : in-place edits are never answered with stale cached results
+"""
+
+
+import networkx as nx
+import pytest
+
+from cprn.model.topo.edge_mask import EdgeMask
+from cprn.model.topo.fingerprint import GraphFingerprint
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+@pytest.fixture
+def result_cache():
+    cache = CprnTopoSearch.enable_result_cache(maxsize=16)
+    yield cache
+    CprnTopoSearch.disable_result_cache()
+    EdgeMask.clear_cache()
+
+
+def _make_graph() -> nx.DiGraph:
+    """ A -> B -> C, facility at C
+    """
+    DG = nx.DiGraph()
+    DG.add_edge('A', 'B', weight=10, edge_code='A_B', rtype='MR')
+    DG.add_edge('B', 'C', weight=20, edge_code='B_C', rtype='MR')
+    DG.nodes['C'].update(is_fac=True, fac_types={'G1'},
+                         lst_fac_attr=[{'vtx_fac': 'C', 'fac_code': 'F1', 'fac_type': 'G1'}])
+    return DG
+
+
+def _weights(DG: nx.DiGraph, **kwargs) -> list:
+    return [rec['cumulative_weight'] for rec in
+            CprnTopoSearch.fac_bfs_depth(DG, 'A', ['G1'], 'downstream', max_depth=1, **kwargs)]
+
+
+def test_untracked_graph_weight_edit_not_served_from_cache(result_cache):
+    DG = _make_graph()
+    assert _weights(DG) == [30]
+    DG.edges['A', 'B']['weight'] = 15
+    assert _weights(DG) == [35]
+    assert result_cache.stats()['hits'] == 0
+
+
+def test_tracked_graph_weight_edit_with_bump(result_cache):
+    DG = _make_graph()
+    GraphFingerprint.track(DG)
+    assert _weights(DG) == [30] and _weights(DG) == [30]
+    assert result_cache.stats()['hits'] == 1
+    DG.edges['A', 'B']['weight'] = 15
+    GraphFingerprint.bump(DG)
+    assert _weights(DG) == [35]
+
+
+def test_blocked_edges_follow_attribute_edit(result_cache):
+    DG = _make_graph()
+    query = "rtype in ['SA']"
+    assert _weights(DG, query_avoid_edge=query, vectorize_avoid_edge=True) == [30]
+    DG.edges['B', 'C']['rtype'] = 'SA'
+    assert EdgeMask.blocked_edges(DG, query) == frozenset({('B', 'C')})
+    assert _weights(DG, query_avoid_edge=query, vectorize_avoid_edge=True) == []
@@ -0,0 +1,57 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of the precompiled facility search plan (cprn)
+description : batch runs of a plan agree with single `fac_bfs_depth` searches
+"""
+
+
+import networkx as nx
+
+from cprn.model.topo.search_plan import SearchPlan
+from cprn.model.topo.topo_search import CprnTopoSearch
+
+
+def _make_chain_graph() -> nx.DiGraph:
+    """ two chains A -> B -> C -> D and E -> F -> C, facilities at C and D
+    """
+    DG = nx.DiGraph()
+    for u, v, w in [('A', 'B', 10), ('B', 'C', 20), ('C', 'D', 30), ('E', 'F', 5), ('F', 'C', 15)]:
+        DG.add_edge(u, v, weight=w, edge_code=f'{u}_{v}')
+    for vtx, fac_type in [('C', 'DC1'), ('D', 'DC2')]:
+        DG.nodes[vtx]['is_fac'] = True
+        DG.nodes[vtx]['fac_types'] = {fac_type}
+        DG.nodes[vtx]['lst_fac_attr'] = [{'vtx_fac': vtx, 'fac_code': f'F_{vtx}', 'fac_type': fac_type,
+                                          'fac_name': f'fac {vtx}', 'fac_ghz': vtx}]
+    return DG
+
+
+def _plain(records: list) -> list:
+    # 惰性边路径转为列表后比较
+    return [{key: list(val) if key.endswith('edges') else val for key, val in dct.items()}
+            for dct in records]
+
+
+def test_run_many_csr_lazy_edges_equals_fac_bfs_depth():
+    DG = _make_chain_graph()
+    start_nodes = ['A', 'E', 'B']
+    plan = SearchPlan(DG, ['DC1', 'DC2'], 'downstream', max_depth=2, version='csr', lazy_edges=True)
+    lst_found = plan.run_many(start_nodes)
+
+    lst_expected = []
+    for start_node in start_nodes:
+        lst_expected.extend({'vtx_start': start_node, **dct} for dct in
+            CprnTopoSearch.fac_bfs_depth(DG, start_node, ['DC1', 'DC2'], 'downstream', max_depth=2))
+    assert lst_expected
+    assert _plain(lst_found) == _plain(lst_expected)
+
+
+def test_run_csr_lazy_edges_keeps_earlier_results():
+    DG = _make_chain_graph()
+    plan = SearchPlan(DG, ['DC1', 'DC2'], 'downstream', max_depth=2, version='csr', lazy_edges=True)
+    lst_first = plan.run('A')
+    plan.run('E')
+    assert _plain(lst_first) == _plain(CprnTopoSearch.fac_bfs_depth(DG, 'A', ['DC1', 'DC2'], 'downstream', max_depth=2))
@@ -0,0 +1,109 @@
+# -*- coding : utf-8 -*-
+# create date : Oct 17th, 26
+# last update : Oct 17th, 26
+# author : seika<seika@live.ca>
+
+"""
+topic : tests of degree-2 chain contraction (cprn)
+description : shortening keeps shortest distances between kept vertices and
+    the multiset of original edge ids, on one-way / two-way chains, rings and
+    parallel chains
+"""
+
+
+import random
+from collections import Counter
+
+import networkx as nx
+
+from cprn.model.topo.shorten import CprnShortener
+
+
+def _add_path(DG: nx.DiGraph, path: list, two_way: bool = False, **attr):
+    for u, v in zip(path[:-1], path[1:]):
+        DG.add_edge(u, v, weight=len(u) + len(v), rtype='MR', knd='ST', **attr)
+        if two_way:
+            DG.add_edge(v, u, weight=len(u) + len(v) + 1, rtype='MR', knd='ST', **attr)
+
+
+def _make_graph() -> nx.DiGraph:
+    """ one-way chain, two-way chain, one-way ring and parallel chains X => Y
+    """
+    DG = nx.DiGraph()
+    _add_path(DG, ['P0', 'P1', 'P2', 'P3'])
+    DG.add_edge('P3', 'P0', weight=50, rtype='SA', knd='ST')
+    _add_path(DG, ['Q0', 'Q1', 'Q2', 'Q3'], two_way=True)
+    DG.add_edge('Q3', 'P0', weight=5, rtype='SA', knd='ST')
+    _add_path(DG, ['R0', 'R1', 'R2', 'R3', 'R0'])
+    _add_path(DG, ['X', 'a1', 'a2', 'a3', 'Y'])
+    _add_path(DG, ['X', 'b1', 'b2', 'Y'])
+    DG.add_edge('X', 'Y', weight=40, rtype='MR', knd='ST')
+    DG.add_edge('Y', 'Q0', weight=5, rtype='SA', knd='ST')
+    return DG
+
+
+def _distances(DG: nx.DiGraph, vertices) -> dict:
+    return {(u, v): d for u in vertices
+            for v, d in nx.single_source_dijkstra_path_length(DG, u).items() if v in vertices}
+
+
+def _edge_ids(DG: nx.DiGraph) -> Counter:
+    return Counter(edge_id for _, _, lst in DG.edges(data='edge_id') for edge_id in lst)
+
+
+def _check_invariants(DG: nx.DiGraph, DG_short: nx.DiGraph):
+    assert set(DG_short.nodes) <= set(DG.nodes)
+    assert nx.number_of_selfloops(DG_short) == 0
+    assert _distances(DG_short, DG_short.nodes) == _distances(DG, DG_short.nodes)
+    assert _edge_ids(DG_short) == Counter(f"{u}_{v}" for u, v in DG.edges)
+    assert all(attr['edge_code'] == f"{u}_{v}" for u, v, attr in DG_short.edges(data=True))
+
+
+def test_shorten_chains_rings_and_parallel_chains():
+    DG = _make_graph()
+    DG_short = CprnShortener.shorten(DG)
+    _check_invariants(DG, DG_short)
+    assert not {'P1', 'P2', 'Q1', 'Q2', 'a1', 'a3', 'b1'} & set(DG_short.nodes)
+    assert DG_short.edges['P0', 'P3']['edge_id'] == ['P0_P1', 'P1_P2', 'P2_P3']
+    assert DG_short.edges['Q3', 'Q0']['edge_id'] == ['Q3_Q2', 'Q2_Q1', 'Q1_Q0']
+    # 环路保留顶点, 平行链 (无覆盖规则) 保留中间顶点以免重复边
+    assert {'R0', 'R1', 'R2', 'R3'} & set(DG_short.nodes)
+    assert {'a2', 'b2'} <= set(DG_short.nodes)
+    assert DG_short.number_of_nodes() == 10
+
+
+def test_shorten_parallel_chains_with_override():
+    DG = _make_graph()
+    DG_short = CprnShortener.shorten(DG, dct_edge_override=CprnShortener.NOTEBOOK_OVERRIDE)
+    _check_invariants(DG, DG_short)
+    assert not {'a1', 'a2', 'a3', 'b1', 'b2'} & set(DG_short.nodes)
+    assert DG_short.edges['X', 'Y']['weight'] == min(
+        40, nx.dijkstra_path_length(DG, 'X', 'Y'))
+
+
+def test_shorten_merges_attributes_same_or_mixed():
+    DG = nx.DiGraph()
+    _add_path(DG, ['A', 'B', 'C'])
+    DG.edges['B', 'C']['knd'] = 'XX'
+    DG_short = CprnShortener.shorten(DG, lst_attr=['rtype'])
+    assert list(DG_short.edges(data=True)) == [('A', 'C', {
+        'weight': 4, 'rtype': 'MR', 'knd': CprnShortener.MIXED,
+        'edge_id': ['A_B', 'B_C'], 'edge_code': 'A_C'})]
+
+
+def test_shorten_random_graphs_keep_invariants():
+    rnd = random.Random(7)
+    for seed in range(20):
+        DG = nx.DiGraph()
+        for k in range(rnd.randint(3, 8)):
+            nodes = [f'c{seed}_{k}_{i}' for i in range(rnd.randint(3, 7))]
+            if rnd.random() < 0.3:
+                nodes.append(nodes[0])      # ring
+            _add_path(DG, nodes, two_way=rnd.random() < 0.4)
+        lst_nodes = list(DG.nodes)
+        for _ in range(rnd.randint(2, 10)):
+            u, v = rnd.sample(lst_nodes, 2)
+            if not DG.has_edge(u, v):
+                DG.add_edge(u, v, weight=rnd.randint(1, 30), rtype='SA', knd='ST')
+        for dct_override in (None, CprnShortener.NOTEBOOK_OVERRIDE):
+            _check_invariants(DG, CprnShortener.shorten(DG, dct_edge_override=dct_override))